@@ -5,19 +5,31 @@ Reads chart/table images and extracts values, captions, and surrounding text.
 
 """
 
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from PIL import Image
 import json
+import logging
 import os
-from chandra import ChandraOCR
-from transformers import AutoProcessor, AutoModelForTokenClassification
-import torch
-import os
+import time
+import fitz  # PyMuPDF
+
+from Extraction.extraction_cache import ExtractionCache
+from Extraction.extraction_store import ExtractionStore
+from utils.config import EXTRACTION_OUTPUT_FORMAT, LAYOUTLM_MODEL, LAYOUTLM_BATCH_SIZE, REGION_ZOOM
+from utils.model_registry import models
+from utils.pdf_processor import classify_pages, find_figure_regions, iter_region_images
+from utils.render_policy import model_view, render_zoom
+from utils.telemetry import profiled, telemetry
+
+logger = logging.getLogger(__name__)
 
+# chandra, transformers and torch are imported inside the functions that use
+# them, so importing this module stays cheap until a page actually needs OCR.
 
 
 # Initialize Chandra OCR
 def initialize_chandra() -> Optional[Any]:
+    from chandra import ChandraOCR
     ocr = ChandraOCR()
     return ocr
 
@@ -29,15 +41,38 @@ def initialize_layoutlm():
     Returns:
         Tuple of (processor, model) or (None, None)
     """
-    processor = AutoProcessor.from_pretrained("microsoft/layoutlmv3-base", apply_ocr=False)
-    model = AutoModelForTokenClassification.from_pretrained("microsoft/layoutlmv3-base")
+    from transformers import AutoProcessor, AutoModelForTokenClassification
+    processor = AutoProcessor.from_pretrained(LAYOUTLM_MODEL, apply_ocr=False)
+    model = AutoModelForTokenClassification.from_pretrained(LAYOUTLM_MODEL)
     return processor, model
 
+# Loaded on first use and kept warm for the rest of the process
+models.register("chandra", initialize_chandra)
+models.register("layoutlm", initialize_layoutlm)
+
+# Identify the models behind an extraction so cached results are invalidated on upgrade
+def extraction_model_ids() -> Dict[str, str]:
+    # Read the installed version from package metadata instead of importing chandra
+    from importlib.metadata import PackageNotFoundError, version
+    try:
+        chandra_version = version("chandra-ocr")
+    except PackageNotFoundError:
+        chandra_version = "unknown"
+    return {
+        "chandra": chandra_version,
+        "layoutlm": LAYOUTLM_MODEL,
+    }
+
+# Records keep the image path for reference; in-memory pages have none to keep
+def image_source(image) -> Optional[str]:
+    return str(image) if isinstance(image, (str, os.PathLike)) else None
+
 #Extract structured data from chart/table image using Chandra OCR. 
+@profiled
 def extract_chart_data(image_path, ocr) -> Dict[str, Any]:
     """
     Args:
-        image_path: Path to chart/table image
+        image_path: Path to chart/table image, or the decoded PIL page
         ocr: Initialized Chandra OCR instance
         
     Returns:
@@ -49,16 +84,17 @@ def extract_chart_data(image_path, ocr) -> Dict[str, Any]:
         >>> print(chart_data["type"])  # "bar_chart"
     """
     if ocr is None:
-        print("OCR not initialized")
+        logger.warning("OCR not initialized")
         return {}
     
     try:
         # Run Chandra OCR on image
-        result = ocr.extract(image_path)
+        with telemetry.span("ocr"):
+            result = ocr.extract(image_path)
         
         # Parse result into structured format
         chart_data = {
-            "source_image": image_path,
+            "source_image": image_source(image_path),
             "type": result.get("chart_type", "unknown"),
             "title": result.get("title", ""),
             "extracted_text": result.get("text", ""),
@@ -67,20 +103,34 @@ def extract_chart_data(image_path, ocr) -> Dict[str, Any]:
             "labels": result.get("labels", []),
         }
         
-        print(f"Extracted chart data from {image_path}")
+        logger.debug("Extracted chart data from %s", image_path)
         return chart_data
     
     except Exception as e:
-        print(f"Error extracting chart data: {str(e)}")
+        telemetry.count("ocr_errors")
+        logger.error("Error extracting chart data: %s", e)
         return {}
 
+def _load_rgb(image) -> Image.Image:
+    if isinstance(image, (str, os.PathLike)):
+        return Image.open(image).convert("RGB")
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+def _decode_contextual_text(input_ids, predictions, processor, model) -> str:
+    # Convert predictions to readable text
+    tokens = processor.tokenizer.convert_ids_to_tokens(input_ids)
+    predicted_labels = [model.config.id2label.get(pred.item(), "O") for pred in predictions]
+    
+    # Combine tokens with predicted labels (simplified)
+    return " ".join([token for token, label in zip(tokens, predicted_labels) if label != "O"])
+
 #Extract text around/near the chart image using LayoutLMv3.
 def extract_contextual_text(image_path: str, processor, model) -> str:
     """
     
     
     Args:
-        image_path: Path to image
+        image_path: Path to image (or an in-memory PIL image)
         processor: LayoutLMv3 processor
         model: LayoutLMv3 model
         
@@ -92,39 +142,122 @@ def extract_contextual_text(image_path: str, processor, model) -> str:
         >>> text = extract_contextual_text("page_1_chart.png", processor, model)
     """
     if processor is None or model is None:
-        print("LayoutLMv3 not initialized")
+        logger.warning("LayoutLMv3 not initialized")
         return ""
     
-    try:
-        # Load image
-        image = Image.open(image_path).convert("RGB")
-        
-        # Process with LayoutLMv3
-        encoding = processor(image, return_tensors="pt")
-        
-        with torch.no_grad():
-            outputs = model(**encoding)
-        
-        # Extract text predictions
-        predictions = outputs.logits.argmax(-1)
+    contextual_text = extract_contextual_text_batch([image_path], processor, model, batch_size=1)[0]
+    logger.debug("Extracted contextual text from %s", image_path)
+    return contextual_text
+
+#Extract contextual text for many pages, running LayoutLMv3 on padded batches.
+@profiled
+def extract_contextual_text_batch(
+    images: List[Any],
+    processor,
+    model,
+    batch_size: int = LAYOUTLM_BATCH_SIZE,
+    num_threads: Optional[int] = None,
+) -> List[str]:
+    """
+    Args:
+        images: Image paths or PIL images
+        processor: LayoutLMv3 processor
+        model: LayoutLMv3 model
+        batch_size: Pages per forward pass
+        num_threads: Intra-op thread count for torch (default: leave unchanged)
         
-        # Convert predictions to readable text
-        tokens = processor.tokenizer.convert_ids_to_tokens(encoding["input_ids"][0])
-        predicted_labels = [model.config.id2label.get(pred.item(), "O") for pred in predictions[0]]
+    Returns:
+        Contextual text per input image, in input order. Each entry matches
+        what extract_contextual_text returns for that image on its own.
         
-        # Combine tokens with predicted labels (simplified)
-        contextual_text = " ".join([token for token, label in zip(tokens, predicted_labels) if label != "O"])
+    Example:
+        >>> processor, model = initialize_layoutlm()
+        >>> texts = extract_contextual_text_batch(["page_1.png", "page_2.png"], processor, model)
+    """
+    if processor is None or model is None:
+        logger.warning("LayoutLMv3 not initialized")
+        return [""] * len(images)
+    
+    import torch
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    
+    results: List[str] = []
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        try:
+            pages = [_load_rgb(image) for image in batch]
+            
+            # Pad only to the longest sequence in this batch
+            encoding = processor(pages, return_tensors="pt", padding="longest")
+            
+            with torch.inference_mode(), telemetry.span("layoutlm_forward", batch=len(pages)):
+                outputs = model(**encoding)
+            
+            # Extract text predictions, dropping padding positions
+            predictions = outputs.logits.argmax(-1)
+            attention_mask = encoding["attention_mask"].bool()
+            for i in range(len(pages)):
+                results.append(_decode_contextual_text(
+                    encoding["input_ids"][i][attention_mask[i]],
+                    predictions[i][attention_mask[i]],
+                    processor,
+                    model,
+                ))
         
-        print(f"Extracted contextual text from {image_path}")
-        return contextual_text
+        except Exception as e:
+            if len(batch) == 1:
+                telemetry.count("layoutlm_errors")
+                logger.error("Error extracting contextual text: %s", e)
+                results.append("")
+            else:
+                # Retry page by page so one bad page does not blank the batch
+                results.extend(
+                    extract_contextual_text_batch(batch, processor, model, batch_size=1)
+                )
     
-    except Exception as e:
-        print(f"✗ Error extracting contextual text: {str(e)}")
-        return ""
+    return results
+
+def render_params(zoom: Optional[float] = None, mode: str = "page") -> Dict[str, Any]:
+    """Render settings folded into extraction cache keys (zoom None = OCR render policy)."""
+    return {"mode": mode, "zoom": "policy" if zoom is None else zoom}
+
 
 #Extract all chart/table data from document images and runs Chandra OCR and LayoutLMv3 on each image.
-def extract_from_document(image_paths: List[Tuple[str, int]], output_dir: str = "extracted_data") -> List[Dict]:
+def extract_from_document(
+    image_paths: List[Tuple[str, int]],
+    output_dir: str = "extracted_data",
+    use_cache: bool = True,
+    cache: Optional[ExtractionCache] = None,
+    batch_size: int = LAYOUTLM_BATCH_SIZE,
+    num_threads: Optional[int] = None,
+    pdf_path: Optional[str] = None,
+    on_page_done: Optional[Callable[[int], None]] = None,
+    output_format: str = EXTRACTION_OUTPUT_FORMAT,
+    store: Optional[ExtractionStore] = None,
+    doc_id: Optional[str] = None,
+    cache_params: Optional[Dict[str, Any]] = None,
+) -> List[Dict]:
     """ 
+    Args:
+        image_paths: List of (image_path, page_number) tuples from pdf_to_images,
+            or (image_path, page_number, region_id) tuples for region crops
+        output_dir: Directory for the extraction store (or per-page JSON)
+        use_cache: Serve unchanged pages from the persistent extraction cache
+        cache: Cache instance to use (default: one built from config)
+        batch_size: Pages per LayoutLMv3 forward pass
+        num_threads: Intra-op thread count for LayoutLMv3 inference
+        pdf_path: Source PDF; when given, pages that classify_pages() marks as
+            plain prose are skipped and a prefilter report is written
+        on_page_done: Called with each page number once that page is fully
+            processed and saved (including pages with no chart data)
+        output_format: "store" appends records to an ExtractionStore in
+            output_dir; "json" writes one page_*_extraction.json per record
+        store: Store to append to (default: one opened on output_dir)
+        doc_id: Document id stored with each record
+        cache_params: How the images were rendered, part of every cache key
+            (default: render_params(), full pages at the OCR render policy)
+
     Returns:
         List of extracted data dictionaries
         
@@ -137,33 +270,185 @@ def extract_from_document(image_paths: List[Tuple[str, int]], output_dir: str =
     """
     os.makedirs(output_dir, exist_ok=True)
     
-    # Initialize models
-    ocr = initialize_chandra()
-    processor, model = initialize_layoutlm()
+    # Route only likely chart/table pages to the expensive models
+    skipped_pages = []
+    classify_seconds = 0.0
+    if pdf_path is not None:
+        classify_start = time.perf_counter()
+        classification = classify_pages(pdf_path)
+        classify_seconds = time.perf_counter() - classify_start
+        kept = []
+        for item in image_paths:
+            if classification.get(item[1], {}).get("likely_chart", True):
+                kept.append(item)
+            elif item[1] not in skipped_pages:
+                skipped_pages.append(item[1])
+        image_paths = kept
+        if on_page_done is not None:
+            for page_num in skipped_pages:
+                on_page_done(page_num)
+    
+    if use_cache and cache is None:
+        cache = ExtractionCache(model_ids=extraction_model_ids())
+    if cache_params is None:
+        cache_params = render_params()
+    
+    owns_store = store is None and output_format == "store"
+    if owns_store:
+        store = ExtractionStore(output_dir)
+    
+    # Models are only fetched from the registry once a page misses the cache
+    ocr = None
+    processor, model = None, None
     
     extracted_data = []
+    model_pages = 0
+    model_seconds = 0.0
     
-    for image_path, page_num in image_paths:
-        print(f"\n--- Processing Page {page_num}: {image_path} ---")
+    # Work through the document in windows so LayoutLMv3 sees full batches
+    for start in range(0, len(image_paths), batch_size):
+        window = []
+        pending = []
         
-        # Extract chart/table data
-        chart_data = extract_chart_data(image_path, ocr)
-        if not chart_data:
-            continue
+        for item in image_paths[start:start + batch_size]:
+            image_path, page_num = item[0], item[1]
+            region_id = item[2] if len(item) > 2 else None
+            logger.debug("Processing page %s: %s", page_num, image_path)
+            
+            cache_key = cache.key_for(image_path, cache_params) if cache is not None else None
+            cached = cache.get(cache_key) if cache is not None else None
+            
+            if cached is not None:
+                telemetry.count("extraction_cache_hits")
+                chart_data = dict(cached, source_image=image_source(image_path))
+            else:
+                if ocr is None:
+                    ocr = models.get("chandra")
+                    processor, model = models.get("layoutlm")
+                
+                # OCR gets the page as given; LayoutLMv3 keeps only its small
+                # input-size view until the batch runs
+                ocr_start = time.perf_counter()
+                chart_data = extract_chart_data(image_path, ocr)
+                model_seconds += time.perf_counter() - ocr_start
+                model_pages += 1
+                if not chart_data:
+                    continue
+                chart_data["source_image"] = image_source(image_path)
+                pending.append((chart_data, model_view(image_path, "layoutlm"), cache_key))
+            
+            chart_data["page"] = page_num
+            if region_id is not None:
+                chart_data["region_id"] = region_id
+            window.append(chart_data)
         
-        chart_data["page"] = page_num
+        # Extract contextual text for the pages that missed the cache
+        if pending:
+            layout_start = time.perf_counter()
+            contexts = extract_contextual_text_batch(
+                [layout_image for _, layout_image, _ in pending],
+                processor,
+                model,
+                batch_size=batch_size,
+                num_threads=num_threads,
+            )
+            model_seconds += time.perf_counter() - layout_start
+            for (chart_data, _, cache_key), context_text in zip(pending, contexts):
+                chart_data["context"] = context_text
+                if cache is not None:
+                    cache.put(cache_key, {k: v for k, v in chart_data.items() if k not in ("page", "region_id")})
         
-        # Extract contextual text
-        context_text = extract_contextual_text(image_path, processor, model)
-        chart_data["context"] = context_text
+        for chart_data in window:
+            extracted_data.append(chart_data)
+            
+            # Save extracted data for this page
+            if store is not None:
+                store.append(chart_data, doc_id=doc_id)
+                continue
+            if "region_id" in chart_data:
+                output_path = os.path.join(output_dir, f"page_{chart_data['page']}_{chart_data['region_id']}_extraction.json")
+            else:
+                output_path = os.path.join(output_dir, f"page_{chart_data['page']}_extraction.json")
+            with open(output_path, 'w') as f:
+                json.dump(chart_data, f, indent=2)
+            logger.debug("Saved extraction to %s", output_path)
         
-        extracted_data.append(chart_data)
+        if on_page_done is not None:
+            # Pages are only reported done once their records are on disk
+            if store is not None:
+                store.flush()
+            for page_num in sorted({item[1] for item in image_paths[start:start + batch_size]}):
+                on_page_done(page_num)
+    
+    if pdf_path is not None:
+        # Skipped pages are costed at the average model time of processed pages
+        seconds_per_page = model_seconds / model_pages if model_pages else 0.0
+        report = {
+            "total_pages": len({item[1] for item in image_paths}) + len(skipped_pages),
+            "processed_pages": len({item[1] for item in image_paths}),
+            "skipped_pages": len(skipped_pages),
+            "skipped_page_numbers": skipped_pages,
+            "classification_seconds": round(classify_seconds, 3),
+            "estimated_seconds_saved": round(len(skipped_pages) * seconds_per_page - classify_seconds, 3),
+        }
+        with open(os.path.join(output_dir, "prefilter_report.json"), 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info("Prefilter skipped %d/%d pages, saving ~%ss",
+                    report['skipped_pages'], report['total_pages'], report['estimated_seconds_saved'])
+    
+    if store is not None:
+        store.flush()
+        logger.info("Extraction store %s: %s", store.path, store.stats())
+        if owns_store:
+            store.close()
+    if cache is not None:
+        logger.info("Extraction cache: %s", cache.stats())
+    telemetry.count("pages_extracted", len(extracted_data))
+    logger.info("Completed extraction for %d pages", len(extracted_data))
+    return extracted_data
+
+#Extract chart/table data from cropped figure/table regions instead of whole pages.
+def extract_from_regions(
+    pdf_path: str,
+    output_dir: str = "extracted_data",
+    image_dir: str = "temp_images",
+    chunk_dicts: Optional[List[Dict]] = None,
+    zoom: float = REGION_ZOOM,
+    **kwargs,
+) -> List[Dict]:
+    """
+    Args:
+        pdf_path: Path to the PDF file
+        output_dir: Directory for per-region extraction JSON
+        image_dir: Directory for the rendered region crops
+        chunk_dicts: Optional chunks_to_dict() output whose Table/Image
+            coordinates are used as extra regions
+        zoom: Zoom factor for the crops
+        **kwargs: Passed through to extract_from_document()
+
+    Returns:
+        List of extracted data dictionaries, one per region, each with a region_id
         
-        # Save extracted data for this page
-        output_path = os.path.join(output_dir, f"page_{page_num}_extraction.json")
-        with open(output_path, 'w') as f:
-            json.dump(chart_data, f, indent=2)
-        print(f"Saved extraction to {output_path}")
-    
-    print(f"\nCompleted extraction for {len(extracted_data)} pages")
-    return extracted_data
\ No newline at end of file
+    Example:
+        >>> extracted = extract_from_regions("sample.pdf")
+        >>> for data in extracted:
+        ...     print(f"Page {data['page']} {data['region_id']}: {data['type']}")
+    """
+    regions = find_figure_regions(pdf_path, chunk_dicts=chunk_dicts)
+    crops = list(iter_region_images(pdf_path, regions, zoom=zoom, output_dir=image_dir))
+    
+    # Compare against rendering every page at the zoom the OCR render policy picks for it
+    region_pixels = sum(
+        (region["bbox"][2] - region["bbox"][0]) * (region["bbox"][3] - region["bbox"][1]) * zoom * zoom
+        for region in regions
+    )
+    pdf_document = fitz.open(pdf_path)
+    page_pixels = sum(
+        abs(page.rect) * render_zoom(page.rect.width, page.rect.height) ** 2 for page in pdf_document
+    )
+    pdf_document.close()
+    if page_pixels:
+        logger.info("Rendering %d regions: %.1f%% of full-page pixels", len(regions), 100 * region_pixels / page_pixels)
+    
+    kwargs.setdefault("cache_params", render_params(zoom, mode="region"))
+    return extract_from_document(crops, output_dir=output_dir, **kwargs)
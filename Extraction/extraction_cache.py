@@ -0,0 +1,150 @@
+"""
+extraction_cache.py
+Persistent, content-addressed cache for per-page extraction results.
+
+Entries are keyed by a hash of the rendered page bytes plus the model
+identifiers and extraction parameters, so an unchanged page is never sent
+through Chandra OCR / LayoutLMv3 twice, regardless of the file it came from.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from utils.config import EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_BYTES
+
+
+def hash_page_image(image) -> str:
+    """
+    Hash the content of a rendered page.
+
+    Args:
+        image: Path to an image file or an in-memory PIL image
+
+    Returns:
+        Hex digest of the page content
+    """
+    digest = hashlib.sha256()
+    if isinstance(image, (str, os.PathLike)):
+        with open(image, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    else:
+        digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+        digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    SQLite-backed LRU cache of extraction results.
+
+    Args:
+        cache_dir: Directory holding the cache database
+        max_bytes: Size bound; least recently used entries are evicted past it
+        model_ids: Model identifiers folded into every key
+        params: Extraction parameters folded into every key (per-page render
+            settings go to key_for instead)
+
+    Example:
+        >>> cache = ExtractionCache(model_ids={"layoutlm": "microsoft/layoutlmv3-base"})
+        >>> key = cache.key_for("page_1.png", params={"mode": "page", "zoom": "policy"})
+        >>> if cache.get(key) is None:
+        ...     cache.put(key, {"type": "bar_chart"})
+        >>> print(cache.stats())
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = EXTRACTION_CACHE_DIR,
+        max_bytes: int = EXTRACTION_CACHE_MAX_BYTES,
+        model_ids: Optional[Dict[str, str]] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._namespace = json.dumps(
+            {"models": model_ids or {}, "params": params or {}}, sort_keys=True, default=str
+        )
+        self._lock = threading.Lock()
+        # Every batch_ingest worker process writes to the same database
+        self._conn = sqlite3.connect(
+            os.path.join(cache_dir, "extraction_cache.sqlite"), timeout=60, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)")
+        self._conn.commit()
+
+    def key_for(self, image, params: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Build the cache key for a page image under this cache's models and params.
+
+        Args:
+            image: Path to an image file or an in-memory PIL image
+            params: How the image was produced (render zoom, page or region crop)
+        """
+        digest = hashlib.sha256(self._namespace.encode())
+        if params:
+            digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        digest.update(hash_page_image(image).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for key, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a result and evict least recently used entries beyond max_bytes."""
+        payload = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current cache size."""
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,252 @@
+"""
+extraction_store.py
+Append-only, chunked, compressed store for extraction records.
+
+Records are buffered and written in chunks of EXTRACTION_STORE_CHUNK_ROWS to
+a single records.bin file. Inside a chunk every field is its own
+zlib-compressed column, so readers decompress only the fields they ask for.
+A SQLite index maps (doc_id, page, region_id) to (chunk, row) for random
+access; streaming iteration decodes one chunk at a time.
+
+Chunk layout: uint32 header length | JSON header {"count", "columns": {name: [offset, length]}} | column blobs
+"""
+
+import json
+import os
+import sqlite3
+import struct
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils.config import EXTRACTION_STORE_CHUNK_ROWS
+
+
+# Decoded (chunk, field) columns kept in memory for random access
+_COLUMN_CACHE_SIZE = 64
+
+
+def _encode_column(records: List[Dict[str, Any]], name: str, level: int) -> bytes:
+    present = [i for i, record in enumerate(records) if name in record]
+    if len(present) == len(records):
+        payload: Any = [record[name] for record in records]
+    else:
+        # Sparse fields (e.g. region_id) keep only the rows that have them
+        payload = {"rows": present, "values": [records[i][name] for i in present]}
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode(), level)
+
+
+def _encode_chunk(records: List[Dict[str, Any]], level: int) -> bytes:
+    names = list(dict.fromkeys(name for record in records for name in record))
+    columns, blobs, position = {}, [], 0
+    for name in names:
+        blob = _encode_column(records, name, level)
+        columns[name] = [position, len(blob)]
+        position += len(blob)
+        blobs.append(blob)
+    header = json.dumps({"count": len(records), "columns": columns}, separators=(",", ":")).encode()
+    return struct.pack("<I", len(header)) + header + b"".join(blobs)
+
+
+class ExtractionStore:
+    """
+    Compact on-disk store of extraction records with random access and field projection.
+
+    A store has one writer at a time; give each concurrent worker its own directory.
+
+    Args:
+        path: Store directory (created if missing)
+        chunk_rows: Records per compressed chunk
+        compress_level: zlib level for column blobs
+
+    Example:
+        >>> with ExtractionStore("extracted_data/annual-2023") as store:
+        ...     store.append({"page": 3, "type": "bar_chart", "title": "Revenue"}, doc_id="annual-2023")
+        >>> store = ExtractionStore("extracted_data/annual-2023")
+        >>> record = store.get("annual-2023", 3, fields=["type", "title"])
+        >>> for record in store.iter_records(fields=["page", "context"]):
+        ...     print(record)
+    """
+
+    def __init__(self, path: str, chunk_rows: int = EXTRACTION_STORE_CHUNK_ROWS, compress_level: int = 6):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.compress_level = compress_level
+        os.makedirs(path, exist_ok=True)
+
+        self._data_path = os.path.join(path, "records.bin")
+        # Pipeline stages may write from a worker thread; callers keep a single writer
+        self._conn = sqlite3.connect(os.path.join(path, "index.sqlite"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (chunk_id INTEGER PRIMARY KEY, offset INTEGER NOT NULL, "
+            "length INTEGER NOT NULL, count INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows (doc_id TEXT NOT NULL, page INTEGER NOT NULL, region_id TEXT NOT NULL, "
+            "chunk_id INTEGER NOT NULL, row INTEGER NOT NULL, PRIMARY KEY (doc_id, page, region_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS rows_location ON rows (chunk_id, row)")
+        self._conn.commit()
+
+        # Drop a partially written trailing chunk left by an interrupted append
+        end = self._conn.execute("SELECT COALESCE(MAX(offset + length), 0) FROM chunks").fetchone()[0]
+        if os.path.exists(self._data_path) and os.path.getsize(self._data_path) > end:
+            os.truncate(self._data_path, end)
+
+        self._writer = None
+        self._reader = None
+        self._pending: List[Dict[str, Any]] = []
+        self._headers: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+        self._columns: "OrderedDict[Tuple[int, str], Dict[int, Any]]" = OrderedDict()
+
+    def append(self, record: Dict[str, Any], doc_id: Optional[str] = None) -> None:
+        """
+        Add a record; a later record with the same (doc_id, page, region_id) replaces it.
+
+        Records become visible to readers once their chunk is flushed.
+        """
+        if doc_id is not None:
+            record = dict(record, doc_id=doc_id)
+        self._pending.append(record)
+        if len(self._pending) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered records as one chunk and index them."""
+        if not self._pending:
+            return
+        records, self._pending = self._pending, []
+        blob = _encode_chunk(records, self.compress_level)
+
+        if self._writer is None:
+            self._writer = open(self._data_path, "ab")
+        offset = self._writer.tell()
+        self._writer.write(blob)
+        self._writer.flush()
+        os.fsync(self._writer.fileno())
+
+        with self._conn:
+            chunk_id = self._conn.execute(
+                "INSERT INTO chunks (offset, length, count) VALUES (?, ?, ?)", (offset, len(blob), len(records))
+            ).lastrowid
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rows (doc_id, page, region_id, chunk_id, row) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (str(record.get("doc_id") or ""), int(record.get("page") or 0), str(record.get("region_id") or ""),
+                     chunk_id, row)
+                    for row, record in enumerate(records)
+                ],
+            )
+
+    def _header(self, chunk_id: int) -> Tuple[int, Dict[str, Any]]:
+        if chunk_id not in self._headers:
+            offset = self._conn.execute("SELECT offset FROM chunks WHERE chunk_id = ?", (chunk_id,)).fetchone()[0]
+            if self._reader is None:
+                self._reader = open(self._data_path, "rb")
+            self._reader.seek(offset)
+            (header_length,) = struct.unpack("<I", self._reader.read(4))
+            header = json.loads(self._reader.read(header_length))
+            self._headers[chunk_id] = (offset + 4 + header_length, header)
+        return self._headers[chunk_id]
+
+    def _column(self, chunk_id: int, name: str) -> Dict[int, Any]:
+        key = (chunk_id, name)
+        if key in self._columns:
+            self._columns.move_to_end(key)
+            return self._columns[key]
+
+        base, header = self._header(chunk_id)
+        location = header["columns"].get(name)
+        values: Dict[int, Any] = {}
+        if location is not None:
+            self._reader.seek(base + location[0])
+            payload = json.loads(zlib.decompress(self._reader.read(location[1])))
+            if isinstance(payload, list):
+                values = dict(enumerate(payload))
+            else:
+                values = dict(zip(payload["rows"], payload["values"]))
+
+        self._columns[key] = values
+        while len(self._columns) > _COLUMN_CACHE_SIZE:
+            self._columns.popitem(last=False)
+        return values
+
+    def _read(self, chunk_id: int, row: int, fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+        names = fields if fields is not None else list(self._header(chunk_id)[1]["columns"])
+        record = {}
+        for name in names:
+            column = self._column(chunk_id, name)
+            if row in column:
+                record[name] = column[row]
+        return record
+
+    def get(
+        self,
+        doc_id: str,
+        page: int,
+        region_id: Optional[str] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Return one record (only the given fields, if any), or None if it is not stored."""
+        self.flush()
+        location = self._conn.execute(
+            "SELECT chunk_id, row FROM rows WHERE doc_id = ? AND page = ? AND region_id = ?",
+            (doc_id or "", int(page), region_id or ""),
+        ).fetchone()
+        return self._read(*location, fields) if location is not None else None
+
+    def iter_records(
+        self,
+        fields: Optional[Sequence[str]] = None,
+        doc_id: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream current records in write order, decoding one chunk at a time.
+
+        Args:
+            fields: Only decode and return these fields (None = all)
+            doc_id: Only records of this document
+        """
+        self.flush()
+        query = "SELECT chunk_id, row FROM rows"
+        params: Tuple[Any, ...] = ()
+        if doc_id is not None:
+            query += " WHERE doc_id = ?"
+            params = (doc_id,)
+        for chunk_id, row in self._conn.execute(query + " ORDER BY chunk_id, row", params):
+            yield self._read(chunk_id, row, fields)
+
+    def keys(self, doc_id: Optional[str] = None) -> List[Tuple[str, int, str]]:
+        """(doc_id, page, region_id) of every stored record, sorted."""
+        self.flush()
+        query = "SELECT doc_id, page, region_id FROM rows"
+        if doc_id is not None:
+            return self._conn.execute(query + " WHERE doc_id = ? ORDER BY page, region_id", (doc_id,)).fetchall()
+        return self._conn.execute(query + " ORDER BY doc_id, page, region_id").fetchall()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0] + len(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return record and chunk counts and the size of the data file."""
+        chunks, stored = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(count), 0) FROM chunks").fetchone()
+        return {
+            "records": len(self),
+            "superseded": stored - self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0],
+            "chunks": chunks,
+            "bytes": os.path.getsize(self._data_path) if os.path.exists(self._data_path) else 0,
+        }
+
+    def close(self) -> None:
+        self.flush()
+        for handle in (self._writer, self._reader):
+            if handle is not None:
+                handle.close()
+        self._writer = self._reader = None
+        self._conn.close()
+
+    def __enter__(self) -> "ExtractionStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
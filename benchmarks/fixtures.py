@@ -0,0 +1,234 @@
+"""
+fixtures.py
+Deterministic inputs and model stubs for the benchmark harness.
+
+make_synthetic_pdf draws reports with a configurable share of bar-chart and
+table pages between prose pages. The stub models stand in for ChandraOCR,
+LayoutLMv3 and the embedder: their output depends only on the input pixels
+or text, they need no weights or network, and they still go through the same
+call paths (image decode, padded batches, decoding) as the real models.
+"""
+
+import hashlib
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+
+METRICS = ["Revenue", "EBITDA", "Operating margin", "Net income", "Free cash flow", "Headcount", "Capex", "Market share"]
+SEGMENTS = ["North America", "Europe", "Asia Pacific", "Retail", "Wholesale", "Services", "Cloud", "Hardware"]
+YEARS = [str(year) for year in range(2016, 2025)]
+WORDS = (
+    "the group reported stronger demand across segments while costs remained under pressure from "
+    "supply chain constraints and higher energy prices management expects growth to continue"
+).split()
+
+
+def _draw_prose(page, rng: random.Random, top: float = 72) -> None:
+    lines = [" ".join(rng.choice(WORDS) for _ in range(14)) for _ in range(rng.randint(20, 40))]
+    page.insert_textbox(fitz.Rect(72, top, page.rect.width - 72, page.rect.height - 72), "\n".join(lines), fontsize=9)
+
+
+def _draw_bar_chart(page, rng: random.Random) -> None:
+    title = f"{rng.choice(METRICS)} by year ({rng.choice(SEGMENTS)})"
+    page.insert_text((72, 90), title, fontsize=14)
+    left, bottom, width, height = 90, 420, 420, 280
+    page.draw_line((left, bottom), (left + width, bottom))
+    page.draw_line((left, bottom), (left, bottom - height))
+    years = YEARS[-rng.randint(4, 8):]
+    bar_width = width / (len(years) * 1.5)
+    for i, year in enumerate(years):
+        value = rng.uniform(0.2, 1.0)
+        x = left + 10 + i * bar_width * 1.5
+        page.draw_rect(fitz.Rect(x, bottom - value * height, x + bar_width, bottom), color=(0, 0, 0), fill=(0.2, 0.4, 0.8))
+        page.insert_text((x, bottom + 14), year, fontsize=8)
+        page.insert_text((x, bottom - value * height - 4), f"{value * 100:.1f}", fontsize=7)
+    _draw_prose(page, rng, top=460)
+
+
+def _draw_table(page, rng: random.Random) -> None:
+    page.insert_text((72, 90), f"{rng.choice(METRICS)} by segment", fontsize=14)
+    years = YEARS[-4:]
+    rows = rng.sample(SEGMENTS, rng.randint(4, 7))
+    cell_w, cell_h, left, top = 100, 20, 72, 110
+    for r, label in enumerate(["Segment"] + rows):
+        for c, text in enumerate([label] + (years if r == 0 else [f"{rng.uniform(1, 900):,.1f}" for _ in years])):
+            cell = fitz.Rect(left + c * cell_w, top + r * cell_h, left + (c + 1) * cell_w, top + (r + 1) * cell_h)
+            page.draw_rect(cell, color=(0, 0, 0), width=0.5)
+            page.insert_text((cell.x0 + 4, cell.y1 - 6), text, fontsize=8)
+    _draw_prose(page, rng, top=top + (len(rows) + 2) * cell_h)
+
+
+def make_synthetic_pdf(
+    path: str,
+    pages: int = 20,
+    chart_density: float = 0.3,
+    table_density: float = 0.2,
+    seed: int = 0,
+    page_size: str = "letter",
+) -> Dict[str, Any]:
+    """
+    Write a synthetic report PDF.
+
+    Args:
+        path: Output PDF path
+        pages: Number of pages
+        chart_density: Share of pages with a bar chart
+        table_density: Share of pages with a table
+        seed: Random seed (same seed, same file contents)
+        page_size: PyMuPDF paper size name, e.g. "letter", "a4" or "a0" for large-format pages
+
+    Returns:
+        Dictionary with the path and the page numbers of each page kind
+    """
+    rng = random.Random(seed)
+    kinds = ["chart"] * round(pages * chart_density) + ["table"] * round(pages * table_density)
+    kinds = (kinds + ["prose"] * pages)[:pages]
+    rng.shuffle(kinds)
+
+    width, height = fitz.paper_size(page_size)
+    document = fitz.open()
+    for kind in kinds:
+        page = document.new_page(width=width, height=height)
+        {"chart": _draw_bar_chart, "table": _draw_table, "prose": _draw_prose}[kind](page, rng)
+    document.save(path, garbage=3, deflate=True)
+    document.close()
+
+    return {
+        "path": path,
+        "pages": pages,
+        "chart_pages": [i + 1 for i, kind in enumerate(kinds) if kind == "chart"],
+        "table_pages": [i + 1 for i, kind in enumerate(kinds) if kind == "table"],
+    }
+
+
+def make_queries(count: int, seed: int = 0) -> List[str]:
+    """Deterministic analyst-style questions over the synthetic reports."""
+    rng = random.Random(seed)
+    templates = [
+        "What was {metric} in {year}?",
+        "How did {metric} for {segment} change between {year} and {year2}?",
+        "Which segment had the highest {metric} in {year}?",
+        "Show the {metric} trend for {segment}",
+    ]
+    return [
+        rng.choice(templates).format(
+            metric=rng.choice(METRICS).lower(), segment=rng.choice(SEGMENTS), year=rng.choice(YEARS), year2=rng.choice(YEARS)
+        )
+        for _ in range(count)
+    ]
+
+
+def _thumbnail_digest(image) -> str:
+    # Decode like the real models do, then hash a small thumbnail
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    thumbnail = image.convert("L").resize((32, 32))
+    return hashlib.sha1(thumbnail.tobytes()).hexdigest()
+
+
+class StubOCR:
+    """
+    Stand-in for ChandraOCR with the same extract() result keys.
+
+    Args:
+        delay_ms: Extra time per call to mimic model latency (0 = decode cost only)
+    """
+
+    def __init__(self, delay_ms: float = 0.0):
+        self.delay_ms = delay_ms
+
+    def extract(self, image) -> Dict[str, Any]:
+        digest = _thumbnail_digest(image)
+        rng = random.Random(digest)
+        if self.delay_ms:
+            time.sleep(self.delay_ms / 1000)
+        labels = YEARS[-rng.randint(3, 6):]
+        values = [round(rng.uniform(1, 900), 1) for _ in labels]
+        metric = rng.choice(METRICS)
+        return {
+            "chart_type": rng.choice(["bar_chart", "line_chart", "table"]),
+            "title": f"{metric} ({rng.choice(SEGMENTS)})",
+            "text": " ".join(f"{label}: {value}" for label, value in zip(labels, values)),
+            "data": dict(zip(labels, values)),
+            "values": values,
+            "labels": labels,
+        }
+
+
+class _StubTokenizer:
+    def convert_ids_to_tokens(self, ids) -> List[str]:
+        return [WORDS[int(i) % len(WORDS)] for i in ids]
+
+
+class StubLayoutProcessor:
+    """Turns each page into a pixel-derived token sequence with LayoutLMv3's padded batch layout."""
+
+    def __init__(self, max_tokens: int = 256):
+        self.max_tokens = max_tokens
+        self.tokenizer = _StubTokenizer()
+
+    def __call__(self, images, return_tensors: str = "pt", padding: str = "longest"):
+        import torch
+
+        sequences = []
+        for image in images:
+            pixels = image.convert("L").resize((32, self.max_tokens // 32)).tobytes()
+            # Blank rows at the end become padding, so batches have uneven lengths
+            sequences.append(list(pixels.rstrip(b"\xff")) or [0])
+        length = max(len(sequence) for sequence in sequences)
+        input_ids = torch.zeros((len(sequences), length), dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), length), dtype=torch.long)
+        for i, sequence in enumerate(sequences):
+            input_ids[i, :len(sequence)] = torch.tensor(sequence)
+            attention_mask[i, :len(sequence)] = 1
+        return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+
+class StubLayoutModel:
+    """Token classifier whose labels depend only on the input ids."""
+
+    config = SimpleNamespace(id2label={0: "O", 1: "B-TEXT"})
+
+    def __call__(self, input_ids, attention_mask=None, **kwargs):
+        import torch
+
+        keep = (input_ids % 5 == 0).float()
+        return SimpleNamespace(logits=torch.stack([1 - keep, keep], dim=-1))
+
+
+def stub_layoutlm():
+    """(processor, model) stubs, or (None, None) when torch is not installed."""
+    try:
+        import torch  # noqa: F401
+    except ImportError:
+        return None, None
+    return StubLayoutProcessor(), StubLayoutModel()
+
+
+def stub_embeddings(size: int = 384):
+    """Hash-based embeddings: the same text always maps to the same vector."""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    return DeterministicFakeEmbedding(size=size)
+
+
+def install_stub_models(ocr_delay_ms: float = 0.0) -> Dict[str, str]:
+    """
+    Register stub OCR and LayoutLM models in the shared registry so pipeline code picks them up.
+
+    Returns:
+        What each model slot is served by, for the results file
+    """
+    from utils.model_registry import models
+
+    import Extraction.data_extraction  # noqa: F401  (registers the real loaders first)
+
+    models.register("chandra", lambda: StubOCR(ocr_delay_ms))
+    models.register("layoutlm", stub_layoutlm)
+    has_torch = stub_layoutlm()[0] is not None
+    return {"chandra": "stub", "layoutlm": "stub" if has_torch else "skipped (torch not installed)"}
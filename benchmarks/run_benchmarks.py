@@ -0,0 +1,405 @@
+"""
+run_benchmarks.py
+Reproducible end-to-end performance benchmark.
+
+Generates synthetic PDFs, then times each stage of the chart pipeline:
+render (pdf_to_images), extract (extract_from_document), index
+(build_vectorstore) and query (similarity search + format_for_llm). Models
+are deterministic stubs by default (see fixtures.py), so a run needs no GPU,
+weights or network. Results go to a JSON file that can be compared against
+a stored baseline.
+
+Usage:
+    python -m benchmarks.run_benchmarks --pages 50 --output bench.json
+    python -m benchmarks.run_benchmarks --baseline baseline.json --fail-on-regression
+    python -m benchmarks.run_benchmarks --models real --embedder onnx-int8
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Keep Hugging Face libraries from reaching for the network
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import numpy as np
+
+from benchmarks.fixtures import install_stub_models, make_queries, make_synthetic_pdf, stub_embeddings
+
+
+# Metrics where a larger value is better; everything else compared is "lower is better"
+HIGHER_IS_BETTER = ("pages_per_sec", "records_per_sec", "queries_per_sec")
+COMPARED_SUFFIXES = HIGHER_IS_BETTER + ("_ms", "_mb", "_bytes")
+
+# Top-level packages whose loggers report per page
+_PIPELINE_LOGGERS = ("Extraction", "fusion", "pipeline", "retrieval", "utils")
+
+
+def _peak_rss_mb() -> Dict[str, float]:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {}
+    p50, p95, p99 = np.percentile(samples_ms, [50, 95, 99])
+    return {
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(np.mean(samples_ms)), 3),
+    }
+
+
+@contextlib.contextmanager
+def _quiet(enabled: bool):
+    # Pipeline modules log per page at INFO; keep the benchmark output readable
+    if not enabled:
+        yield
+        return
+    loggers = [logging.getLogger(name) for name in _PIPELINE_LOGGERS]
+    levels = [logger.level for logger in loggers]
+    for logger in loggers:
+        logger.setLevel(logging.WARNING)
+    try:
+        yield
+    finally:
+        for logger, level in zip(loggers, levels):
+            logger.setLevel(level)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    pages: int = 20,
+    documents: int = 1,
+    chart_density: float = 0.3,
+    table_density: float = 0.2,
+    page_size: str = "letter",
+    queries: int = 200,
+    k: int = 3,
+    render_workers: int = 1,
+    in_memory: bool = False,
+    dpi_multiplier: Optional[float] = None,
+    models: str = "stub",
+    embedder: str = "stub",
+    ocr_delay_ms: float = 0.0,
+    prompt_max_tokens: Optional[int] = None,
+    seed: int = 0,
+    work_dir: Optional[str] = None,
+    verbose: bool = False,
+) -> Dict[str, Any]:
+    """
+    Run every stage once over synthetic documents and collect metrics.
+
+    Args:
+        pages: Pages per synthetic document
+        documents: Number of synthetic documents
+        chart_density: Share of pages with a bar chart
+        table_density: Share of pages with a table
+        page_size: PyMuPDF paper size of the synthetic pages ("letter", "a4", "a0", ...)
+        queries: Queries timed in the query stage
+        k: Documents retrieved per query
+        render_workers: Processes for page rendering
+        in_memory: Pass PIL images from render to extract instead of PNG files
+        dpi_multiplier: Render zoom factor (None = OCR render policy)
+        models: "stub" (deterministic stand-ins) or "real" (registered ChandraOCR/LayoutLMv3)
+        embedder: "stub" or an embedding backend ("torch", "onnx", "onnx-int8")
+        ocr_delay_ms: Simulated per-page latency of the stub OCR model
+        prompt_max_tokens: Token budget passed to format_for_llm (None = unbounded)
+        seed: Seed for documents and queries
+        work_dir: Where PDFs, images and the index are written (default: a temp dir)
+        verbose: Show the pipeline's own per-page output
+
+    Returns:
+        Results dictionary (see main() for the file layout)
+    """
+    installed = install_stub_models(ocr_delay_ms) if models == "stub" else {"chandra": "real", "layoutlm": "real"}
+    installed["embeddings"] = embedder
+
+    from Extraction.data_extraction import extract_from_document
+    from fusion.fusion import format_for_llm
+    from retrieval.embedding_backends import create_embeddings
+    from retrieval.retrieval import build_vectorstore, save_vectorstore
+    from utils.pdf_processor import pdf_to_images
+
+    embedding_model = stub_embeddings() if embedder == "stub" else create_embeddings(backend=embedder)
+
+    owns_work_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="chart-bench-")
+    stages: Dict[str, Dict[str, Any]] = {}
+    memory: Dict[str, Dict[str, float]] = {}
+
+    pdfs = [
+        make_synthetic_pdf(
+            os.path.join(work_dir, f"doc_{i}.pdf"), pages, chart_density, table_density, seed=seed + i, page_size=page_size
+        )
+        for i in range(documents)
+    ]
+    total_pages = pages * documents
+
+    # Render
+    rendered: List[Tuple[str, List[Any]]] = []
+    start = time.perf_counter()
+    with _quiet(not verbose):
+        for i, pdf in enumerate(pdfs):
+            images = pdf_to_images(
+                pdf["path"], output_dir=os.path.join(work_dir, "images", f"doc_{i}"),
+                dpi_multiplier=dpi_multiplier, num_workers=render_workers, in_memory=in_memory,
+            )
+            rendered.append((f"doc_{i}", images))
+    seconds = time.perf_counter() - start
+    stages["render"] = {"pages": total_pages, "seconds": round(seconds, 3), "pages_per_sec": round(total_pages / seconds, 2)}
+    if not in_memory:
+        stages["render"]["image_bytes"] = _dir_bytes(os.path.join(work_dir, "images"))
+    memory["after_render"] = _peak_rss_mb()
+
+    # Extract
+    records: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+    with _quiet(not verbose):
+        for doc_id, images in rendered:
+            records.extend(
+                dict(record, doc_id=doc_id)
+                for record in extract_from_document(
+                    images, output_dir=os.path.join(work_dir, "extracted", doc_id), use_cache=False, doc_id=doc_id
+                )
+            )
+    seconds = time.perf_counter() - start
+    stages["extract"] = {
+        "pages": total_pages,
+        "records": len(records),
+        "seconds": round(seconds, 3),
+        "pages_per_sec": round(total_pages / seconds, 2),
+        "store_bytes": _dir_bytes(os.path.join(work_dir, "extracted")),
+    }
+    rendered.clear()
+    memory["after_extract"] = _peak_rss_mb()
+
+    # Index
+    index_path = os.path.join(work_dir, "faiss_index")
+    start = time.perf_counter()
+    with _quiet(not verbose):
+        vectorstore = build_vectorstore(records, embedding_model=embedding_model)
+    seconds = time.perf_counter() - start
+    with _quiet(not verbose):
+        save_vectorstore(vectorstore, index_path)
+    stages["index"] = {
+        "records": len(records),
+        "seconds": round(seconds, 3),
+        "records_per_sec": round(len(records) / seconds, 2) if seconds else None,
+        "index_bytes": _dir_bytes(index_path),
+    }
+    memory["after_index"] = _peak_rss_mb()
+
+    # Query: retrieval and prompt build, timed separately and together
+    search_ms, prompt_ms, total_ms = [], [], []
+    query_texts = make_queries(queries, seed)
+    with _quiet(not verbose):
+        vectorstore.similarity_search(query_texts[0], k=k)  # warm-up
+        for query in query_texts:
+            start = time.perf_counter()
+            docs = vectorstore.similarity_search(query, k=k)
+            middle = time.perf_counter()
+            format_for_llm(docs, query, max_tokens=prompt_max_tokens)
+            end = time.perf_counter()
+            search_ms.append((middle - start) * 1000)
+            prompt_ms.append((end - middle) * 1000)
+            total_ms.append((end - start) * 1000)
+    query_seconds = sum(total_ms) / 1000
+    stages["query"] = {
+        "queries": queries,
+        "queries_per_sec": round(queries / query_seconds, 2) if query_seconds else None,
+        **_percentiles(total_ms),
+        "search": _percentiles(search_ms),
+        "prompt": _percentiles(prompt_ms),
+    }
+    memory["peak"] = _peak_rss_mb()
+
+    if owns_work_dir:
+        import shutil
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "models": installed,
+        },
+        "config": {
+            "pages": pages, "documents": documents, "chart_density": chart_density, "table_density": table_density,
+            "page_size": page_size, "queries": queries, "k": k, "render_workers": render_workers,
+            "in_memory": in_memory, "dpi_multiplier": dpi_multiplier, "ocr_delay_ms": ocr_delay_ms,
+            "prompt_max_tokens": prompt_max_tokens, "seed": seed,
+        },
+        "stages": stages,
+        "memory_mb": memory,
+    }
+
+
+def _flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare_results(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float = 0.10,
+    min_delta_ms: float = 0.05,
+) -> Dict[str, Any]:
+    """
+    Compare two results files metric by metric.
+
+    Throughput metrics (*_per_sec) regress when they drop by more than
+    tolerance; latency, size and memory metrics (*_ms, *_bytes, memory_mb)
+    regress when they grow by more than tolerance.
+
+    Args:
+        current: Results of this run
+        baseline: Stored baseline results
+        tolerance: Allowed relative change before a metric counts as a regression
+        min_delta_ms: Latency changes smaller than this are timer noise, never regressions
+
+    Returns:
+        Dictionary with per-metric changes, the list of regressions and a
+        config_match flag (comparisons across different configs are not meaningful)
+    """
+    now = _flatten({"stages": current.get("stages", {}), "memory_mb": current.get("memory_mb", {})})
+    before = _flatten({"stages": baseline.get("stages", {}), "memory_mb": baseline.get("memory_mb", {})})
+
+    changes, regressions = {}, []
+    for name in sorted(set(now) & set(before)):
+        is_memory = name.startswith("memory_mb.")
+        if not (is_memory or name.endswith(COMPARED_SUFFIXES)) or not before[name]:
+            continue
+        change = (now[name] - before[name]) / before[name]
+        higher_is_better = name.endswith(HIGHER_IS_BETTER)
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        if name.endswith("_ms") and abs(now[name] - before[name]) < min_delta_ms:
+            regressed = False
+        changes[name] = {"baseline": before[name], "current": now[name], "change": round(change, 4), "regressed": regressed}
+        if regressed:
+            regressions.append(name)
+
+    return {
+        "config_match": current.get("config") == baseline.get("config"),
+        "tolerance": tolerance,
+        "changes": changes,
+        "regressions": regressions,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark render, extract, index and query stages on synthetic PDFs.")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per synthetic document")
+    parser.add_argument("--documents", type=int, default=1, help="Number of synthetic documents")
+    parser.add_argument("--chart-density", type=float, default=0.3, help="Share of pages with a chart")
+    parser.add_argument("--table-density", type=float, default=0.2, help="Share of pages with a table")
+    parser.add_argument("--page-size", default="letter", help="Paper size of synthetic pages (letter, a4, a0, ...)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries in the latency test")
+    parser.add_argument("--k", type=int, default=3, help="Documents retrieved per query")
+    parser.add_argument("--render-workers", type=int, default=1, help="Processes for page rendering")
+    parser.add_argument("--in-memory", action="store_true", help="Skip the PNG round-trip between render and extract")
+    parser.add_argument("--dpi-multiplier", type=float, default=None,
+                        help="Fixed render zoom factor (default: OCR render policy)")
+    parser.add_argument("--models", choices=["stub", "real"], default="stub", help="OCR/LayoutLM models")
+    parser.add_argument("--embedder", choices=["stub", "torch", "onnx", "onnx-int8"], default="stub")
+    parser.add_argument("--ocr-delay-ms", type=float, default=0.0, help="Simulated per-page stub OCR latency")
+    parser.add_argument("--prompt-max-tokens", type=int, default=None, help="Token budget for format_for_llm")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=None, help="Keep generated files here instead of a temp dir")
+    parser.add_argument("--output", default="benchmark_results.json", help="Results file")
+    parser.add_argument("--baseline", default=None, help="Baseline results file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write the results to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Relative change allowed before a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on any regression")
+    parser.add_argument("--verbose", action="store_true", help="Show per-page pipeline output")
+    parser.add_argument("--trace", default=None, help="Also record stage spans and write a Chrome trace-event JSON file")
+    args = parser.parse_args(argv)
+
+    from utils.telemetry import configure_logging, telemetry
+    configure_logging("INFO" if args.verbose else "WARNING")
+    if args.trace:
+        telemetry.enable()
+
+    results = run_benchmark(
+        pages=args.pages, documents=args.documents, chart_density=args.chart_density,
+        table_density=args.table_density, page_size=args.page_size, queries=args.queries, k=args.k,
+        render_workers=args.render_workers, in_memory=args.in_memory, dpi_multiplier=args.dpi_multiplier,
+        models=args.models, embedder=args.embedder, ocr_delay_ms=args.ocr_delay_ms,
+        prompt_max_tokens=args.prompt_max_tokens, seed=args.seed, work_dir=args.work_dir, verbose=args.verbose,
+    )
+
+    status = 0
+    if args.baseline and os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r') as f:
+            comparison = compare_results(results, json.load(f), args.tolerance)
+        results["comparison"] = comparison
+        if not comparison["config_match"]:
+            print("Warning: baseline was recorded with a different config")
+        for name in comparison["regressions"]:
+            change = comparison["changes"][name]
+            print(f"✗ Regression {name}: {change['baseline']} -> {change['current']} ({change['change']:+.1%})")
+        if not comparison["regressions"]:
+            print(f"✓ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        elif args.fail_on_regression:
+            status = 1
+
+    if args.trace:
+        telemetry.write_trace(args.trace)
+        results["telemetry"] = telemetry.snapshot()
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"✓ Saved benchmark results to {args.output}")
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"✓ Saved baseline to {args.baseline}")
+
+    for name, stage in results["stages"].items():
+        rate = next((f"{stage[key]} {key.replace('_per_sec', '')}/s" for key in HIGHER_IS_BETTER if stage.get(key)), "")
+        latency = f", p50 {stage['p50_ms']}ms p95 {stage['p95_ms']}ms p99 {stage['p99_ms']}ms" if "p50_ms" in stage else ""
+        print(f"  {name:8s} {rate}{latency}")
+    print(f"  peak RSS {results['memory_mb']['peak']} MB")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
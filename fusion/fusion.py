@@ -1,29 +1,13 @@
 # fusion.py
 
-def format_for_llm(retrieved_docs, query):
-    """
-    Advanced fusion: constructs a rich, well-structured prompt for multimodal RAG QA over charts/tables/doc context.
-    """
-    evidence_blocks = []
-    for idx, doc in enumerate(retrieved_docs, 1):
-        md = getattr(doc, "metadata", {}) if hasattr(doc, "metadata") else {}
-        block = [f"[Evidence {idx}]"]
-        if md.get("type"):
-            block.append(f"Type: {md['type']}")
-        if md.get("title"):
-            block.append(f"Title: {md['title']}")
-        if md.get("page"):
-            block.append(f"Page: {md['page']}")
-        if md.get("caption"):
-            block.append(f"Caption: {md['caption']}")
-        content = getattr(doc, "page_content", None) or doc.get("page_content", "")
-        if content:
-            block.append(f"Extracted Content:\n{content.strip()}")
-        evidence_blocks.append("\n".join(block))
+import re
+
+from utils.config import FUSION_DEDUP_THRESHOLD
+from utils.telemetry import profiled, traced
 
-    evidence_str = "\n\n====\n\n".join(evidence_blocks)
 
-    prompt = (
+def _build_prompt(query, evidence_str):
+    return (
         "You are a highly accurate question-answering assistant for scientific, financial, and medical documents containing charts and tables.\n"
         "Your goal: Given the user question and retrieved evidence from multiple modalities (charts, tables, context), synthesize a clear, fact-based answer.\n"
         "Instructions:\n"
@@ -38,4 +22,185 @@ def format_for_llm(retrieved_docs, query):
         f"{evidence_str}\n\n"
         "Please provide your detailed answer below, referencing the most relevant evidence and clearly citing page, chart, or table where used."
     )
-    return prompt
+
+
+def _evidence_header(idx, doc):
+    md = getattr(doc, "metadata", {}) if hasattr(doc, "metadata") else {}
+    block = [f"[Evidence {idx}]"]
+    if md.get("type"):
+        block.append(f"Type: {md['type']}")
+    if md.get("title"):
+        block.append(f"Title: {md['title']}")
+    if md.get("page"):
+        block.append(f"Page: {md['page']}")
+    if md.get("caption"):
+        block.append(f"Caption: {md['caption']}")
+    return block
+
+
+def _doc_content(doc):
+    content = getattr(doc, "page_content", None)
+    if content is None and isinstance(doc, dict):
+        content = doc.get("page_content", "")
+    return (content or "").strip()
+
+
+@traced("prompt_build")
+@profiled
+def format_for_llm(retrieved_docs, query, max_tokens=None, tokenizer=None, chart_tables=None):
+    """
+    Advanced fusion: constructs a rich, well-structured prompt for multimodal RAG QA over charts/tables/doc context.
+    When max_tokens is given, evidence is deduplicated, trimmed and packed to fit (see pack_evidence).
+    chart_tables (e.g. ChartDataTable.as_evidence(query)) are compact data tables placed before the retrieved evidence.
+    """
+    if chart_tables:
+        retrieved_docs = list(chart_tables) + list(retrieved_docs)
+
+    if max_tokens is not None:
+        prompt, _ = pack_evidence(retrieved_docs, query, max_tokens, tokenizer=tokenizer)
+        return prompt
+
+    evidence_blocks = []
+    for idx, doc in enumerate(retrieved_docs, 1):
+        block = _evidence_header(idx, doc)
+        content = _doc_content(doc)
+        if content:
+            block.append(f"Extracted Content:\n{content}")
+        evidence_blocks.append("\n".join(block))
+
+    evidence_str = "\n\n====\n\n".join(evidence_blocks)
+    return _build_prompt(query, evidence_str)
+
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_tokens(text, tokenizer=None):
+    """
+    Count tokens with a tokenizer (anything with encode(), or a callable returning tokens).
+    Without one, words and punctuation marks are counted as a rough approximation.
+    """
+    if tokenizer is None:
+        return len(_WORD_RE.findall(text))
+    if hasattr(tokenizer, "encode"):
+        return len(tokenizer.encode(text))
+    return len(tokenizer(text))
+
+
+def _split_units(content):
+    # Table rows stay whole; prose lines are split into sentences
+    units = []
+    for line in content.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if "|" in line or "\t" in line:
+            units.append(line)
+        else:
+            units.extend(s for s in _SENTENCE_RE.split(line) if s)
+    return units
+
+
+def _terms(text):
+    return {w for w in _WORD_RE.findall(text.lower()) if w.isalnum()}
+
+
+def _shingles(text, n=3):
+    words = [w for w in _WORD_RE.findall(text.lower()) if w.isalnum()]
+    return {tuple(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+
+
+def pack_evidence(retrieved_docs, query, max_tokens, tokenizer=None, dedup_threshold=FUSION_DEDUP_THRESHOLD):
+    """
+    Budget-aware fusion: fit retrieved evidence into max_tokens of prompt.
+
+    Blocks are taken in retrieval (relevance) order. Blocks that mostly repeat
+    an earlier one are dropped, repeated sentences/rows are skipped, and each
+    block keeps its sentences or table rows most relevant to the query (in
+    their original order) until the budget is used up.
+
+    Returns:
+        Tuple of (prompt, report) where report has one entry per retrieved doc
+        with the tokens it used and how many units were kept.
+    """
+    query_terms = _terms(query)
+    budget = max_tokens - count_tokens(_build_prompt(query, ""), tokenizer)
+    separator_tokens = count_tokens("\n\n====\n\n", tokenizer)
+
+    evidence_blocks = []
+    report = []
+    seen_shingles = []
+    seen_units = set()
+
+    for idx, doc in enumerate(retrieved_docs, 1):
+        content = _doc_content(doc)
+        md = getattr(doc, "metadata", {}) if hasattr(doc, "metadata") else {}
+        entry = {"evidence": idx, "page": md.get("page"), "type": md.get("type"), "tokens": 0}
+        report.append(entry)
+
+        shingles = _shingles(content)
+        if any(len(shingles & prev) / (len(shingles | prev) or 1) >= dedup_threshold for prev in seen_shingles):
+            entry["dropped"] = "duplicate"
+            continue
+
+        header = _evidence_header(len(evidence_blocks) + 1, doc)
+        cost = count_tokens("\n".join(header), tokenizer) + (separator_tokens if evidence_blocks else 0)
+        if cost > budget:
+            entry["dropped"] = "budget"
+            continue
+
+        units = []
+        block_units = set()
+        for unit in _split_units(content):
+            normalized = " ".join(unit.lower().split())
+            if normalized not in seen_units and normalized not in block_units:
+                block_units.add(normalized)
+                units.append(unit)
+        if content and not units:
+            entry["dropped"] = "duplicate"
+            continue
+
+        # Table rows also match the query through their header row, so a question
+        # naming a column keeps that column's rows and not just the header
+        table_rows = [i for i, unit in enumerate(units) if "|" in unit or "\t" in unit]
+        header_terms = _terms(units[table_rows[0]]) if table_rows else set()
+        overlap = [
+            len(query_terms & (_terms(unit) | (header_terms if i in table_rows else set())))
+            for i, unit in enumerate(units)
+        ]
+        # Units sharing no terms with the query are only kept when nothing else matches
+        ranked = sorted(range(len(units)), key=lambda i: overlap[i], reverse=True)
+        if any(overlap):
+            ranked = [i for i in ranked if overlap[i]]
+        kept = set()
+        label_tokens = count_tokens("Extracted Content:", tokenizer)
+        for i in ranked:
+            unit_tokens = count_tokens(units[i], tokenizer) + (0 if kept else label_tokens)
+            if cost + unit_tokens > budget:
+                continue
+            kept.add(i)
+            cost += unit_tokens
+
+        # Kept table rows need their header row to stay readable
+        if table_rows and table_rows[0] not in kept and kept & set(table_rows):
+            header_tokens = count_tokens(units[table_rows[0]], tokenizer)
+            if cost + header_tokens <= budget:
+                kept.add(table_rows[0])
+                cost += header_tokens
+
+        block = list(header)
+        if kept:
+            block.append("Extracted Content:\n" + "\n".join(units[i] for i in sorted(kept)))
+        elif content:
+            entry["dropped"] = "budget"
+            continue
+
+        seen_shingles.append(shingles)
+        seen_units.update(" ".join(units[i].lower().split()) for i in kept)
+        evidence_blocks.append("\n".join(block))
+        budget -= cost
+        entry.update(tokens=cost, units_kept=len(kept), units_total=len(units))
+
+    evidence_str = "\n\n====\n\n".join(evidence_blocks)
+    return _build_prompt(query, evidence_str), report
@@ -0,0 +1,341 @@
+"""
+batch_ingest.py
+Batch ingestion of a PDF corpus into one shared FAISS index.
+
+Documents are extracted concurrently in a process pool. Progress is kept
+per document and per page in a SQLite job-state file, so a crashed or
+killed run resumes from the last completed page instead of starting over.
+
+Usage:
+    python -m pipeline.batch_ingest reports/ --workers 4
+    python -m pipeline.batch_ingest manifest.jsonl --index-path corpus_index
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from Extraction.data_extraction import extract_from_document
+from Extraction.extraction_store import ExtractionStore
+from retrieval.index_manager import IndexManager
+from retrieval.retrieval import RECORD_FIELDS
+from utils.config import FAISS_INDEX_PATH, JOB_STATE_PATH, INGEST_SAVE_EVERY
+from utils.pdf_processor import get_pdf_page_count, iter_pdf_images
+from utils.telemetry import configure_logging, telemetry
+from utils.text_processor import chunks_to_records, partition_and_chunk
+
+logger = logging.getLogger(__name__)
+
+
+class JobState:
+    """
+    Job-state file shared by the coordinator and the worker processes.
+
+    Document status moves pending -> extracting -> extracted -> indexed;
+    failed documents are retried on the next run. Completed pages are
+    recorded one by one while a document is being extracted.
+
+    Args:
+        path: Path to the SQLite state file
+    """
+
+    def __init__(self, path: str = JOB_STATE_PATH):
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "doc_id TEXT PRIMARY KEY, path TEXT NOT NULL, status TEXT NOT NULL, "
+            "pages_total INTEGER, error TEXT, updated REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "doc_id TEXT NOT NULL, page INTEGER NOT NULL, PRIMARY KEY (doc_id, page))"
+        )
+        self._conn.commit()
+
+    def register(self, doc_id: str, path: str) -> None:
+        self._conn.execute(
+            "INSERT OR IGNORE INTO documents (doc_id, path, status, updated) VALUES (?, ?, 'pending', ?)",
+            (doc_id, path, time.time()),
+        )
+        self._conn.commit()
+
+    def set_status(self, doc_id: str, status: str, error: Optional[str] = None, pages_total: Optional[int] = None) -> None:
+        self._conn.execute(
+            "UPDATE documents SET status = ?, error = ?, pages_total = COALESCE(?, pages_total), updated = ? "
+            "WHERE doc_id = ?",
+            (status, error, pages_total, time.time(), doc_id),
+        )
+        self._conn.commit()
+
+    def mark_page_done(self, doc_id: str, page: int) -> None:
+        self._conn.execute("INSERT OR IGNORE INTO pages (doc_id, page) VALUES (?, ?)", (doc_id, page))
+        self._conn.commit()
+
+    def done_pages(self, doc_id: str) -> Set[int]:
+        return {row[0] for row in self._conn.execute("SELECT page FROM pages WHERE doc_id = ?", (doc_id,))}
+
+    def documents(self, statuses: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        rows = self._conn.execute("SELECT doc_id, path, status, pages_total, error FROM documents ORDER BY doc_id")
+        docs = [dict(zip(("doc_id", "path", "status", "pages_total", "error"), row)) for row in rows]
+        return [d for d in docs if statuses is None or d["status"] in statuses]
+
+    def summary(self) -> Dict[str, int]:
+        counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM documents GROUP BY status").fetchall())
+        counts["pages_done"] = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        return counts
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def make_doc_id(path: str) -> str:
+    """Stable document ID: file stem plus a short hash of the absolute path."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+    return f"{stem}-{digest}"
+
+
+def discover_documents(source: str) -> List[Tuple[str, str]]:
+    """
+    List the documents to ingest.
+
+    Args:
+        source: Directory searched recursively for PDFs, a plain-text manifest
+            with one path per line, or a JSONL manifest with "path" and
+            optional "doc_id" fields. Relative paths are resolved against
+            the manifest's directory.
+
+    Returns:
+        List of (doc_id, path) tuples
+    """
+    if os.path.isdir(source):
+        paths = sorted(glob.glob(os.path.join(source, "**", "*.pdf"), recursive=True))
+        return [(make_doc_id(path), path) for path in paths]
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    documents = []
+    with open(source, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if source.endswith(".jsonl"):
+                entry = json.loads(line)
+                path = os.path.join(base_dir, entry["path"])
+                documents.append((entry.get("doc_id") or make_doc_id(path), path))
+            else:
+                path = os.path.join(base_dir, line)
+                documents.append((make_doc_id(path), path))
+    return documents
+
+
+def _extract_document(
+    doc_id: str,
+    pdf_path: str,
+    state_path: str,
+    output_dir: str,
+    image_dir: str,
+    prefilter: bool,
+    use_cache: bool,
+    text_mode: Optional[str] = None,
+) -> str:
+    # Runs in a worker process; resumes after the last page recorded as done
+    state = JobState(state_path)
+    try:
+        pages_total = get_pdf_page_count(pdf_path)
+        state.set_status(doc_id, "extracting", pages_total=pages_total)
+
+        done = state.done_pages(doc_id)
+        remaining = [page for page in range(1, pages_total + 1) if page not in done]
+        if remaining:
+            images = [
+                (image, page_num)
+                for page_num, image in iter_pdf_images(
+                    pdf_path, output_dir=os.path.join(image_dir, doc_id), num_workers=1, pages=remaining
+                )
+            ]
+            extract_from_document(
+                images,
+                output_dir=os.path.join(output_dir, doc_id),
+                use_cache=use_cache,
+                pdf_path=pdf_path if prefilter else None,
+                on_page_done=lambda page_num: state.mark_page_done(doc_id, page_num),
+                doc_id=doc_id,
+            )
+
+        if text_mode:
+            # Text chunks share the document's store; region_id keeps them apart from chart records
+            chunk_dicts = partition_and_chunk(pdf_path, layout=text_mode == "layout")
+            with ExtractionStore(os.path.join(output_dir, doc_id)) as store:
+                for record in chunks_to_records(chunk_dicts, doc_id=doc_id):
+                    store.append(record)
+
+        state.set_status(doc_id, "extracted")
+        return doc_id
+    finally:
+        state.close()
+
+
+def load_document_records(doc_id: str, output_dir: str) -> List[Dict[str, Any]]:
+    """Read back a document's extraction records (store or per-page JSON), tagged with its doc_id."""
+    store_dir = os.path.join(output_dir, doc_id)
+    if os.path.exists(os.path.join(store_dir, "records.bin")):
+        store = ExtractionStore(store_dir)
+        try:
+            records = [dict(record, doc_id=doc_id) for record in store.iter_records(fields=RECORD_FIELDS)]
+        finally:
+            store.close()
+        return sorted(records, key=lambda r: (r.get("page") or 0, r.get("region_id") or ""))
+
+    records = []
+    for path in glob.glob(os.path.join(output_dir, doc_id, "page_*_extraction.json")):
+        with open(path, 'r') as f:
+            record = json.load(f)
+        record["doc_id"] = doc_id
+        records.append(record)
+    return sorted(records, key=lambda r: (r.get("page") or 0, r.get("region_id") or ""))
+
+
+def ingest_corpus(
+    source: str,
+    state_path: str = JOB_STATE_PATH,
+    output_dir: str = "extracted_data",
+    image_dir: str = "temp_images",
+    index_path: str = FAISS_INDEX_PATH,
+    workers: int = 2,
+    save_every: int = INGEST_SAVE_EVERY,
+    prefilter: bool = False,
+    use_cache: bool = True,
+    embedding_model=None,
+    text_mode: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Ingest every document from a directory or manifest into one shared index.
+
+    Documents already indexed by an earlier run are skipped; interrupted ones
+    continue from their last completed page. The index is saved every
+    save_every documents, and documents are only marked indexed once the
+    save that contains them has finished.
+
+    Args:
+        source: Directory or manifest (see discover_documents())
+        state_path: SQLite job-state file
+        output_dir: Root for per-document extraction JSON
+        image_dir: Root for per-document page images
+        index_path: Shared FAISS index, appended to if it already exists
+        workers: Documents extracted concurrently
+        save_every: Documents indexed between index saves
+        prefilter: Skip pages that classify_pages() marks as plain prose
+        use_cache: Use the persistent extraction cache
+        embedding_model: Embeddings instance (default: initialize_embeddings())
+        text_mode: Also index the document's text chunks: "fast" (PDF text
+            layer) or "layout" (unstructured, title-aware); None = charts only
+
+    Returns:
+        Document counts by status, plus pages_done
+
+    Example:
+        >>> summary = ingest_corpus("reports/", workers=4)
+        >>> print(summary)
+    """
+    state = JobState(state_path)
+    for doc_id, path in discover_documents(source):
+        state.register(doc_id, path)
+
+    manager = IndexManager(index_path, embedding_model=embedding_model)
+    unsaved: List[str] = []
+
+    def flush() -> None:
+        manager.save()
+        for doc_id in unsaved:
+            state.set_status(doc_id, "indexed")
+        unsaved.clear()
+
+    def index_document(doc_id: str) -> None:
+        # Re-adding replaces any vectors left from an interrupted earlier run
+        ids = manager.add_document(doc_id, load_document_records(doc_id, output_dir))
+        unsaved.append(doc_id)
+        logger.info("Indexed %d records from %s", len(ids), doc_id)
+        if len(unsaved) >= save_every:
+            flush()
+
+    # Finish documents whose extraction completed before an interruption
+    for doc in state.documents(["extracted"]):
+        index_document(doc["doc_id"])
+
+    todo = state.documents(["pending", "extracting", "failed"])
+    logger.info("Ingesting %d documents with %d workers", len(todo), workers)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                _extract_document, doc["doc_id"], doc["path"], state_path, output_dir, image_dir, prefilter, use_cache,
+                text_mode,
+            ): doc["doc_id"]
+            for doc in todo
+        }
+        for future in as_completed(futures):
+            doc_id = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                state.set_status(doc_id, "failed", error=str(e))
+                logger.error("Error ingesting %s: %s", doc_id, e)
+                continue
+            index_document(doc_id)
+
+    flush()
+    summary = state.summary()
+    state.close()
+    logger.info("Batch ingestion finished: %s", summary)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Batch-ingest a directory or manifest of PDFs into one FAISS index.")
+    parser.add_argument("source", help="Directory of PDFs, or a manifest (.txt paths or .jsonl with path/doc_id)")
+    parser.add_argument("--state", default=JOB_STATE_PATH, help="Job-state file used to resume interrupted runs")
+    parser.add_argument("--output-dir", default="extracted_data", help="Root directory for extraction JSON")
+    parser.add_argument("--image-dir", default="temp_images", help="Root directory for rendered pages")
+    parser.add_argument("--index-path", default=FAISS_INDEX_PATH, help="Shared FAISS index path")
+    parser.add_argument("--workers", type=int, default=2, help="Documents processed concurrently")
+    parser.add_argument("--save-every", type=int, default=INGEST_SAVE_EVERY, help="Documents between index saves")
+    parser.add_argument("--prefilter", action="store_true", help="Skip pages without likely charts/tables")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the extraction cache")
+    parser.add_argument("--text", choices=["fast", "layout"], help="Also index text chunks (fast text layer or layout-aware)")
+    # Extraction workers are separate processes; these cover the coordinator (embedding and indexing)
+    parser.add_argument("--metrics", default=None, help="Write Prometheus metrics to this file")
+    parser.add_argument("--trace", default=None, help="Write a Chrome trace-event JSON file")
+    args = parser.parse_args(argv)
+    configure_logging()
+    if args.metrics or args.trace:
+        telemetry.enable()
+
+    ingest_corpus(
+        args.source,
+        state_path=args.state,
+        output_dir=args.output_dir,
+        image_dir=args.image_dir,
+        index_path=args.index_path,
+        workers=args.workers,
+        save_every=args.save_every,
+        prefilter=args.prefilter,
+        use_cache=not args.no_cache,
+        text_mode=args.text,
+    )
+    if args.metrics:
+        telemetry.write_metrics(args.metrics)
+    if args.trace:
+        telemetry.write_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,493 @@
+"""
+pipeline.py
+Pipelined ingestion: rasterize -> chart OCR -> contextual text -> embed -> index.
+
+Stages are connected by bounded queues so a slow stage pushes back on the
+ones before it and memory stays flat regardless of document size. Every
+stage has its own worker count and may run its work in a process pool.
+Per-stage throughput and queue-depth metrics show where the bottleneck is.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from Extraction.data_extraction import (
+    extract_chart_data,
+    extract_contextual_text_batch,
+    extraction_model_ids,
+    image_source,
+    render_params,
+)
+from Extraction.extraction_cache import ExtractionCache
+from Extraction.extraction_store import ExtractionStore
+from retrieval.retrieval import default_embeddings, record_to_document
+from utils.config import EXTRACTION_OUTPUT_FORMAT, LAYOUTLM_BATCH_SIZE, PIPELINE_QUEUE_SIZE, EMBED_BATCH_SIZE
+from utils.model_registry import models
+from utils.pdf_processor import classify_pages, iter_pdf_images
+from utils.render_policy import MemoryBudget, model_view, render_budget
+from utils.telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+
+# Marks the end of a stage's input
+_SENTINEL = object()
+
+
+class Stage:
+    """
+    One step of a Pipeline.
+
+    Args:
+        name: Stage name used in metrics
+        fn: Callable applied to each item (or to a list of items when
+            batch_size > 1). Returning None drops the item. Must be a
+            module-level function when use_processes=True.
+        workers: Concurrent workers for this stage
+        batch_size: Items handed to fn at once
+        use_processes: Run fn in a process pool instead of worker threads
+        initializer: Process pool initializer (e.g. to load models once per process)
+        initargs: Arguments for initializer
+        batch_timeout: Seconds to wait for a batch to fill before running a partial one
+        skip: Predicate for items that pass straight through to the next stage
+            without reaching fn (and, with use_processes, without being pickled)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable,
+        workers: int = 1,
+        batch_size: int = 1,
+        use_processes: bool = False,
+        initializer: Optional[Callable] = None,
+        initargs: Tuple = (),
+        batch_timeout: float = 0.05,
+        skip: Optional[Callable[[Any], bool]] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.use_processes = use_processes
+        self.initializer = initializer
+        self.initargs = initargs
+        self.batch_timeout = batch_timeout
+        self.skip = skip
+
+
+class StageMetrics:
+    """Thread-safe throughput and queue-depth counters for one stage."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+        self._lock = threading.Lock()
+
+    def record_depth(self, depth: int) -> None:
+        with self._lock:
+            self._depth_total += depth
+            self._depth_samples += 1
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def record_work(self, items_in: int, items_out: int, seconds: float, errors: int = 0) -> None:
+        with self._lock:
+            self.items_in += items_in
+            self.items_out += items_out
+            self.busy_seconds += seconds
+            self.errors += errors
+
+    def snapshot(self, wall_seconds: float) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "items_in": self.items_in,
+                "items_out": self.items_out,
+                "errors": self.errors,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "items_per_second": round(self.items_in / wall_seconds, 3) if wall_seconds else 0.0,
+                "utilization": round(self.busy_seconds / (wall_seconds * self.workers), 3) if wall_seconds else 0.0,
+                "avg_queue_depth": round(self._depth_total / self._depth_samples, 2) if self._depth_samples else 0.0,
+                "max_queue_depth": self.max_queue_depth,
+            }
+
+
+class Pipeline:
+    """
+    Run a source iterable through a chain of stages connected by bounded queues.
+
+    Args:
+        stages: Stages in order
+        queue_size: Capacity of each inter-stage queue
+        source_name: Metrics name for the source iterable
+        on_drop: Called (in this process) with every input item that a stage
+            dropped or failed on, e.g. to free resources the item holds
+
+    Raises:
+        Exception: run() re-raises an exception from the source iterable once
+            the items it produced before failing have drained through the stages
+
+    Example:
+        >>> pipeline = Pipeline([Stage("double", lambda x: 2 * x, workers=2)])
+        >>> outputs = pipeline.run(range(10))
+        >>> print(pipeline.metrics()["stages"]["double"]["items_in"])
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        source_name: str = "source",
+        on_drop: Optional[Callable[[Any], None]] = None,
+    ):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.source_name = source_name
+        self.on_drop = on_drop
+        self._metrics: Dict[str, StageMetrics] = {}
+        self._wall_seconds = 0.0
+        self._source_error: Optional[BaseException] = None
+
+    def run(self, source: Iterable[Any]) -> List[Any]:
+        """Push every source item through the stages and return the last stage's outputs."""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        output_queue: queue.Queue = queue.Queue()
+        queues.append(output_queue)
+
+        self._source_error = None
+        self._metrics = {self.source_name: StageMetrics(self.source_name, 1)}
+        for stage in self.stages:
+            self._metrics[stage.name] = StageMetrics(stage.name, stage.workers)
+
+        executors = [
+            ProcessPoolExecutor(max_workers=stage.workers, initializer=stage.initializer, initargs=stage.initargs)
+            if stage.use_processes else None
+            for stage in self.stages
+        ]
+        remaining = [stage.workers for stage in self.stages]
+        remaining_lock = threading.Lock()
+
+        def finish_worker(index: int) -> None:
+            # The last worker out hands one sentinel to every worker downstream
+            with remaining_lock:
+                remaining[index] -= 1
+                if remaining[index]:
+                    return
+            downstream = self.stages[index + 1].workers if index + 1 < len(self.stages) else 1
+            for _ in range(downstream):
+                queues[index + 1].put(_SENTINEL)
+
+        threads = [threading.Thread(target=self._feed, args=(source, queues[0]), daemon=True)]
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(index, stage, queues[index], queues[index + 1], executors[index], finish_worker),
+                    daemon=True,
+                ))
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        outputs = []
+        try:
+            while True:
+                item = output_queue.get()
+                if item is _SENTINEL:
+                    break
+                outputs.append(item)
+            for thread in threads:
+                thread.join()
+        finally:
+            self._wall_seconds = time.perf_counter() - start
+            for executor in executors:
+                if executor is not None:
+                    executor.shutdown()
+
+        if self._source_error is not None:
+            raise self._source_error
+        return outputs
+
+    def _feed(self, source: Iterable[Any], out_queue: queue.Queue) -> None:
+        metrics = self._metrics[self.source_name]
+        iterator = iter(source)
+        try:
+            while True:
+                produce_start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                metrics.record_work(1, 1, time.perf_counter() - produce_start)
+                out_queue.put(item)
+                metrics.record_depth(out_queue.qsize())
+        except Exception as e:
+            metrics.record_work(0, 0, 0.0, errors=1)
+            logger.error("Error in pipeline source: %s", e)
+            self._source_error = e
+        finally:
+            for _ in range(self.stages[0].workers if self.stages else 1):
+                out_queue.put(_SENTINEL)
+
+    def _work(self, index, stage, in_queue, out_queue, executor, finish_worker) -> None:
+        metrics = self._metrics[stage.name]
+        done = False
+        while not done:
+            item = in_queue.get()
+            metrics.record_depth(in_queue.qsize())
+            if item is _SENTINEL:
+                break
+
+            batch = [item]
+            while len(batch) < stage.batch_size:
+                try:
+                    item = in_queue.get(timeout=stage.batch_timeout)
+                except queue.Empty:
+                    break
+                if item is _SENTINEL:
+                    done = True
+                    break
+                batch.append(item)
+
+            work_start = time.perf_counter()
+            if stage.skip is not None:
+                passed = [item for item in batch if stage.skip(item)]
+                if passed:
+                    batch = [item for item in batch if not stage.skip(item)]
+                    metrics.record_work(len(passed), len(passed), 0.0)
+                    for item in passed:
+                        out_queue.put(item)
+                if not batch:
+                    continue
+
+            try:
+                arg = batch if stage.batch_size > 1 else batch[0]
+                if executor is not None:
+                    result = executor.submit(stage.fn, arg).result()
+                else:
+                    result = stage.fn(arg)
+            except Exception as e:
+                metrics.record_work(len(batch), 0, time.perf_counter() - work_start, errors=1)
+                logger.error("Error in pipeline stage %s: %s", stage.name, e)
+                if self.on_drop is not None:
+                    for dropped in batch:
+                        self.on_drop(dropped)
+                continue
+
+            if result is None and stage.batch_size == 1 and self.on_drop is not None:
+                self.on_drop(batch[0])
+            results = result if stage.batch_size > 1 else [result]
+            results = [r for r in (results or []) if r is not None]
+            metrics.record_work(len(batch), len(results), time.perf_counter() - work_start)
+            for r in results:
+                out_queue.put(r)
+
+        finish_worker(index)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return per-stage metrics from the last run and the most utilized stage."""
+        stages = {name: m.snapshot(self._wall_seconds) for name, m in self._metrics.items()}
+        bottleneck = max(stages, key=lambda name: stages[name]["utilization"]) if stages else None
+        return {
+            "wall_seconds": round(self._wall_seconds, 3),
+            "bottleneck": bottleneck,
+            "stages": stages,
+        }
+
+
+# Warm the OCR model as soon as a pool worker starts (each process has its own registry)
+def _init_ocr_worker() -> None:
+    models.get("chandra")
+
+
+def _ocr_stage(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # Past this stage only LayoutLMv3's small view of the page travels on,
+    # so process-pool results do not ship the full buffer back
+    chart_data = extract_chart_data(item["image"], models.get("chandra"))
+    if not chart_data:
+        return None
+    chart_data["page"] = item["page"]
+    item["record"] = chart_data
+    item["image"] = model_view(item["image"], "layoutlm")
+    return item
+
+
+def run_ingestion_pipeline(
+    pdf_path: str,
+    output_dir: str = "extracted_data",
+    image_dir: str = "temp_images",
+    embedding_model=None,
+    use_cache: bool = True,
+    cache: Optional[ExtractionCache] = None,
+    prefilter: bool = False,
+    dpi_multiplier: Optional[float] = None,
+    in_memory: bool = False,
+    memory_budget: Optional[MemoryBudget] = render_budget,
+    render_workers: Optional[int] = None,
+    ocr_workers: int = 2,
+    ocr_processes: bool = True,
+    context_workers: int = 1,
+    embed_workers: int = 1,
+    batch_size: int = LAYOUTLM_BATCH_SIZE,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    output_format: str = EXTRACTION_OUTPUT_FORMAT,
+):
+    """
+    Ingest one PDF with all stages overlapping.
+
+    Args:
+        pdf_path: Path to the PDF file
+        output_dir: Directory for the extraction store (or per-page JSON)
+        image_dir: Directory for rendered page images
+        embedding_model: Embeddings instance (default: initialize_embeddings())
+        use_cache: Serve unchanged pages from the extraction cache
+        cache: Cache instance to use (default: one built from config)
+        prefilter: Only render pages that classify_pages() marks as likely charts
+        dpi_multiplier: Zoom factor for rendering (None = OCR render policy)
+        in_memory: Pass rendered pages between stages as images instead of PNG
+            files; the registered OCR model must then accept PIL images
+        memory_budget: Cap on page buffers in flight (default: the process-wide
+            render_budget); rendering waits while it is full. None = unbounded
+        render_workers: Rasterization processes (None = CPU count)
+        ocr_workers: Chart OCR workers
+        ocr_processes: Run chart OCR in a process pool (one model per process)
+        context_workers: LayoutLMv3 workers
+        embed_workers: Embedding workers
+        batch_size: Pages per LayoutLMv3 forward pass
+        embed_batch_size: Texts per embedding call
+        queue_size: Capacity of each inter-stage queue
+        output_format: "store" (ExtractionStore in output_dir) or "json" (one file per page)
+
+    Returns:
+        Tuple of (FAISS vectorstore or None, pipeline metrics)
+
+    Example:
+        >>> vectorstore, metrics = run_ingestion_pipeline("sample.pdf", ocr_workers=4)
+        >>> print(metrics["bottleneck"])
+    """
+    from langchain_community.vectorstores import FAISS
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    if embedding_model is None:
+        embedding_model = default_embeddings()
+    if use_cache and cache is None:
+        cache = ExtractionCache(model_ids=extraction_model_ids())
+
+    pages = None
+    if prefilter:
+        pages = [n for n, c in classify_pages(pdf_path).items() if c["likely_chart"]]
+
+    index: Dict[str, Any] = {"vectorstore": None}
+    store = ExtractionStore(output_dir) if output_format == "store" else None
+
+    def cache_stage(item):
+        if cache is not None:
+            item["cache_key"] = cache.key_for(item["image"], render_params(dpi_multiplier))
+            cached = cache.get(item["cache_key"])
+            if cached is not None:
+                item["record"] = dict(cached, source_image=image_source(item["image"]), page=item["page"])
+                item["cached"] = True
+        return item
+
+    def release(item):
+        item["image"] = None
+        if memory_budget is not None:
+            memory_budget.release((pdf_path, item["page"]))
+
+    def context_stage(batch):
+        pending = [item for item in batch if not item.get("cached")]
+        if pending:
+            processor, model = models.get("layoutlm")
+            contexts = extract_contextual_text_batch(
+                [item["image"] for item in pending], processor, model, batch_size=batch_size
+            )
+            for item, context_text in zip(pending, contexts):
+                item["record"]["context"] = context_text
+                if cache is not None:
+                    cache.put(item["cache_key"], {k: v for k, v in item["record"].items() if k != "page"})
+        for item in batch:
+            release(item)
+        return batch
+
+    def embed_stage(batch):
+        documents = [record_to_document(item["record"]) for item in batch]
+        with telemetry.span("embed_batch", size=len(documents)):
+            vectors = embedding_model.embed_documents([doc.page_content for doc in documents])
+        for item, doc, vector in zip(batch, documents, vectors):
+            item["document"], item["vector"] = doc, vector
+        return batch
+
+    def index_stage(batch):
+        text_embeddings = [(item["document"].page_content, item["vector"]) for item in batch]
+        metadatas = [item["document"].metadata for item in batch]
+        if index["vectorstore"] is None:
+            index["vectorstore"] = FAISS.from_embeddings(text_embeddings, embedding_model, metadatas=metadatas)
+        else:
+            index["vectorstore"].add_embeddings(text_embeddings, metadatas=metadatas)
+
+        for item in batch:
+            if store is not None:
+                store.append(item["record"])
+                continue
+            output_path = os.path.join(output_dir, f"page_{item['page']}_extraction.json")
+            with open(output_path, 'w') as f:
+                json.dump(item["record"], f, indent=2)
+        return None
+
+    pipeline = Pipeline(
+        [
+            Stage("cache_lookup", cache_stage),
+            Stage("chart_ocr", _ocr_stage, workers=ocr_workers, use_processes=ocr_processes,
+                  initializer=_init_ocr_worker if ocr_processes else None, skip=lambda item: item.get("cached")),
+            Stage("contextual_text", context_stage, workers=context_workers, batch_size=batch_size),
+            Stage("embed", embed_stage, workers=embed_workers, batch_size=embed_batch_size),
+            Stage("index", index_stage, batch_size=embed_batch_size),
+        ],
+        queue_size=queue_size,
+        source_name="rasterize",
+        on_drop=release,
+    )
+
+    rendered = []
+
+    def source():
+        for page_num, image in iter_pdf_images(
+            pdf_path, output_dir=image_dir, dpi_multiplier=dpi_multiplier, num_workers=render_workers, pages=pages,
+            in_memory=in_memory, memory_budget=memory_budget,
+        ):
+            rendered.append(page_num)
+            yield {"page": page_num, "image": image}
+
+    try:
+        pipeline.run(source())
+    finally:
+        if store is not None:
+            store.close()
+        if memory_budget is not None:
+            # Pages of this document still reserved after a failure
+            for page_num in rendered:
+                memory_budget.release((pdf_path, page_num))
+
+    metrics = pipeline.metrics()
+    if memory_budget is not None:
+        metrics["memory_budget"] = memory_budget.stats()
+    if cache is not None:
+        metrics["cache"] = cache.stats()
+    logger.info("Pipeline finished in %ss, bottleneck: %s", metrics["wall_seconds"], metrics["bottleneck"])
+    return index["vectorstore"], metrics
@@ -0,0 +1,465 @@
+"""
+chart_data.py
+Typed, columnar table of extracted chart series for numeric queries.
+
+extract_chart_data captures data/values/labels per chart, but only the chart
+text is embedded. ChartDataTable parses those series into numpy columns
+(one row per data point, plus per-chart doc/page/type/title/unit columns),
+so questions like "which year had the highest revenue?" are answered with
+max/min/trend/lookup in milliseconds, and matched charts go to
+format_for_llm as compact tables instead of raw OCR text.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from retrieval.hybrid import tokenize
+
+
+# "$1,234.5M", "(12.3)", "45%", "€3bn", "1.5 million" -> prefix, sign, digits, scale, percent
+_NUMBER_RE = re.compile(
+    r"(?P<prefix>[$€£¥])?\s*(?P<neg>[-−(])?\s*(?P<prefix2>[$€£¥])?\s*"
+    r"(?P<num>\d[\d,]*(?:\.\d+)?|\.\d+)\s*"
+    r"(?P<scale>thousands?|millions?|billions?|trillions?|mn|mm|bn|[kmbt](?![a-z]))?\s*\)?\s*(?P<pct>%)?",
+    re.IGNORECASE,
+)
+_SCALES = {
+    "k": 1e3, "thousand": 1e3, "thousands": 1e3, "000": 1e3, "000s": 1e3,
+    "m": 1e6, "mn": 1e6, "mm": 1e6, "million": 1e6, "millions": 1e6,
+    "b": 1e9, "bn": 1e9, "billion": 1e9, "billions": 1e9,
+    "t": 1e12, "trillion": 1e12, "trillions": 1e12,
+}
+_SCALE_SUFFIXES = {1e3: "K", 1e6: "M", 1e9: "B", 1e12: "T"}
+# Currency codes that may stand next to a value without making it a label
+_CURRENCY_CODE_RE = re.compile(r"\b(?:USD|EUR|GBP|JPY|CNY|CHF)\b", re.IGNORECASE)
+_UNIT_IN_TITLE_RE = re.compile(r"\(([^)]{1,20})\)\s*$")
+
+
+def _parse(value: str, strict: bool = True) -> Optional[Tuple[float, float, str]]:
+    # (number before scaling, explicit scale or 0.0, unit symbol); strict rejects numbers inside labels
+    match = _NUMBER_RE.search(value)
+    if match is None:
+        return None
+    if strict:
+        residue = _CURRENCY_CODE_RE.sub("", value[:match.start()] + value[match.end():])
+        if re.search(r"\w", residue):
+            return None
+    number = float(match.group("num").replace(",", ""))
+    if match.group("neg"):
+        number = -number
+    scale = _SCALES[match.group("scale").lower()] if match.group("scale") else 0.0
+    unit = "%" if match.group("pct") else (match.group("prefix") or match.group("prefix2") or "")
+    return number, scale, unit
+
+
+def _unit_scale(unit: str) -> float:
+    """Scale named by a chart unit like "$M", "USD bn", "€ thousands" or "000s" (1.0 if none)."""
+    for token in re.findall(r"000s?|[a-z]+", unit.lower()):
+        if token in _SCALES:
+            return _SCALES[token]
+    return 1.0
+
+# Record fields ChartDataTable reads; the projection to use with ExtractionStore.iter_records()
+CHART_FIELDS = ("doc_id", "page", "region_id", "type", "title", "data", "values", "labels")
+
+# Words that say what to compute rather than which chart to use
+_QUERY_STOPWORDS = {
+    "the", "a", "an", "of", "in", "on", "for", "and", "or", "to", "by", "is", "was", "were", "what", "which",
+    "when", "how", "did", "does", "do", "had", "has", "have", "with", "at", "from", "its", "their", "value",
+    "highest", "lowest", "maximum", "minimum", "max", "min", "largest", "smallest", "most", "least", "peak",
+    "trend", "change", "increase", "decrease", "grow", "growth", "over", "time", "chart", "show", "shows",
+}
+_MAX_WORDS = {"highest", "maximum", "max", "largest", "most", "peak", "biggest", "top"}
+_MIN_WORDS = {"lowest", "minimum", "min", "smallest", "least", "bottom", "worst"}
+_TREND_WORDS = {"trend", "change", "increase", "decrease", "grow", "growth", "decline", "evolve", "over"}
+
+
+def parse_number(value: Any) -> Tuple[Optional[float], str]:
+    """
+    Parse a chart value like 1200, "1,200", "$1.2M", "1.5 million", "(3.5)" or "45%".
+
+    Scale suffixes are applied, so "$1.2M" is 1200000.0. Strings where the
+    number is part of a label ("Q3 2021", "FY2022 target") are not values.
+
+    Returns:
+        Tuple of (float or None if not numeric, unit symbol or "")
+    """
+    if isinstance(value, bool) or value is None:
+        return None, ""
+    if isinstance(value, (int, float)):
+        return (float(value), "") if math.isfinite(value) else (None, "")
+    parsed = _parse(str(value))
+    if parsed is None:
+        return None, ""
+    number, scale, unit = parsed
+    return number * (scale or 1.0), unit
+
+
+def _normalized_values(raw_values: List[Any], title_unit: Optional[str]) -> Tuple[List[Optional[float]], str]:
+    # Express every value of one chart in the chart's unit. A scale in the title
+    # ("Revenue ($M)") says what bare values mean; otherwise the scale most
+    # values carry is used. Values with their own suffix are converted to it.
+    parsed = []
+    for raw in raw_values:
+        if isinstance(raw, bool) or raw is None:
+            parsed.append(None)
+        elif isinstance(raw, (int, float)):
+            parsed.append((float(raw), 0.0, "") if math.isfinite(raw) else None)
+        else:
+            parsed.append(_parse(str(raw)))
+
+    found = [item for item in parsed if item is not None]
+    if not found:
+        return [None] * len(raw_values), ""
+    if title_unit is not None:
+        chart_scale, unit = _unit_scale(title_unit), title_unit
+    else:
+        chart_scale = Counter(scale or 1.0 for _, scale, _ in found).most_common(1)[0][0]
+        symbol = Counter(symbol for _, _, symbol in found).most_common(1)[0][0]
+        unit = symbol + _SCALE_SUFFIXES.get(chart_scale, "")
+    values = [
+        None if item is None else (item[0] * item[1] / chart_scale if item[1] else item[0])
+        for item in parsed
+    ]
+    return values, unit
+
+
+def _series_from_record(record: Dict[str, Any]) -> List[Tuple[str, List[Any], List[Any]]]:
+    # Accepts the shapes OCR output comes in: labels + values lists, {label: value},
+    # {series: {label: value}}, {series: [values]}, or [{"label", "value"}] items
+    data = record.get("data") or {}
+    labels = list(record.get("labels") or [])
+    values = list(record.get("values") or [])
+
+    if isinstance(data, dict) and data:
+        if "values" in data or "labels" in data:
+            labels = list(data.get("labels") or labels)
+            values = list(data.get("values") or values)
+        elif all(isinstance(v, dict) for v in data.values()):
+            return [(str(name), list(series), list(series.values())) for name, series in data.items()]
+        elif all(isinstance(v, list) for v in data.values()):
+            return [(str(name), labels or list(range(1, len(series) + 1)), series) for name, series in data.items()]
+        else:
+            return [("", list(data), list(data.values()))]
+    elif isinstance(data, list) and data and all(isinstance(item, dict) for item in data):
+        labels = [item.get("label", item.get("x", i + 1)) for i, item in enumerate(data)]
+        values = [item.get("value", item.get("y")) for item in data]
+
+    if values and all(isinstance(item, dict) for item in values):
+        labels = [item.get("label", item.get("x", i + 1)) for i, item in enumerate(values)]
+        values = [item.get("value", item.get("y")) for item in values]
+    if not values:
+        return []
+    if len(labels) < len(values):
+        labels = labels + list(range(len(labels) + 1, len(values) + 1))
+    return [("", labels[:len(values)], values)]
+
+
+def _label_sort_key(label: str) -> Optional[float]:
+    # Lenient on purpose: "FY2021" sorts as 2021
+    parsed = _parse(label, strict=False)
+    return parsed[0] if parsed is not None and re.fullmatch(r"\D{0,3}\d[\d.,]*\D{0,3}", label.strip()) else None
+
+
+class ChartDataTable:
+    """
+    Columnar table of chart data points with a small numeric query API.
+
+    Chart columns (one entry per chart): doc_id, page, region_id, type, title, unit.
+    Point columns (one entry per data point): chart, series, label, order, value.
+
+    Example:
+        >>> table = ChartDataTable.from_records(extracted_data)
+        >>> table.answer("Which year had the highest revenue?")
+        >>> table.trend(query="EBITDA margin")
+        >>> prompt = format_for_llm(docs, query, chart_tables=table.as_evidence(query))
+    """
+
+    CHART_COLUMNS = ("doc_id", "page", "region_id", "type", "title", "unit")
+    POINT_COLUMNS = ("chart", "series", "label", "order", "value")
+
+    def __init__(self, charts: Dict[str, np.ndarray], points: Dict[str, np.ndarray]):
+        self.charts = charts
+        self.points = points
+        self._chart_terms = [
+            set(tokenize(f"{self.charts['type'][i]} {self.charts['title'][i]}"))
+            for i in range(len(self))
+        ]
+        order = np.argsort(self.points["chart"], kind="stable")
+        bounds = np.searchsorted(self.points["chart"][order], np.arange(len(self) + 1))
+        self._points_by_chart = [order[bounds[i]:bounds[i + 1]] for i in range(len(self))]
+        for i, rows in enumerate(self._points_by_chart):
+            self._chart_terms[i].update(tokenize(" ".join(self.points["series"][rows].tolist())))
+            self._chart_terms[i].update(tokenize(" ".join(self.points["label"][rows].tolist())))
+        document_frequency = Counter(term for terms in self._chart_terms for term in terms)
+        self._idf = {term: math.log(1 + len(self) / count) for term, count in document_frequency.items()}
+
+    def __len__(self) -> int:
+        return len(self.charts["page"])
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "ChartDataTable":
+        """Build from extraction records (a list, or ExtractionStore.iter_records(fields=CHART_FIELDS))."""
+        charts: Dict[str, List[Any]] = {name: [] for name in cls.CHART_COLUMNS}
+        points: Dict[str, List[Any]] = {name: [] for name in cls.POINT_COLUMNS}
+
+        for record in records:
+            series_points = [
+                (series, str(label), order, raw)
+                for series, labels, values in _series_from_record(record)
+                for order, (label, raw) in enumerate(zip(labels, values))
+            ]
+            # A unit in the title ("Revenue ($M)") is more specific than symbols on the values
+            title = str(record.get("title") or "")
+            title_unit = _UNIT_IN_TITLE_RE.search(title)
+            numbers, unit = _normalized_values(
+                [raw for _, _, _, raw in series_points], title_unit.group(1) if title_unit else None
+            )
+            parsed = [
+                (series, label, order, number)
+                for (series, label, order, _), number in zip(series_points, numbers)
+                if number is not None
+            ]
+            if not parsed:
+                continue
+
+            chart_id = len(charts["page"])
+            charts["doc_id"].append(str(record.get("doc_id") or ""))
+            charts["page"].append(int(record.get("page") or 0))
+            charts["region_id"].append(str(record.get("region_id") or ""))
+            charts["type"].append(str(record.get("type") or ""))
+            charts["title"].append(title)
+            charts["unit"].append(unit)
+            for series, label, order, number in parsed:
+                points["chart"].append(chart_id)
+                points["series"].append(series)
+                points["label"].append(label)
+                points["order"].append(order)
+                points["value"].append(number)
+
+        return cls(
+            {
+                name: np.asarray(charts[name], dtype=np.int32 if name == "page" else str)
+                for name in cls.CHART_COLUMNS
+            },
+            {
+                "chart": np.asarray(points["chart"], dtype=np.int32),
+                "series": np.asarray(points["series"], dtype=str),
+                "label": np.asarray(points["label"], dtype=str),
+                "order": np.asarray(points["order"], dtype=np.int32),
+                "value": np.asarray(points["value"], dtype=np.float64),
+            },
+        )
+
+    def save(self, path: str) -> None:
+        """Save all columns to one compressed .npz file."""
+        np.savez_compressed(
+            path,
+            **{f"chart_{name}": column for name, column in self.charts.items()},
+            **{f"point_{name}": column for name, column in self.points.items()},
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ChartDataTable":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                {name: data[f"chart_{name}"] for name in cls.CHART_COLUMNS},
+                {name: data[f"point_{name}"] for name in cls.POINT_COLUMNS},
+            )
+
+    def chart(self, chart_id: int) -> Dict[str, Any]:
+        """Chart metadata as a plain dict."""
+        info = {name: self.charts[name][chart_id].item() for name in self.CHART_COLUMNS}
+        info["chart_id"] = int(chart_id)
+        return info
+
+    def match_charts(
+        self,
+        query: Optional[str] = None,
+        k: int = 3,
+        doc_ids: Optional[Sequence[str]] = None,
+        types: Optional[Sequence[str]] = None,
+        page_range: Optional[Tuple[int, int]] = None,
+    ) -> List[int]:
+        """
+        Chart ids matching the filters, best query match first.
+
+        Charts are scored by idf-weighted overlap between query terms and
+        their type, title, series names and labels; with a query, charts
+        sharing no terms are left out.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if doc_ids is not None:
+            mask &= np.isin(self.charts["doc_id"], list(doc_ids))
+        if types is not None:
+            mask &= np.isin(self.charts["type"], list(types))
+        if page_range is not None:
+            mask &= (self.charts["page"] >= page_range[0]) & (self.charts["page"] <= page_range[1])
+        candidates = np.flatnonzero(mask)
+        if not query:
+            return candidates[:k].tolist()
+
+        terms = {term for term in tokenize(query) if term not in _QUERY_STOPWORDS}
+        scored = []
+        for chart_id in candidates:
+            score = sum(self._idf.get(term, 0.0) for term in terms & self._chart_terms[chart_id])
+            if score > 0:
+                scored.append((score, -int(chart_id)))
+        scored.sort(reverse=True)
+        return [-chart_id for _, chart_id in scored[:k]]
+
+    def _rows(self, chart_ids: Sequence[int], series: Optional[str] = None) -> np.ndarray:
+        if not len(chart_ids):
+            return np.empty(0, dtype=np.int64)
+        rows = np.concatenate([self._points_by_chart[chart_id] for chart_id in chart_ids])
+        if series is not None:
+            rows = rows[self.points["series"][rows] == series]
+        return rows
+
+    def _point(self, row: int) -> Dict[str, Any]:
+        chart_id = int(self.points["chart"][row])
+        return {
+            **self.chart(chart_id),
+            "series": self.points["series"][row].item(),
+            "label": self.points["label"][row].item(),
+            "value": float(self.points["value"][row]),
+        }
+
+    def _extreme(self, largest: bool, query: Optional[str], series: Optional[str], **filters) -> Optional[Dict[str, Any]]:
+        chart_ids = self.match_charts(query, k=1, **filters) if query else self.match_charts(k=len(self), **filters)
+        rows = self._rows(chart_ids, series)
+        if not len(rows):
+            return None
+        values = self.points["value"][rows]
+        return self._point(int(rows[np.argmax(values) if largest else np.argmin(values)]))
+
+    def max(self, query: Optional[str] = None, series: Optional[str] = None, **filters) -> Optional[Dict[str, Any]]:
+        """Largest point of the best-matching chart (or of all filtered charts without a query)."""
+        return self._extreme(True, query, series, **filters)
+
+    def min(self, query: Optional[str] = None, series: Optional[str] = None, **filters) -> Optional[Dict[str, Any]]:
+        """Smallest point of the best-matching chart (or of all filtered charts without a query)."""
+        return self._extreme(False, query, series, **filters)
+
+    def _ordered_rows(self, chart_id: int, series: Optional[str]) -> np.ndarray:
+        rows = self._rows([chart_id], series)
+        if series is None and len(rows):
+            # Default to the chart's first series
+            rows = rows[self.points["series"][rows] == self.points["series"][rows[0]]]
+        keys = [_label_sort_key(label) for label in self.points["label"][rows].tolist()]
+        if all(key is not None for key in keys):
+            return rows[np.argsort(keys, kind="stable")]
+        return rows[np.argsort(self.points["order"][rows], kind="stable")]
+
+    def trend(self, query: Optional[str] = None, chart_id: Optional[int] = None, series: Optional[str] = None, **filters) -> Optional[Dict[str, Any]]:
+        """
+        Direction and size of change across a chart's points (ordered by label when labels are numeric, e.g. years).
+
+        Returns:
+            Dictionary with direction (increasing/decreasing/flat/mixed), start/end
+            labels and values, change, pct_change and least-squares slope per step
+        """
+        if chart_id is None:
+            matches = self.match_charts(query, k=1, **filters)
+            if not matches:
+                return None
+            chart_id = matches[0]
+        rows = self._ordered_rows(chart_id, series)
+        if len(rows) < 2:
+            return None
+
+        values = self.points["value"][rows]
+        steps = np.diff(values)
+        if np.all(steps == 0):
+            direction = "flat"
+        elif np.all(steps >= 0):
+            direction = "increasing"
+        elif np.all(steps <= 0):
+            direction = "decreasing"
+        else:
+            direction = "mixed"
+        labels = self.points["label"][rows]
+        change = float(values[-1] - values[0])
+        return {
+            **self.chart(chart_id),
+            "series": self.points["series"][rows[0]].item(),
+            "direction": direction,
+            "start": {"label": labels[0].item(), "value": float(values[0])},
+            "end": {"label": labels[-1].item(), "value": float(values[-1])},
+            "change": change,
+            "pct_change": float(change / abs(values[0]) * 100) if values[0] else None,
+            "slope": float(np.polyfit(np.arange(len(values)), values, 1)[0]),
+        }
+
+    def lookup(self, label: str, query: Optional[str] = None, series: Optional[str] = None, **filters) -> List[Dict[str, Any]]:
+        """Points whose label equals label (case-insensitive) in the matching charts."""
+        chart_ids = self.match_charts(query, k=3, **filters) if query else self.match_charts(k=len(self), **filters)
+        rows = self._rows(chart_ids, series)
+        target = label.strip().lower()
+        return [self._point(int(row)) for row in rows if self.points["label"][row].strip().lower() == target]
+
+    def answer(self, question: str, **filters) -> Optional[Dict[str, Any]]:
+        """
+        Answer a simple numeric question directly (max/min/trend/lookup), or return None.
+
+        Returns:
+            Dictionary with operation, result and a compact table of the chart used
+        """
+        words = set(tokenize(question))
+        chart_ids = self.match_charts(question, k=1, **filters)
+        if not chart_ids:
+            return None
+
+        if words & _MAX_WORDS:
+            operation, result = "max", self.max(question, **filters)
+        elif words & _MIN_WORDS:
+            operation, result = "min", self.min(question, **filters)
+        elif words & _TREND_WORDS:
+            operation, result = "trend", self.trend(chart_id=chart_ids[0])
+        else:
+            rows = self._rows(chart_ids)
+            operation = "lookup"
+            result = [
+                self._point(int(row)) for row in rows
+                if self.points["label"][row].strip().lower() in words or self.points["label"][row].strip() in question
+            ]
+        if not result:
+            return None
+        return {"operation": operation, "result": result, "table": self.to_markdown(chart_ids[0])}
+
+    def to_markdown(self, chart_id: int) -> str:
+        """Compact pipe table of one chart: one row per label, one column per series."""
+        rows = self._rows([chart_id])
+        series_names = list(dict.fromkeys(self.points["series"][rows].tolist()))
+        unit = self.charts["unit"][chart_id].item()
+        header = [name or "value" for name in series_names]
+        if unit:
+            header = [f"{name} ({unit})" for name in header]
+
+        keys = [_label_sort_key(label) for label in self.points["label"][rows].tolist()]
+        if all(key is not None for key in keys):
+            rows = rows[np.argsort(keys, kind="stable")]
+        cells: Dict[str, Dict[str, float]] = {}
+        for row in rows:
+            cells.setdefault(self.points["label"][row].item(), {})[self.points["series"][row].item()] = float(self.points["value"][row])
+        lines = ["| label | " + " | ".join(header) + " |"]
+        for label, by_series in cells.items():
+            values = [f"{by_series[name]:g}" if name in by_series else "" for name in series_names]
+            lines.append(f"| {label} | " + " | ".join(values) + " |")
+        return "\n".join(lines)
+
+    def as_evidence(self, query: Optional[str] = None, k: int = 2, **filters) -> List[Document]:
+        """Matched charts as Documents holding compact tables, for format_for_llm(chart_tables=...)."""
+        evidence = []
+        for chart_id in self.match_charts(query, k=k, **filters):
+            info = self.chart(chart_id)
+            metadata = {"type": f"{info['type'] or 'chart'} data", "title": info["title"], "page": info["page"]}
+            if info["doc_id"]:
+                metadata["doc_id"] = info["doc_id"]
+            evidence.append(Document(page_content=self.to_markdown(chart_id), metadata=metadata))
+        return evidence
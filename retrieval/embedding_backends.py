@@ -0,0 +1,245 @@
+"""
+embedding_backends.py
+Torch-free embedding backends behind the LangChain Embeddings interface.
+
+OnnxEmbeddings runs a sentence-transformers checkpoint with ONNX Runtime
+(fp32 or dynamically quantized int8) using only onnxruntime, tokenizers and
+numpy, so query servers never import torch. check_embedding_parity compares
+any two backends on sample texts before switching one into production.
+
+Usage:
+    python -m retrieval.embedding_backends --reference torch --candidate onnx-int8
+"""
+
+import argparse
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.config import EMBED_BATCH_SIZE, EMBEDDING_MAX_LENGTH, EMBEDDING_MODEL, EMBEDDING_NUM_THREADS
+from utils.telemetry import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Files looked up (in order) inside a model directory or Hub repo
+ONNX_MODEL_FILES = ("onnx/model.onnx", "model.onnx")
+
+PARITY_SAMPLE_TEXTS = [
+    "bar_chart Quarterly revenue by segment Revenue grew 12% in Q3 2021",
+    "line_chart EBITDA margin 2018-2023",
+    "table Operating expenses breakdown FY2022",
+    "pie_chart Market share by region North America 41%",
+    "No text available",
+]
+
+
+def _hub_repo(model_name: str) -> str:
+    # HuggingFaceEmbeddings accepts bare sentence-transformers names like "all-MiniLM-L6-v2"
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def _resolve_file(model_name: str, candidates: Sequence[str]) -> str:
+    if os.path.isdir(model_name):
+        for name in candidates:
+            path = os.path.join(model_name, name)
+            if os.path.exists(path):
+                return path
+        raise FileNotFoundError(f"None of {list(candidates)} found in {model_name}")
+
+    from huggingface_hub import hf_hub_download
+
+    last_error: Optional[Exception] = None
+    for name in candidates:
+        try:
+            return hf_hub_download(_hub_repo(model_name), name)
+        except Exception as e:
+            last_error = e
+    raise FileNotFoundError(f"None of {list(candidates)} found for {model_name}: {last_error}")
+
+
+def quantize_onnx_model(model_path: str) -> str:
+    """
+    Dynamically quantize an ONNX model's weights to int8 (cached next to the original).
+
+    Returns:
+        Path of the quantized model
+    """
+    quantized_path = os.path.splitext(model_path)[0] + ".int8.onnx"
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        logger.info("Quantized %s to int8", os.path.basename(model_path))
+    return quantized_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings with ONNX Runtime: tokenize, run the encoder, mean-pool, L2-normalize.
+
+    Matches sentence-transformers' all-MiniLM-L6-v2 pipeline (Transformer ->
+    mean Pooling -> Normalize) without torch.
+
+    Args:
+        model_name: Hub model name or local directory with an ONNX export and tokenizer.json
+        quantized: Run the int8 dynamically quantized model
+        batch_size: Texts per forward pass
+        num_threads: ONNX Runtime intra-op threads (None = runtime default)
+        max_length: Token limit per text
+        normalize: L2-normalize the pooled vectors
+
+    Example:
+        >>> embeddings = OnnxEmbeddings(EMBEDDING_MODEL, quantized=True, num_threads=4)
+        >>> vector = embeddings.embed_query("Q3 2021 EBITDA")
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        quantized: bool = False,
+        batch_size: int = EMBED_BATCH_SIZE,
+        num_threads: Optional[int] = EMBEDDING_NUM_THREADS,
+        max_length: int = EMBEDDING_MAX_LENGTH,
+        normalize: bool = True,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.normalize = normalize
+
+        model_path = _resolve_file(model_name, ONNX_MODEL_FILES)
+        if quantized:
+            model_path = quantize_onnx_model(model_path)
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(_resolve_file(model_name, ("tokenizer.json",)))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.asarray([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = [
+            self._embed_batch(list(texts[start:start + self.batch_size]))
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        return np.concatenate(vectors).tolist() if vectors else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+def create_embeddings(
+    model_name: str = EMBEDDING_MODEL,
+    backend: str = "torch",
+    batch_size: int = EMBED_BATCH_SIZE,
+    num_threads: Optional[int] = EMBEDDING_NUM_THREADS,
+) -> Embeddings:
+    """
+    Create an uncached embedding model for the given backend.
+
+    Args:
+        model_name: Sentence-transformers model name or local directory
+        backend: "torch" (HuggingFaceEmbeddings, fp32), "onnx" or "onnx-int8"
+        batch_size: Texts per forward pass
+        num_threads: CPU threads for inference (None = library default)
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend} (expected one of {EMBEDDING_BACKENDS})")
+
+    if backend == "torch":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        return HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={"device": "cpu"},
+            encode_kwargs={"batch_size": batch_size},
+        )
+    return OnnxEmbeddings(model_name, quantized=backend == "onnx-int8", batch_size=batch_size, num_threads=num_threads)
+
+
+def check_embedding_parity(
+    reference: Embeddings,
+    candidate: Embeddings,
+    texts: Sequence[str] = PARITY_SAMPLE_TEXTS,
+    min_cosine: float = 0.99,
+) -> Dict[str, Any]:
+    """
+    Check that two embedding backends produce matching vectors.
+
+    Args:
+        reference: Trusted backend (usually torch fp32)
+        candidate: Backend being validated
+        texts: Sample texts to embed with both
+        min_cosine: Lowest acceptable per-text cosine similarity
+
+    Returns:
+        Dictionary with min_cosine, mean_cosine, max_abs_diff and passed
+    """
+    ref = np.asarray(reference.embed_documents(list(texts)), dtype=np.float32)
+    cand = np.asarray(candidate.embed_documents(list(texts)), dtype=np.float32)
+    if ref.shape != cand.shape:
+        return {"passed": False, "error": f"shape mismatch {ref.shape} vs {cand.shape}"}
+
+    ref_unit = ref / np.clip(np.linalg.norm(ref, axis=1, keepdims=True), 1e-12, None)
+    cand_unit = cand / np.clip(np.linalg.norm(cand, axis=1, keepdims=True), 1e-12, None)
+    cosines = (ref_unit * cand_unit).sum(axis=1)
+    return {
+        "texts": len(texts),
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "max_abs_diff": float(np.abs(ref - cand).max()),
+        "passed": bool(cosines.min() >= min_cosine),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two embedding backends on sample texts.")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--reference", default="torch", choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--candidate", default="onnx-int8", choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+    configure_logging()
+
+    result = check_embedding_parity(
+        create_embeddings(args.model, args.reference),
+        create_embeddings(args.model, args.candidate),
+        min_cosine=args.min_cosine,
+    )
+    log = logger.info if result["passed"] else logger.error
+    log("%s vs %s: %s", args.candidate, args.reference, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+embedding_cache.py
+Disk-backed embedding cache in front of any LangChain Embeddings model.
+
+Vectors live in a memory-mapped float32 array; a SQLite key index maps
+hash(model name, normalized text) to a row of that array. Only cache misses
+reach the model, deduplicated and in batches, so rebuilding an index over an
+unchanged corpus barely touches the embedder.
+
+Several processes (ingestion workers, the query service) may share one cache
+directory: every read and write of the vector file happens under an
+exclusive lock on a lock file, and the vector file's size on disk, not the
+size this process last saw, decides how many rows exist.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.config import EMBED_BATCH_SIZE, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_MB
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different strings share a cache entry."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class _FileLock:
+    """Exclusive lock on a file, held across processes (not reentrant)."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "a+b")
+
+    def __enter__(self) -> "_FileLock":
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that consults a persistent cache before the model.
+
+    Args:
+        embeddings: Underlying Embeddings instance
+        model_name: Model identifier folded into every key
+        cache_dir: Root directory for cache files
+        max_mb: Size bound of the vector file; least recently used rows are reused beyond it
+        max_entries: Explicit row bound instead of max_mb
+        batch_size: Texts per call to the underlying model
+        read_only: Serve hits but never store misses (e.g. for query embedding)
+
+    Example:
+        >>> embeddings = CachedEmbeddings(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL), EMBEDDING_MODEL)
+        >>> vectors = embeddings.embed_documents(["bar chart Revenue", "bar chart Revenue"])
+        >>> print(embeddings.stats())
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        cache_dir: str = EMBEDDING_CACHE_DIR,
+        max_mb: float = EMBEDDING_CACHE_MAX_MB,
+        max_entries: Optional[int] = None,
+        batch_size: int = EMBED_BATCH_SIZE,
+        read_only: bool = False,
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_mb = max_mb
+        self._max_entries = max_entries
+        self.batch_size = batch_size
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.cache_dir = os.path.join(cache_dir, slug)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._vectors_path = os.path.join(self.cache_dir, "vectors.f32")
+        self._meta_path = os.path.join(self.cache_dir, "meta.json")
+
+        self._lock = threading.Lock()
+        self._file_lock = _FileLock(os.path.join(self.cache_dir, "cache.lock"))
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, "keys.sqlite"), timeout=60, check_same_thread=False)
+        with self._file_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY, slot INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS keys_lru ON keys (last_access)")
+            self._conn.commit()
+
+        self.dim: Optional[int] = None
+        self.capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        with self._file_lock:
+            self._refresh()
+
+    @property
+    def max_entries(self) -> int:
+        """Row bound: max_entries if given, else as many rows as fit in max_mb."""
+        if self._max_entries is not None:
+            return self._max_entries
+        return max(1, int(self.max_mb * 2**20) // ((self.dim or 1) * 4))
+
+    def _refresh(self) -> None:
+        # Caller holds the file lock. Another process may have created or grown the file.
+        if self.dim is None:
+            if not os.path.exists(self._meta_path):
+                return
+            with open(self._meta_path, 'r') as f:
+                self.dim = json.load(f)["dim"]
+        rows = os.path.getsize(self._vectors_path) // (self.dim * 4) if os.path.exists(self._vectors_path) else 0
+        if rows != self.capacity or self._vectors is None:
+            self._remap(rows)
+
+    def _remap(self, rows: int) -> None:
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        self.capacity = rows
+        if rows:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{normalize_text(text)}".encode()).hexdigest()
+
+    def _lookup(self, keys: List[str], touch: bool = True) -> Dict[str, int]:
+        slots: Dict[str, int] = {}
+        unique = list(set(keys))
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            slots.update(self._conn.execute(f"SELECT key, slot FROM keys WHERE key IN ({placeholders})", chunk))
+        if slots and touch:
+            now = time.time()
+            self._conn.executemany("UPDATE keys SET last_access = ? WHERE key = ?", [(now, k) for k in slots])
+        return slots
+
+    def _allocate(self, count: int) -> List[int]:
+        # Rows are handed out above the highest live slot, so a row is never shared
+        next_slot = self._conn.execute("SELECT COALESCE(MAX(slot) + 1, 0) FROM keys").fetchone()[0]
+        free = max(0, min(count, self.max_entries - next_slot))
+        slots = list(range(next_slot, next_slot + free))
+        if count > free:
+            # Reuse the rows of the least recently used keys
+            evicted = self._conn.execute(
+                "SELECT key, slot FROM keys ORDER BY last_access LIMIT ?", (count - free,)
+            ).fetchall()
+            self._conn.executemany("DELETE FROM keys WHERE key = ?", [(k,) for k, _ in evicted])
+            slots.extend(slot for _, slot in evicted)
+        self._ensure_capacity(max(slots) + 1 if slots else 0)
+        return slots
+
+    def _ensure_capacity(self, rows: int) -> None:
+        # Caller holds the file lock and has just refreshed, so capacity is the size on disk
+        if rows <= self.capacity:
+            return
+        new_capacity = max(rows, min(self.max_entries, max(2 * self.capacity, 1024)))
+        new_size = new_capacity * self.dim * 4
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path, "ab") as f:
+            # Never shrink: the file only grows, whoever grew it last
+            if new_size > os.path.getsize(self._vectors_path):
+                f.truncate(new_size)
+        self._remap(new_capacity)
+        if not os.path.exists(self._meta_path):
+            with open(self._meta_path, 'w') as f:
+                json.dump({"dim": self.dim, "model_name": self.model_name}, f)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        with self._lock, self._file_lock:
+            self._refresh()
+            slots = self._lookup(keys, touch=not self.read_only)
+            found = {k: self._vectors[slot].tolist() for k, slot in slots.items()}
+            self._conn.commit()
+
+            # Embed each distinct missing text once
+            missing: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key not in found:
+                    missing.setdefault(key, text)
+            self.hits += len(texts) - sum(1 for k in keys if k not in found)
+            self.misses += len(missing)
+
+        if missing:
+            miss_keys = list(missing)
+            miss_vectors: List[List[float]] = []
+            for start in range(0, len(miss_keys), self.batch_size):
+                batch = [missing[k] for k in miss_keys[start:start + self.batch_size]]
+                miss_vectors.extend(self.embeddings.embed_documents(batch))
+
+            for key, vector in zip(miss_keys, miss_vectors):
+                found[key] = vector
+
+            if not self.read_only:
+                self._store(miss_keys, miss_vectors)
+
+        return [found[k] for k in keys]
+
+    def _store(self, miss_keys: List[str], miss_vectors: List[List[float]]) -> None:
+        with self._lock, self._file_lock:
+            self._refresh()
+            if self.dim is None:
+                self.dim = len(miss_vectors[0])
+            # A single call larger than the cache only stores what fits
+            miss_keys, miss_vectors = miss_keys[:self.max_entries], miss_vectors[:self.max_entries]
+            # Another thread or process may have stored the same texts while we were embedding
+            stored = self._lookup(miss_keys)
+            miss_vectors = [v for k, v in zip(miss_keys, miss_vectors) if k not in stored]
+            miss_keys = [k for k in miss_keys if k not in stored]
+            if not miss_keys:
+                self._conn.commit()
+                return
+            new_slots = self._allocate(len(miss_keys))
+            now = time.time()
+            for slot, vector in zip(new_slots, miss_vectors):
+                self._vectors[slot] = np.asarray(vector, dtype=np.float32)
+            self._vectors.flush()
+            self._conn.executemany(
+                "INSERT INTO keys (key, slot, last_access) VALUES (?, ?, ?)",
+                [(k, s, now) for k, s in zip(miss_keys, new_slots)],
+            )
+            self._conn.commit()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the number of cached vectors."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM keys").fetchone()[0]
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
@@ -0,0 +1,231 @@
+"""
+hybrid.py
+Hybrid lexical (BM25) + dense retrieval merged with reciprocal rank fusion.
+
+Dense MiniLM similarity is weak on exact numbers and names ("Q3 2021 EBITDA",
+a drug name). A BM25 inverted index over the same page_content (plus the raw
+OCR extracted_text) catches those, and reciprocal rank fusion merges both
+candidate lists so precise lookups land in a small k.
+"""
+
+import heapq
+import logging
+import math
+import re
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from retrieval.retrieval import build_vectorstore
+from utils.config import HYBRID_CANDIDATE_K, HYBRID_DENSE_WORKERS, HYBRID_LATENCY_BUDGET_MS, RRF_K
+from utils.telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+
+# Keeps numbers like "2021", "3.5" and "1,200" and tokens like "q3" intact
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over a list of texts.
+
+    Args:
+        texts: One text per position (matching FAISS index positions)
+        k1: Term-frequency saturation
+        b: Length normalization
+
+    Example:
+        >>> bm25 = BM25Index(["bar chart Q3 2021 EBITDA", "pie chart market share"])
+        >>> print(bm25.search("2021 ebitda", k=1))
+    """
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_lengths: List[int] = []
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings[term].append((position, tf))
+
+        n = len(self.doc_lengths)
+        self.avg_length = (sum(self.doc_lengths) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """Return up to k (position, score) pairs, best first."""
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for position, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[position] / (self.avg_length or 1.0))
+                scores[position] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], rrf_k: int = RRF_K) -> List[Tuple[int, float]]:
+    """
+    Merge ranked lists of positions with reciprocal rank fusion.
+
+    Args:
+        rankings: Ranked position lists, best first
+        rrf_k: Damping constant (60 in the original RRF paper)
+
+    Returns:
+        (position, fused score) pairs, best first
+    """
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, position in enumerate(ranking, 1):
+            fused[position] += 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+# Shared pool for dense searches that run against a latency budget
+_dense_executor = ThreadPoolExecutor(max_workers=HYBRID_DENSE_WORKERS, thread_name_prefix="dense-search")
+
+# (retriever id, timings) of the last query run in this thread or task, so
+# concurrent requests sharing one retriever never see each other's timings
+_last_timings: ContextVar[Tuple[int, Dict[str, Any]]] = ContextVar("hybrid_last_timings", default=(0, {}))
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    LangChain retriever fusing BM25 and FAISS candidates with RRF.
+
+    The lexical search runs inline; the dense search (query embedding + FAISS)
+    runs in a worker thread and is dropped if it does not finish within the
+    latency budget, so a query always answers in time with at least the
+    lexical results.
+
+    Example:
+        >>> retriever = get_hybrid_retriever_from_data(extracted_data, k=3)
+        >>> docs, timings = retriever.invoke_with_timings("Q3 2021 EBITDA")
+        >>> print(timings["dense_timed_out"])
+    """
+
+    vectorstore: Any
+    bm25: Any
+    k: int = 3
+    candidate_k: int = HYBRID_CANDIDATE_K
+    rrf_k: int = RRF_K
+    latency_budget_ms: Optional[float] = HYBRID_LATENCY_BUDGET_MS
+
+    @property
+    def last_timings(self) -> Dict[str, Any]:
+        """Timings of this retriever's last query in the calling thread or task."""
+        owner, timings = _last_timings.get()
+        return timings if owner == id(self) else {}
+
+    def invoke_with_timings(self, query: str, **kwargs) -> Tuple[List[Document], Dict[str, Any]]:
+        """Run a query and return (documents, timings) for exactly that query."""
+        documents = self.invoke(query, **kwargs)
+        return documents, self.last_timings
+
+    def _dense_positions(self, query: str) -> List[int]:
+        with telemetry.span("embed_query"):
+            vector = np.asarray([self.vectorstore.embeddings.embed_query(query)], dtype=np.float32)
+        if getattr(self.vectorstore, "_normalize_L2", False):
+            import faiss
+            faiss.normalize_L2(vector)
+        with telemetry.span("faiss_search", k=self.candidate_k):
+            _, positions = self.vectorstore.index.search(vector, self.candidate_k)
+        return [int(p) for p in positions[0] if p != -1]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        start = time.perf_counter()
+        dense_future = _dense_executor.submit(self._dense_positions, query)
+
+        lexical = [position for position, _ in self.bm25.search(query, k=self.candidate_k)]
+        lexical_ms = (time.perf_counter() - start) * 1000
+
+        timeout = None
+        if self.latency_budget_ms is not None:
+            timeout = max(0.0, (self.latency_budget_ms - lexical_ms) / 1000)
+        try:
+            dense = dense_future.result(timeout=timeout)
+            dense_timed_out = False
+        except FutureTimeoutError:
+            # Frees the worker if the search has not started yet; a running one cannot be interrupted
+            dense_future.cancel()
+            dense, dense_timed_out = [], True
+            telemetry.count("dense_search_timeouts")
+
+        fused = reciprocal_rank_fusion([lexical, dense], rrf_k=self.rrf_k)[:self.k]
+        documents = []
+        for position, score in fused:
+            doc = self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[position])
+            documents.append(Document(page_content=doc.page_content, metadata={**doc.metadata, "rrf_score": score}))
+
+        _last_timings.set((id(self), {
+            "lexical_ms": round(lexical_ms, 2),
+            "total_ms": round((time.perf_counter() - start) * 1000, 2),
+            "dense_timed_out": dense_timed_out,
+        }))
+        return documents
+
+
+def build_hybrid_retriever(
+    vectorstore,
+    extracted_texts: Optional[Sequence[str]] = None,
+    k: int = 3,
+    candidate_k: int = HYBRID_CANDIDATE_K,
+    latency_budget_ms: Optional[float] = HYBRID_LATENCY_BUDGET_MS,
+) -> HybridRetriever:
+    """
+    Build a hybrid retriever over an existing FAISS vectorstore.
+
+    Args:
+        vectorstore: LangChain FAISS vectorstore
+        extracted_texts: Raw OCR text per index position, added to the lexical index
+        k: Documents returned per query
+        candidate_k: Candidates taken from each of the lexical and dense searches
+        latency_budget_ms: Per-query budget for the dense search (None = wait)
+
+    Returns:
+        HybridRetriever
+    """
+    texts = []
+    for position in range(vectorstore.index.ntotal):
+        doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+        text = doc.page_content
+        if extracted_texts is not None and position < len(extracted_texts):
+            text = f"{text} {extracted_texts[position] or ''}"
+        texts.append(text)
+
+    retriever = HybridRetriever(
+        vectorstore=vectorstore,
+        bm25=BM25Index(texts),
+        k=k,
+        candidate_k=candidate_k,
+        latency_budget_ms=latency_budget_ms,
+    )
+    logger.info("Created hybrid retriever with k=%d over %d documents", k, len(texts))
+    return retriever
+
+
+def get_hybrid_retriever_from_data(extracted_data: List[Dict[str, Any]], embedding_model=None, k: int = 3, **kwargs) -> HybridRetriever:
+    """Build vectorstore and return a hybrid BM25 + dense retriever, like get_retriever_from_data."""
+    vectorstore = build_vectorstore(extracted_data, embedding_model=embedding_model)
+    extracted_texts = [str(item.get("extracted_text", "")) for item in extracted_data]
+    return build_hybrid_retriever(vectorstore, extracted_texts=extracted_texts, k=k, **kwargs)
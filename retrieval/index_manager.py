@@ -0,0 +1,215 @@
+"""
+index_manager.py
+Incremental FAISS index maintenance with document-level add/delete.
+
+Every vector gets a stable ID derived from its document, page and region,
+and the document -> vector ID map is saved next to the index. Adding a
+report only embeds that report's pages; deleting one tombstones its vectors
+so searches skip them right away, and compact() physically removes them.
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from retrieval.metadata_filter import MetadataIndex, filtered_similarity_search
+from retrieval.retrieval import default_embeddings, load_vectorstore, record_to_document, save_vectorstore
+from utils.config import FAISS_INDEX_PATH, INDEX_COMPACT_THRESHOLD
+from utils.telemetry import traced
+
+logger = logging.getLogger(__name__)
+
+
+ID_MAP_FILENAME = "id_map.json"
+
+
+def vector_id(doc_id: str, record: Dict[str, Any], position: int) -> str:
+    """Stable vector ID for one extracted record of a document."""
+    region = record.get("region_id") or position
+    return f"{doc_id}:p{record.get('page')}:{region}"
+
+
+class IndexManager:
+    """
+    Document-level add/delete on top of save_vectorstore/load_vectorstore.
+
+    Args:
+        index_path: Index directory (as used by save_vectorstore)
+        embedding_model: Embeddings instance (default: initialize_embeddings())
+        compact_threshold: Tombstoned fraction of vectors that triggers compact()
+
+    Example:
+        >>> manager = IndexManager()
+        >>> manager.add_document("annual-2023", extracted_data)
+        >>> manager.delete_document("annual-2022")
+        >>> manager.save()
+        >>> docs = manager.search("revenue by segment", k=3)
+    """
+
+    def __init__(
+        self,
+        index_path: str = FAISS_INDEX_PATH,
+        embedding_model=None,
+        compact_threshold: float = INDEX_COMPACT_THRESHOLD,
+    ):
+        self.index_path = index_path
+        self.embedding_model = embedding_model or default_embeddings()
+        self.compact_threshold = compact_threshold
+        self.vectorstore: Optional[FAISS] = None
+        self.documents: Dict[str, List[str]] = {}
+        self.tombstones: Dict[str, List[str]] = {}
+        self.version = 0
+        self._metadata_index: Optional[MetadataIndex] = None
+        self._metadata_index_version = -1
+
+        if os.path.exists(index_path):
+            self.vectorstore = load_vectorstore(index_path, embedding_model=self.embedding_model, as_retriever=False)
+            id_map_path = os.path.join(index_path, ID_MAP_FILENAME)
+            if os.path.exists(id_map_path):
+                with open(id_map_path, 'r') as f:
+                    id_map = json.load(f)
+                self.documents = id_map.get("documents", {})
+                self.tombstones = id_map.get("tombstones", {})
+                self.version = id_map.get("version", 0)
+
+    @property
+    def vector_count(self) -> int:
+        return self.vectorstore.index.ntotal if self.vectorstore is not None else 0
+
+    @property
+    def tombstoned_count(self) -> int:
+        return sum(len(ids) for ids in self.tombstones.values())
+
+    def add_document(self, doc_id: str, records: List[Dict[str, Any]]) -> List[str]:
+        """
+        Embed and append one document's records, replacing any earlier version.
+
+        Args:
+            doc_id: Document ID stored in every vector's metadata
+            records: Extracted chart/table records for the document
+
+        Returns:
+            Vector IDs added
+        """
+        if doc_id in self.documents or doc_id in self.tombstones:
+            self._remove_vectors(self.documents.pop(doc_id, []) + self.tombstones.pop(doc_id, []))
+
+        documents: List[Document] = []
+        ids: List[str] = []
+        for position, record in enumerate(records):
+            documents.append(record_to_document(dict(record, doc_id=doc_id)))
+            ids.append(vector_id(doc_id, record, position))
+        if not documents:
+            return []
+
+        if self.vectorstore is None:
+            self.vectorstore = FAISS.from_documents(documents, self.embedding_model, ids=ids)
+        else:
+            self.vectorstore.add_documents(documents, ids=ids)
+
+        self.documents[doc_id] = ids
+        self.version += 1
+        logger.info("Added %d vectors for %s", len(ids), doc_id)
+        return ids
+
+    def delete_document(self, doc_id: str, tombstone: bool = True) -> int:
+        """
+        Remove all vectors of a document.
+
+        Args:
+            doc_id: Document to remove
+            tombstone: Hide the vectors now and remove them at the next
+                compact() instead of rewriting the index immediately
+
+        Returns:
+            Number of vectors removed or tombstoned
+        """
+        ids = self.documents.pop(doc_id, [])
+        if not ids:
+            return 0
+
+        if tombstone:
+            self.tombstones[doc_id] = ids
+            if self.vector_count and self.tombstoned_count / self.vector_count >= self.compact_threshold:
+                self.compact()
+        else:
+            self._remove_vectors(ids)
+
+        self.version += 1
+        logger.info("Deleted %d vectors for %s", len(ids), doc_id)
+        return len(ids)
+
+    def compact(self) -> int:
+        """Physically remove tombstoned vectors. Returns the number removed."""
+        ids = [vid for doc_ids in self.tombstones.values() for vid in doc_ids]
+        self._remove_vectors(ids)
+        self.tombstones.clear()
+        self.version += 1
+        logger.info("Compacted index, removed %d vectors", len(ids))
+        return len(ids)
+
+    def _remove_vectors(self, ids: List[str]) -> None:
+        if ids and self.vectorstore is not None:
+            self.vectorstore.delete(ids)
+
+    def _is_live(self, metadata: Dict[str, Any]) -> bool:
+        return metadata.get("doc_id") not in self.tombstones
+
+    @traced("vector_search")
+    def search(self, query: str, k: int = 3) -> List[Document]:
+        """Similarity search that skips tombstoned documents."""
+        if self.vectorstore is None:
+            return []
+        if not self.tombstones:
+            return self.vectorstore.similarity_search(query, k=k)
+        return self.vectorstore.similarity_search(
+            query, k=k, filter=self._is_live, fetch_k=k + self.tombstoned_count
+        )
+
+    def filtered_search(self, query: str, k: int = 3, **filters) -> List[Document]:
+        """
+        Similarity search restricted by metadata inside FAISS.
+
+        Tombstoned documents are excluded through the same ID selector.
+
+        Args:
+            query: Query text
+            k: Results to return
+            **filters: doc_ids, types, page_range (see MetadataIndex.select)
+
+        Example:
+            >>> docs = manager.filtered_search("revenue", types=["bar_chart"], page_range=(10, 40))
+        """
+        if self.vectorstore is None:
+            return []
+        if self._metadata_index is None or self._metadata_index_version != self.version:
+            self._metadata_index = MetadataIndex.from_vectorstore(self.vectorstore)
+            self._metadata_index_version = self.version
+        results = filtered_similarity_search(
+            self.vectorstore,
+            query,
+            k=k,
+            metadata_index=self._metadata_index,
+            exclude_doc_ids=list(self.tombstones) or None,
+            **filters,
+        )
+        return [doc for doc, _ in results]
+
+    def as_retriever(self, k: int = 3):
+        """LangChain retriever over live documents."""
+        search_kwargs: Dict[str, Any] = {"k": k}
+        if self.tombstones:
+            search_kwargs.update(filter=self._is_live, fetch_k=k + self.tombstoned_count)
+        return self.vectorstore.as_retriever(search_kwargs=search_kwargs)
+
+    def save(self) -> None:
+        """Save the index and its document -> vector ID map."""
+        if self.vectorstore is None:
+            return
+        save_vectorstore(self.vectorstore, self.index_path)
+        with open(os.path.join(self.index_path, ID_MAP_FILENAME), 'w') as f:
+            json.dump({"documents": self.documents, "tombstones": self.tombstones, "version": self.version}, f)
@@ -0,0 +1,202 @@
+"""
+metadata_filter.py
+Metadata-filtered vector search with the filter applied inside FAISS.
+
+A MetadataIndex keeps precomputed ID sets per document and element type and
+a page-sorted position array for page ranges. A filter becomes a FAISS ID
+selector (a bitmap when the selection is dense, a hashed ID batch when it
+is sparse), so the search itself only considers matching vectors instead of
+over-fetching and filtering afterwards.
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.config import MMAP_INDEX_NPROBE
+from utils.telemetry import traced
+
+
+# Selections denser than this use a bitmap selector instead of an ID batch
+BITMAP_SELECTOR_MIN_FRACTION = 1 / 16
+
+
+class MetadataIndex:
+    """
+    Precomputed position sets over vectorstore metadata.
+
+    Args:
+        metadatas: Metadata dict per FAISS index position
+
+    Example:
+        >>> meta_index = MetadataIndex.from_vectorstore(vectorstore)
+        >>> ids = meta_index.select(doc_ids=["annual-2023"], types=["bar_chart"], page_range=(10, 40))
+    """
+
+    def __init__(self, metadatas: List[Dict[str, Any]]):
+        self.ntotal = len(metadatas)
+        doc_sets: Dict[Any, List[int]] = defaultdict(list)
+        type_sets: Dict[Any, List[int]] = defaultdict(list)
+        pages = np.full(self.ntotal, -1, dtype=np.int64)
+
+        for position, metadata in enumerate(metadatas):
+            doc_sets[metadata.get("doc_id")].append(position)
+            type_sets[metadata.get("type")].append(position)
+            if metadata.get("page") is not None:
+                pages[position] = int(metadata["page"])
+
+        self.by_doc = {key: np.asarray(ids, dtype=np.int64) for key, ids in doc_sets.items()}
+        self.by_type = {key: np.asarray(ids, dtype=np.int64) for key, ids in type_sets.items()}
+        self._page_order = np.argsort(pages, kind="stable")
+        self._sorted_pages = pages[self._page_order]
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore) -> "MetadataIndex":
+        """Build from a LangChain FAISS vectorstore (positions follow index_to_docstore_id)."""
+        metadatas = [
+            vectorstore.docstore.search(vectorstore.index_to_docstore_id[position]).metadata
+            for position in range(vectorstore.index.ntotal)
+        ]
+        return cls(metadatas)
+
+    def _union(self, sets: Dict[Any, np.ndarray], keys: Iterable[Any]) -> np.ndarray:
+        arrays = [sets[key] for key in keys if key in sets]
+        if not arrays:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(arrays))
+
+    def select(
+        self,
+        doc_ids: Optional[Iterable[str]] = None,
+        types: Optional[Iterable[str]] = None,
+        page_range: Optional[Tuple[int, int]] = None,
+        exclude_doc_ids: Optional[Iterable[str]] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        Positions matching every given filter (values within a filter are OR-ed).
+
+        Args:
+            doc_ids: Keep these documents
+            types: Keep these element types (e.g. "bar_chart", "table")
+            page_range: Inclusive (first_page, last_page)
+            exclude_doc_ids: Drop these documents (e.g. tombstoned ones)
+
+        Returns:
+            Sorted int64 positions, or None when no filter was given
+        """
+        selected: Optional[np.ndarray] = None
+
+        def intersect(ids: np.ndarray) -> None:
+            nonlocal selected
+            selected = ids if selected is None else np.intersect1d(selected, ids, assume_unique=True)
+
+        if doc_ids is not None:
+            intersect(self._union(self.by_doc, doc_ids))
+        if types is not None:
+            intersect(self._union(self.by_type, types))
+        if page_range is not None:
+            lo = np.searchsorted(self._sorted_pages, page_range[0], side="left")
+            hi = np.searchsorted(self._sorted_pages, page_range[1], side="right")
+            intersect(np.sort(self._page_order[lo:hi]))
+        if exclude_doc_ids:
+            excluded = self._union(self.by_doc, exclude_doc_ids)
+            base = selected if selected is not None else np.arange(self.ntotal, dtype=np.int64)
+            selected = np.setdiff1d(base, excluded, assume_unique=True)
+        return selected
+
+
+def make_id_selector(ids: np.ndarray, ntotal: int):
+    """
+    FAISS ID selector for the given positions.
+
+    Returns:
+        Tuple of (selector, backing array). Keep the array alive for as long
+        as the selector is used; FAISS only holds a pointer to it.
+    """
+    if ntotal and len(ids) / ntotal >= BITMAP_SELECTOR_MIN_FRACTION:
+        mask = np.zeros(ntotal, dtype=bool)
+        mask[ids] = True
+        bitmap = np.packbits(mask, bitorder="little")
+        return faiss.IDSelectorBitmap(ntotal, faiss.swig_ptr(bitmap)), bitmap
+    ids = np.ascontiguousarray(ids, dtype=np.int64)
+    return faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids)), ids
+
+
+@traced("faiss_search")
+def filtered_search_by_vector(
+    index,
+    vector: List[float],
+    ids: Optional[np.ndarray],
+    k: int = 3,
+    nprobe: int = MMAP_INDEX_NPROBE,
+) -> List[Tuple[int, float]]:
+    """
+    Search a raw FAISS index restricted to the given positions.
+
+    Args:
+        index: FAISS index
+        vector: Query vector
+        ids: Allowed positions (None = no restriction)
+        k: Results to return
+        nprobe: IVF lists probed (ignored for non-IVF indexes)
+
+    Returns:
+        (position, distance) pairs, closest first
+    """
+    query = np.asarray([vector], dtype=np.float32)
+    if ids is None:
+        distances, positions = index.search(query, k)
+    elif len(ids) == 0:
+        return []
+    else:
+        selector, _backing = make_id_selector(ids, index.ntotal)
+        if faiss.try_extract_index_ivf(index) is not None:
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+        elif isinstance(index, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(sel=selector)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        distances, positions = index.search(query, min(k, len(ids)), params=params)
+    return [(int(p), float(d)) for p, d in zip(positions[0], distances[0]) if p != -1]
+
+
+def filtered_similarity_search(
+    vectorstore,
+    query: str,
+    k: int = 3,
+    metadata_index: Optional[MetadataIndex] = None,
+    **filters,
+) -> List[Tuple[Document, float]]:
+    """
+    Similarity search on a LangChain FAISS vectorstore with metadata filters.
+
+    Args:
+        vectorstore: LangChain FAISS vectorstore
+        query: Query text
+        k: Results to return
+        metadata_index: Prebuilt MetadataIndex (built from the vectorstore if
+            missing or out of date)
+        **filters: doc_ids, types, page_range, exclude_doc_ids (see MetadataIndex.select)
+
+    Returns:
+        (document, L2 distance) pairs, closest first
+
+    Example:
+        >>> results = filtered_similarity_search(vectorstore, "revenue", k=3,
+        ...                                      types=["bar_chart"], page_range=(10, 40))
+    """
+    if metadata_index is None or metadata_index.ntotal != vectorstore.index.ntotal:
+        metadata_index = MetadataIndex.from_vectorstore(vectorstore)
+
+    vector = np.asarray([vectorstore.embeddings.embed_query(query)], dtype=np.float32)
+    if getattr(vectorstore, "_normalize_L2", False):
+        faiss.normalize_L2(vector)
+
+    hits = filtered_search_by_vector(vectorstore.index, vector[0], metadata_index.select(**filters), k=k)
+    return [
+        (vectorstore.docstore.search(vectorstore.index_to_docstore_id[position]), distance)
+        for position, distance in hits
+    ]
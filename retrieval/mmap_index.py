@@ -0,0 +1,347 @@
+"""
+mmap_index.py
+Memory-mappable on-disk index format, an alternative to save_local/load_local.
+
+Layout of an index directory:
+    index.faiss   FAISS IVF-Flat, IVF-PQ or HNSW index (read with IO_FLAG_MMAP)
+    vectors.npy   raw float32 vectors, used for exact-search recall checks and rebuilds
+    docs.sqlite   page_content + JSON metadata per vector ID (no pickle)
+    meta.json     index type, dimension, count, embedding model and measured recall
+
+Query processes open the files read-only, so the OS page cache is shared
+between them instead of every process holding its own copy of the index.
+"""
+
+import json
+import logging
+import math
+import os
+import sqlite3
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from retrieval.metadata_filter import MetadataIndex, filtered_search_by_vector
+from retrieval.retrieval import default_embeddings, query_embeddings
+from utils.telemetry import telemetry
+from utils.config import (
+    EMBED_BATCH_SIZE,
+    EMBEDDING_MODEL,
+    MMAP_INDEX_HNSW_M,
+    MMAP_INDEX_NLIST,
+    MMAP_INDEX_NPROBE,
+    MMAP_INDEX_PATH,
+    MMAP_INDEX_PQ_M,
+    MMAP_INDEX_TRAIN_PER_LIST,
+    MMAP_INDEX_TYPE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# PQ codebooks have 256 centroids per sub-quantizer; FAISS wants ~39 training points each
+_PQ_MIN_TRAIN = 256 * 39
+
+
+def _effective_nlist(nlist: int, count: int) -> int:
+    # Keep roughly 39+ training points per list, as FAISS recommends
+    return max(1, min(nlist, count // 39, int(4 * math.sqrt(count))))
+
+
+def _factory_string(index_type: str, dim: int, count: int, nlist: int, pq_m: int, hnsw_m: int) -> str:
+    nlist = _effective_nlist(nlist, count)
+    if index_type == "IVF-Flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "IVF-PQ":
+        if count < 256:
+            # PQ codebooks need at least 256 training vectors
+            logger.info("Only %d vectors, using IVF-Flat instead of IVF-PQ", count)
+            return f"IVF{nlist},Flat"
+        if dim % pq_m:
+            raise ValueError(f"PQ sub-quantizers ({pq_m}) must divide the dimension ({dim})")
+        return f"IVF{nlist},PQ{pq_m}"
+    if index_type == "HNSW":
+        return f"HNSW{hnsw_m},Flat"
+    raise ValueError(f"Unknown index type: {index_type} (expected IVF-Flat, IVF-PQ or HNSW)")
+
+
+def _exact_search(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    # Brute-force L2 in blocks so memory-mapped vectors are streamed, not loaded whole
+    best_dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+    best_ids = np.full((len(queries), k), -1, dtype=np.int64)
+    q_norms = (queries ** 2).sum(axis=1, keepdims=True)
+    for start in range(0, len(vectors), 65536):
+        block = np.asarray(vectors[start:start + 65536])
+        dist = q_norms - 2 * queries @ block.T + (block ** 2).sum(axis=1)
+        ids = np.broadcast_to(np.arange(start, start + len(block)), dist.shape)
+        all_dist = np.concatenate([best_dist, dist], axis=1)
+        all_ids = np.concatenate([best_ids, ids], axis=1)
+        order = np.argsort(all_dist, axis=1)[:, :k]
+        best_dist = np.take_along_axis(all_dist, order, axis=1)
+        best_ids = np.take_along_axis(all_ids, order, axis=1)
+    return best_ids
+
+
+def measure_recall(index, vectors: np.ndarray, k: int = 10, samples: int = 200, seed: int = 0) -> float:
+    """
+    Recall@k of an approximate index against exact search.
+
+    Args:
+        index: FAISS index to evaluate
+        vectors: The vectors the index was built from
+        k: Neighbours compared per query
+        samples: Stored vectors reused as queries
+
+    Returns:
+        Mean fraction of the exact top-k found by the index
+    """
+    k = min(k, len(vectors))
+    if k == 0:
+        return 1.0
+    rng = np.random.default_rng(seed)
+    query_ids = rng.choice(len(vectors), size=min(samples, len(vectors)), replace=False)
+    queries = np.asarray(vectors[np.sort(query_ids)], dtype=np.float32)
+
+    exact = _exact_search(vectors, queries, k)
+    _, approx = index.search(queries, k)
+    hits = sum(len(set(e) & set(a)) for e, a in zip(exact, approx))
+    return hits / (len(queries) * k)
+
+
+def _training_sample(vectors: np.ndarray, index_type: str, nlist: int, train_per_list: int, seed: int = 0) -> np.ndarray:
+    # A bounded random sample trains the coarse quantizer (and PQ codebooks) as well
+    # as the full corpus does, without reading every memory-mapped vector into RAM
+    count = len(vectors)
+    size = train_per_list * _effective_nlist(nlist, count)
+    if index_type == "IVF-PQ":
+        size = max(size, _PQ_MIN_TRAIN)
+    if size >= count:
+        return np.asarray(vectors)
+    ids = np.sort(np.random.default_rng(seed).choice(count, size=size, replace=False))
+    return np.asarray(vectors[ids])
+
+
+def build_mmap_index(
+    documents: Iterable[Document],
+    index_path: str = MMAP_INDEX_PATH,
+    embedding_model=None,
+    index_type: str = MMAP_INDEX_TYPE,
+    nlist: int = MMAP_INDEX_NLIST,
+    pq_m: int = MMAP_INDEX_PQ_M,
+    hnsw_m: int = MMAP_INDEX_HNSW_M,
+    batch_size: int = EMBED_BATCH_SIZE,
+    train_per_list: int = MMAP_INDEX_TRAIN_PER_LIST,
+) -> Dict[str, Any]:
+    """
+    Embed documents and write them in the memory-mappable index format.
+
+    Documents are consumed as a stream: vectors and rows are written to disk
+    batch by batch, IVF training uses a random sample of the vectors and the
+    index is filled in blocks, so memory stays bounded for large corpora.
+
+    Args:
+        documents: Documents to index, any iterable (e.g. a generator over
+            record_to_document(record) for records streamed from an ExtractionStore)
+        index_path: Output directory
+        embedding_model: Embeddings instance (default: initialize_embeddings())
+        index_type: "IVF-Flat", "IVF-PQ" or "HNSW"
+        nlist: Upper bound on IVF lists (reduced automatically for small corpora)
+        pq_m: PQ sub-quantizers for IVF-PQ
+        hnsw_m: Graph degree for HNSW
+        batch_size: Texts per embedding call
+        train_per_list: Training vectors sampled per IVF list
+
+    Returns:
+        The index metadata written to meta.json, including recall@10
+
+    Example:
+        >>> documents = [record_to_document(item) for item in extracted_data]
+        >>> meta = build_mmap_index(documents, index_type="IVF-PQ")
+        >>> print(meta["recall_at_10"])
+    """
+    if index_type == "HNSW":
+        logger.warning("HNSW graphs cannot be memory-mapped; every MmapIndex over %s loads it whole", index_path)
+    if embedding_model is None:
+        embedding_model = default_embeddings()
+    os.makedirs(index_path, exist_ok=True)
+
+    docs_path = os.path.join(index_path, "docs.sqlite")
+    if os.path.exists(docs_path):
+        os.remove(docs_path)
+    conn = sqlite3.connect(docs_path)
+    conn.execute("CREATE TABLE docs (id INTEGER PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)")
+
+    # The count is unknown until the stream ends, so raw vectors go to a scratch file first
+    raw_path = os.path.join(index_path, "vectors.f32.tmp")
+    count, dim = 0, 0
+    documents = iter(documents)
+    with open(raw_path, "wb") as raw:
+        while True:
+            batch = list(islice(documents, batch_size))
+            if not batch:
+                break
+            embedded = embedding_model.embed_documents([doc.page_content for doc in batch])
+            embedded = np.asarray(embedded, dtype=np.float32)
+            raw.write(embedded.tobytes())
+            conn.executemany(
+                "INSERT INTO docs (id, page_content, metadata) VALUES (?, ?, ?)",
+                ((count + i, doc.page_content, json.dumps(doc.metadata)) for i, doc in enumerate(batch)),
+            )
+            count, dim = count + len(batch), embedded.shape[1]
+    conn.commit()
+    conn.close()
+    if not count:
+        os.remove(raw_path)
+        raise ValueError("No documents to index")
+
+    vectors = np.lib.format.open_memmap(
+        os.path.join(index_path, "vectors.npy"), mode="w+", dtype=np.float32, shape=(count, dim)
+    )
+    raw_vectors = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(count, dim))
+    for start in range(0, count, 65536):
+        vectors[start:start + 65536] = raw_vectors[start:start + 65536]
+    vectors.flush()
+    del raw_vectors
+    os.remove(raw_path)
+
+    spec = _factory_string(index_type, dim, count, nlist, pq_m, hnsw_m)
+    index = faiss.index_factory(dim, spec)
+    if not index.is_trained:
+        index.train(_training_sample(vectors, index_type, nlist, train_per_list))
+    for start in range(0, count, 65536):
+        index.add(np.asarray(vectors[start:start + 65536]))
+    faiss.write_index(index, os.path.join(index_path, "index.faiss"))
+
+    meta = {
+        "index_type": index_type,
+        "factory": spec,
+        "dim": dim,
+        "count": count,
+        "embedding_model": getattr(embedding_model, "model_name", EMBEDDING_MODEL),
+        "recall_at_10": round(measure_recall(_set_nprobe(index, MMAP_INDEX_NPROBE), vectors, k=10), 4),
+    }
+    with open(os.path.join(index_path, "meta.json"), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    logger.info("Built %s index with %d vectors (recall@10 %s) at %s", spec, count, meta["recall_at_10"], index_path)
+    return meta
+
+
+def _set_nprobe(index, nprobe: int):
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+    return index
+
+
+class MmapIndex:
+    """
+    Read-only view of an index written by build_mmap_index().
+
+    Args:
+        index_path: Index directory
+        embedding_model: Embeddings instance for queries (default: query_embeddings(),
+            which reads the embedding cache but never adds query text to it)
+        nprobe: IVF lists probed per query
+
+    Example:
+        >>> index = MmapIndex()
+        >>> for doc, score in index.search("quarterly revenue", k=3):
+        ...     print(doc.metadata["page"], score)
+    """
+
+    def __init__(self, index_path: str = MMAP_INDEX_PATH, embedding_model=None, nprobe: int = MMAP_INDEX_NPROBE):
+        self.index_path = index_path
+        self.embedding_model = embedding_model or query_embeddings()
+        with open(os.path.join(index_path, "meta.json"), 'r') as f:
+            self.meta = json.load(f)
+
+        index_file = os.path.join(index_path, "index.faiss")
+        try:
+            self.index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Not every index type supports mmap (e.g. HNSW graphs); fall back to a normal read
+            logger.warning(
+                "%s index at %s cannot be memory-mapped; loading it into this process's memory",
+                self.meta["factory"], index_path,
+            )
+            self.index = faiss.read_index(index_file)
+        _set_nprobe(self.index, nprobe)
+
+        docs_uri = "file:" + os.path.abspath(os.path.join(index_path, "docs.sqlite")) + "?mode=ro"
+        self._conn = sqlite3.connect(docs_uri, uri=True, check_same_thread=False)
+        self.nprobe = nprobe
+        self._metadata_index: Optional[MetadataIndex] = None
+        logger.info("Opened %s index with %d vectors from %s", self.meta["factory"], self.meta["count"], index_path)
+
+    def _documents(self, ids: List[int]) -> Dict[int, Document]:
+        placeholders = ",".join("?" * len(ids))
+        rows = self._conn.execute(
+            f"SELECT id, page_content, metadata FROM docs WHERE id IN ({placeholders})", ids
+        ).fetchall()
+        return {i: Document(page_content=content, metadata=json.loads(md)) for i, content, md in rows}
+
+    def search_by_vector(self, vector: List[float], k: int = 3) -> List[Tuple[Document, float]]:
+        with telemetry.span("faiss_search", k=k):
+            scores, ids = self.index.search(np.asarray([vector], dtype=np.float32), k)
+        hits = [(int(i), float(s)) for i, s in zip(ids[0], scores[0]) if i != -1]
+        if not hits:
+            return []
+        docs = self._documents([i for i, _ in hits])
+        return [(docs[i], score) for i, score in hits if i in docs]
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[Document, float]]:
+        """Return (document, L2 distance) pairs, closest first."""
+        return self.search_by_vector(self.embedding_model.embed_query(query), k=k)
+
+    def filtered_search(self, query: str, k: int = 3, **filters) -> List[Tuple[Document, float]]:
+        """
+        Search restricted by metadata (doc_ids, types, page_range) inside FAISS.
+
+        Example:
+            >>> index.filtered_search("revenue", k=3, types=["bar_chart"], page_range=(10, 40))
+        """
+        if self._metadata_index is None:
+            rows = self._conn.execute("SELECT metadata FROM docs ORDER BY id").fetchall()
+            self._metadata_index = MetadataIndex([json.loads(md) for md, in rows])
+
+        vector = self.embedding_model.embed_query(query)
+        hits = filtered_search_by_vector(
+            self.index, vector, self._metadata_index.select(**filters), k=k, nprobe=self.nprobe
+        )
+        if not hits:
+            return []
+        docs = self._documents([i for i, _ in hits])
+        return [(docs[i], score) for i, score in hits if i in docs]
+
+    def recall(self, k: int = 10, samples: int = 200) -> float:
+        """Recall@k of this index against exact search over the stored vectors."""
+        vectors = np.load(os.path.join(self.index_path, "vectors.npy"), mmap_mode="r")
+        return measure_recall(self.index, vectors, k=k, samples=samples)
+
+    def as_retriever(self, k: int = 3) -> "MmapRetriever":
+        return MmapRetriever(index=self, k=k)
+
+
+class MmapRetriever(BaseRetriever):
+    """LangChain retriever over an MmapIndex."""
+
+    index: Any
+    k: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in self.index.search(query, k=self.k)]
+
+
+def load_mmap_index(index_path: str = MMAP_INDEX_PATH, embedding_model=None, as_retriever: bool = True, k: int = 3):
+    """Open a memory-mapped index and optionally return a retriever, like load_vectorstore."""
+    if not os.path.exists(os.path.join(index_path, "meta.json")):
+        logger.error("Index path does not exist: %s", index_path)
+        return None
+    index = MmapIndex(index_path, embedding_model=embedding_model)
+    return index.as_retriever(k=k) if as_retriever else index
@@ -0,0 +1,183 @@
+"""
+query_cache.py
+Query-result and prompt cache in front of retrieval and fusion.
+
+Exact tier: normalized query text + index version -> retrieved documents and
+the prompt built by format_for_llm. Optional semantic tier: a query whose
+embedding is close enough to a cached one reuses that entry's documents,
+with the prompt rebuilt for the new wording. Entries expire
+by TTL and LRU, and everything is dropped when the index version changes.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from fusion.fusion import format_for_llm
+from utils.config import QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", query.lower()).strip().rstrip("?.!").strip()
+
+
+def document_key(doc: Document) -> str:
+    """Identify a retrieved document by its doc_id, page and region."""
+    md = doc.metadata
+    return f"{md.get('doc_id', '')}:p{md.get('page')}:{md.get('region_id', '')}"
+
+
+class QueryCache:
+    """
+    Cache retrieval results and built prompts per query.
+
+    Args:
+        retriever: LangChain retriever (anything with invoke) or a callable query -> documents
+        index_version: Callable returning the current index version (e.g. lambda: manager.version)
+        embedding_model: Embeddings used by the semantic tier
+        semantic_threshold: Cosine similarity needed for a semantic hit (None disables the tier)
+        max_entries: LRU bound
+        ttl_seconds: Entry lifetime
+        prompt_builder: Callable (documents, query) -> prompt
+
+    Example:
+        >>> cache = QueryCache(manager.as_retriever(k=3), index_version=lambda: manager.version)
+        >>> docs, prompt = cache.query("What was Q3 2021 EBITDA?")
+        >>> print(cache.stats())
+    """
+
+    def __init__(
+        self,
+        retriever,
+        index_version: Callable[[], Any] = lambda: 0,
+        embedding_model=None,
+        semantic_threshold: Optional[float] = None,
+        max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = QUERY_CACHE_TTL_SECONDS,
+        prompt_builder: Callable[[List[Document], str], str] = format_for_llm,
+    ):
+        self.retrieve = retriever.invoke if hasattr(retriever, "invoke") else retriever
+        self.index_version = index_version
+        self.embedding_model = embedding_model
+        self.semantic_threshold = semantic_threshold if embedding_model is not None else None
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.prompt_builder = prompt_builder
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_version(self) -> None:
+        version = self.index_version()
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        for key in [k for k, entry in self._entries.items() if entry["created"] < cutoff]:
+            del self._entries[key]
+
+    def _semantic_lookup(self, vector: np.ndarray) -> Optional[str]:
+        candidates = [(key, entry) for key, entry in self._entries.items() if entry["vector"] is not None]
+        if not candidates:
+            return None
+        matrix = np.stack([entry["vector"] for _, entry in candidates])
+        similarities = matrix @ vector
+        best = int(np.argmax(similarities))
+        return candidates[best][0] if similarities[best] >= self.semantic_threshold else None
+
+    def query(
+        self, query: str, prompt_builder: Optional[Callable[[List[Document], str], str]] = None
+    ) -> Tuple[List[Document], str]:
+        """
+        Return (retrieved documents, prompt) for a query, from cache when possible.
+
+        A semantic hit reuses the cached documents but builds the prompt for
+        this query's wording.
+
+        Args:
+            query: User question
+            prompt_builder: Per-call builder (e.g. with a caller's token budget);
+                only the documents are served from cache and the prompt is
+                always built with it
+        """
+        builder = prompt_builder or self.prompt_builder
+        key = normalize_query(query)
+        with self._lock:
+            self._check_version()
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                documents, prompt = entry["documents"], entry["prompt"]
+        if entry is not None:
+            # Entries filled through a per-call builder hold no default prompt
+            return documents, prompt if prompt_builder is None and prompt is not None else builder(documents, query)
+
+        vector = None
+        if self.semantic_threshold is not None:
+            vector = np.asarray(self.embedding_model.embed_query(key), dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+            with self._lock:
+                match = self._semantic_lookup(vector)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.semantic_hits += 1
+                    documents = self._entries[match]["documents"]
+            if match is not None:
+                return documents, builder(documents, query)
+
+        documents = self.retrieve(query)
+        prompt = builder(documents, query)
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = {
+                "documents": documents,
+                "doc_ids": [document_key(doc) for doc in documents],
+                "prompt": prompt if prompt_builder is None else None,
+                "vector": vector,
+                "created": time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return documents, prompt
+
+    def cached_doc_ids(self, query: str) -> Optional[List[str]]:
+        """Document keys cached for a query, or None if it is not cached."""
+        with self._lock:
+            entry = self._entries.get(normalize_query(query))
+            return list(entry["doc_ids"]) if entry is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current hit rate."""
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+            }
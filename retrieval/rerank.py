@@ -0,0 +1,207 @@
+"""
+rerank.py
+Cross-encoder reranking between retrieval and fusion.
+
+The bi-encoder retriever fetches a wide candidate set cheaply; a small local
+cross-encoder then scores each (query, candidate) pair in batches on CPU and
+only the best few go on to format_for_llm. This keeps prompts short without
+losing the recall of a larger k.
+"""
+
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from retrieval.embedding_backends import ONNX_MODEL_FILES, _hub_repo, _resolve_file, quantize_onnx_model
+from utils.config import (
+    RERANK_BACKEND,
+    RERANK_BATCH_SIZE,
+    RERANK_CANDIDATE_K,
+    RERANK_MAX_LENGTH,
+    RERANK_MODEL,
+    RERANK_TOP_N,
+)
+
+logger = logging.getLogger(__name__)
+
+# (retriever id, timings) of the last query run in this thread or task
+_last_timings: ContextVar[Tuple[int, Dict[str, Any]]] = ContextVar("rerank_last_timings", default=(0, {}))
+
+
+RERANK_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+class CrossEncoderReranker:
+    """
+    Batched cross-encoder scorer, loaded on first use.
+
+    Args:
+        model_name: Hugging Face cross-encoder checkpoint
+        backend: "torch", "onnx" (ONNX Runtime) or "onnx-int8" (ONNX dynamically
+            quantized to int8 on this machine, so it runs on any CPU)
+        batch_size: Pairs scored per forward pass
+        max_length: Token limit per (query, passage) pair
+
+    Example:
+        >>> reranker = CrossEncoderReranker(backend="onnx-int8")
+        >>> scores = reranker.score("Q3 2021 EBITDA", ["bar chart ...", "pie chart ..."])
+    """
+
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        backend: str = RERANK_BACKEND,
+        batch_size: int = RERANK_BATCH_SIZE,
+        max_length: int = RERANK_MAX_LENGTH,
+    ):
+        if backend not in RERANK_BACKENDS:
+            raise ValueError(f"Unknown rerank backend: {backend}")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self._model = None
+
+    def _onnx_model(self) -> Tuple[str, str]:
+        # Load from a local directory so sentence-transformers never looks for
+        # (or tries to export) the locally quantized file on the Hub
+        if os.path.isdir(self.model_name):
+            model_dir = self.model_name
+        else:
+            from huggingface_hub import snapshot_download
+
+            model_dir = snapshot_download(
+                _hub_repo(self.model_name), allow_patterns=["*.json", "*.txt", *ONNX_MODEL_FILES]
+            )
+        model_path = _resolve_file(model_dir, ONNX_MODEL_FILES)
+        if self.backend == "onnx-int8":
+            model_path = quantize_onnx_model(model_path)
+        return model_dir, os.path.relpath(model_path, model_dir)
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+
+            if self.backend == "torch":
+                self._model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+            else:
+                model_dir, file_name = self._onnx_model()
+                self._model = CrossEncoder(
+                    model_dir,
+                    max_length=self.max_length,
+                    device="cpu",
+                    backend="onnx",
+                    model_kwargs={"file_name": file_name},
+                )
+            logger.info("Loaded reranker %s (%s)", self.model_name, self.backend)
+        return self._model
+
+    def score(self, query: str, passages: Sequence[str]) -> List[float]:
+        """Relevance score per passage (higher is better)."""
+        if not passages:
+            return []
+        pairs = [(query, passage) for passage in passages]
+        scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        return [float(score) for score in scores]
+
+
+class RerankRetriever(BaseRetriever):
+    """
+    LangChain retriever that reranks a wider candidate set with a cross-encoder.
+
+    The base retriever should return candidate_k documents (see
+    build_rerank_retriever); anything beyond candidate_k is dropped before
+    scoring so the cross-encoder cost stays bounded.
+
+    Example:
+        >>> retriever = build_rerank_retriever(vectorstore, top_n=3)
+        >>> docs, timings = retriever.invoke_with_timings("Q3 2021 EBITDA")
+        >>> print(timings["rerank_ms"])
+    """
+
+    base_retriever: Any
+    reranker: Any
+    candidate_k: int = RERANK_CANDIDATE_K
+    top_n: int = RERANK_TOP_N
+
+    @property
+    def last_timings(self) -> Dict[str, Any]:
+        """Timings of this retriever's last query in the calling thread or task."""
+        owner, timings = _last_timings.get()
+        return timings if owner == id(self) else {}
+
+    def invoke_with_timings(self, query: str, **kwargs) -> Tuple[List[Document], Dict[str, Any]]:
+        """Run a query and return (documents, timings) for exactly that query."""
+        documents = self.invoke(query, **kwargs)
+        return documents, self.last_timings
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        start = time.perf_counter()
+        candidates = self.base_retriever.invoke(query)[:self.candidate_k]
+        retrieve_ms = (time.perf_counter() - start) * 1000
+
+        rerank_start = time.perf_counter()
+        scores = self.reranker.score(query, [doc.page_content for doc in candidates])
+        rerank_ms = (time.perf_counter() - rerank_start) * 1000
+
+        ranked = sorted(zip(candidates, scores), key=lambda item: item[1], reverse=True)[:self.top_n]
+        documents = [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, "rerank_score": score})
+            for doc, score in ranked
+        ]
+
+        timings = {
+            "retrieve_ms": round(retrieve_ms, 2),
+            "rerank_ms": round(rerank_ms, 2),
+            "total_ms": round((time.perf_counter() - start) * 1000, 2),
+            "candidates": len(candidates),
+        }
+        # The base retriever ran in this same thread, so its timings are this query's
+        base_timings = getattr(self.base_retriever, "last_timings", None)
+        if base_timings:
+            timings["retriever"] = dict(base_timings)
+        _last_timings.set((id(self), timings))
+        return documents
+
+
+def build_rerank_retriever(
+    vectorstore=None,
+    base_retriever=None,
+    reranker: Optional[CrossEncoderReranker] = None,
+    candidate_k: int = RERANK_CANDIDATE_K,
+    top_n: int = RERANK_TOP_N,
+) -> RerankRetriever:
+    """
+    Wrap retrieval with a cross-encoder rerank stage.
+
+    Args:
+        vectorstore: LangChain FAISS vectorstore; a candidate_k retriever is created from it
+        base_retriever: Existing retriever to rerank instead (e.g. a HybridRetriever
+            built with k=candidate_k)
+        reranker: CrossEncoderReranker (default settings if None)
+        candidate_k: Candidates fetched and scored per query
+        top_n: Documents passed on to fusion
+
+    Returns:
+        RerankRetriever
+    """
+    if base_retriever is None:
+        if vectorstore is None:
+            raise ValueError("Either vectorstore or base_retriever is required")
+        base_retriever = vectorstore.as_retriever(search_kwargs={"k": candidate_k})
+
+    retriever = RerankRetriever(
+        base_retriever=base_retriever,
+        reranker=reranker or CrossEncoderReranker(),
+        candidate_k=candidate_k,
+        top_n=top_n,
+    )
+    logger.info("Created rerank retriever: %d candidates -> top %d", candidate_k, top_n)
+    return retriever
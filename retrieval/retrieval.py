@@ -1,42 +1,135 @@
 
-from typing import List, Dict, Any
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Optional
+import logging
 import os
 
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.documents import Document
 
-from utils.config import EMBEDDING_MODEL, FAISS_INDEX_PATH
+from retrieval.embedding_backends import create_embeddings
+from retrieval.embedding_cache import CachedEmbeddings
+from utils.config import EMBED_BATCH_SIZE, EMBEDDING_BACKEND, EMBEDDING_MODEL, EMBEDDING_NUM_THREADS, FAISS_INDEX_PATH
+from utils.model_registry import models
+from utils.telemetry import profiled, telemetry
+
+logger = logging.getLogger(__name__)
+
+
+def initialize_embeddings(
+    model_name: str = EMBEDDING_MODEL,
+    use_cache: bool = True,
+    backend: str = EMBEDDING_BACKEND,
+    batch_size: int = EMBED_BATCH_SIZE,
+    num_threads: Optional[int] = EMBEDDING_NUM_THREADS,
+):
+    """
+    Create the embedding model, wrapped in the persistent embedding cache by default.
+
+    Args:
+        model_name: Sentence-transformers model name
+        use_cache: Wrap the model in CachedEmbeddings
+        backend: "torch" (fp32), "onnx" or "onnx-int8"; the ONNX backends never import torch
+        batch_size: Texts per forward pass
+        num_threads: CPU threads for inference (None = library default)
+    """
+    embeddings = create_embeddings(model_name, backend, batch_size=batch_size, num_threads=num_threads)
+    if use_cache:
+        # Quantized vectors differ slightly, so each non-default backend gets its own cache
+        cache_name = model_name if backend == "torch" else f"{model_name}-{backend}"
+        embeddings = CachedEmbeddings(embeddings, cache_name, batch_size=batch_size)
+    return embeddings
+
+
+# Default embedding model, shared by every caller that does not pass its own
+models.register("embeddings", initialize_embeddings)
+
 
+def default_embeddings():
+    """Shared embedding model for this process, loaded on first use and kept warm."""
+    return models.get("embeddings")
 
-def initialize_embeddings(model_name: str = EMBEDDING_MODEL):
-    embeddings = HuggingFaceEmbeddings(model_name=model_name)
+
+def _initialize_query_embeddings():
+    embeddings = default_embeddings()
+    if isinstance(embeddings, CachedEmbeddings):
+        # Query text is rarely repeated verbatim: serve cache hits, but do not
+        # evict corpus vectors to make room for it
+        embeddings = CachedEmbeddings(
+            embeddings.embeddings,
+            embeddings.model_name,
+            cache_dir=os.path.dirname(embeddings.cache_dir),
+            batch_size=embeddings.batch_size,
+            read_only=True,
+        )
     return embeddings
 
 
+models.register("query_embeddings", _initialize_query_embeddings)
 
-def build_vectorstore(extracted_data: List[Dict[str, Any]], embedding_model=None):
-    """Build FAISS vectorstore from extracted chart/table data."""
-    if embedding_model is None:
-        embedding_model = initialize_embeddings()
 
-    documents: List[Document] = []
-    for item in extracted_data:
-        page_content = f"{item.get('type', '')} {item.get('title', '')} {item.get('context', '')}"
-        if not page_content.strip():
-            page_content = str(item.get('extracted_text', 'No text available'))
+def query_embeddings():
+    """The shared embedding model behind a read-only view of its cache, for embedding queries."""
+    return models.get("query_embeddings")
+
 
-        metadata = {
-            "page": item.get("page"),
-            "type": item.get("type"),
-            "chart_title": item.get("title", ""),
-        }
 
-        doc = Document(page_content=page_content, metadata=metadata)
-        documents.append(doc)
+# Fields record_to_document reads; pass as the projection when streaming from an ExtractionStore
+RECORD_FIELDS = ("page", "type", "title", "context", "extracted_text", "doc_id", "region_id")
 
-    vectorstore = FAISS.from_documents(documents, embedding_model)
-    print(f"✓ Created FAISS index with {len(documents)} documents")
+
+def record_to_document(item: Dict[str, Any]) -> Document:
+    """Turn one extracted chart/table record into the Document that gets embedded."""
+    page_content = f"{item.get('type', '')} {item.get('title', '')} {item.get('context', '')}"
+    if not page_content.strip():
+        page_content = str(item.get('extracted_text', 'No text available'))
+
+    metadata = {
+        "page": item.get("page"),
+        "type": item.get("type"),
+        "chart_title": item.get("title", ""),
+    }
+    for key in ("doc_id", "region_id"):
+        if item.get(key) is not None:
+            metadata[key] = item[key]
+
+    return Document(page_content=page_content, metadata=metadata)
+
+
+@profiled
+def build_vectorstore(extracted_data: Iterable[Dict[str, Any]], embedding_model=None, batch_size: int = 1024):
+    """
+    Build FAISS vectorstore from extracted chart/table data.
+
+    extracted_data may be a list or any iterable, e.g.
+    ExtractionStore.iter_records(fields=RECORD_FIELDS); records are embedded
+    batch_size at a time so a streamed store is never fully held in memory.
+    """
+    if embedding_model is None:
+        embedding_model = default_embeddings()
+
+    records = iter(extracted_data)
+    vectorstore = None
+    count = 0
+    while True:
+        documents: List[Document] = [record_to_document(item) for item in islice(records, batch_size)]
+        if not documents:
+            break
+        with telemetry.span("embed_batch", size=len(documents)):
+            vectors = embedding_model.embed_documents([doc.page_content for doc in documents])
+        text_embeddings = [(doc.page_content, vector) for doc, vector in zip(documents, vectors)]
+        metadatas = [doc.metadata for doc in documents]
+        with telemetry.span("faiss_add", size=len(documents)):
+            if vectorstore is None:
+                vectorstore = FAISS.from_embeddings(text_embeddings, embedding_model, metadatas=metadatas)
+            else:
+                vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+        telemetry.count("documents_embedded", len(documents))
+        count += len(documents)
+
+    if vectorstore is None:
+        vectorstore = FAISS.from_documents([], embedding_model)
+    logger.info("Created FAISS index with %d documents", count)
     return vectorstore
 
 
@@ -44,31 +137,31 @@ def get_retriever_from_data(extracted_data: List[Dict[str, Any]], embedding_mode
     """Build vectorstore and return a LangChain retriever."""
     vectorstore = build_vectorstore(extracted_data, embedding_model=embedding_model)
     retriever = vectorstore.as_retriever(search_kwargs={"k": k})
-    print(f"✓ Created retriever with k={k}")
+    logger.info("Created retriever with k=%d", k)
     return retriever
 
 
 def save_vectorstore(vectorstore, index_path: str = FAISS_INDEX_PATH) -> None:
     """Save FAISS vectorstore to disk."""
     vectorstore.save_local(index_path)
-    print(f"✓ Saved FAISS index to {index_path}")
+    logger.info("Saved FAISS index to %s", index_path)
 
 
 def load_vectorstore(index_path: str = FAISS_INDEX_PATH, embedding_model=None, as_retriever: bool = True, k: int = 3):
     """Load FAISS vectorstore from disk and optionally return retriever."""
     if not os.path.exists(index_path):
-        print(f"✗ Index path does not exist: {index_path}")
+        logger.error("Index path does not exist: %s", index_path)
         return None
 
     if embedding_model is None:
-        embedding_model = initialize_embeddings()
+        embedding_model = default_embeddings()
 
     vectorstore = FAISS.load_local(index_path, embedding_model, allow_dangerous_deserialization=True)
-    print(f"✓ Loaded FAISS index from {index_path}")
+    logger.info("Loaded FAISS index from %s", index_path)
 
     if as_retriever:
         retriever = vectorstore.as_retriever(search_kwargs={"k": k})
-        print(f"✓ Created retriever with k={k}")
+        logger.info("Created retriever with k=%d", k)
         return retriever
     
     return vectorstore
\ No newline at end of file
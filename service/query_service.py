@@ -0,0 +1,226 @@
+"""
+query_service.py
+Async end-to-end query API: embed query -> retrieve -> fuse -> LLM.
+
+One QueryService serves many concurrent users from a single process.
+Retrieval runs in worker threads, LLM calls share a pooled HTTP client to
+the OpenAI-compatible endpoint, answers stream back token by token, and
+every request honours timeouts and cancellation.
+
+Usage:
+    python -m service.query_service "What was Q3 2021 EBITDA?" --index-path faiss_index.bin
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from fusion.fusion import format_for_llm
+from utils.config import (
+    FAISS_INDEX_PATH,
+    LLM_BASE_URL,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_CONNECTIONS,
+    LLM_MODEL,
+    LLM_TIMEOUT_SECONDS,
+    OPENAI_API_KEY,
+    PROMPT_MAX_TOKENS,
+)
+from utils.telemetry import configure_logging, telemetry
+
+
+DEFAULT_LLM_BASE_URL = "https://api.openai.com/v1"
+
+
+class QueryService:
+    """
+    Async question answering over a retriever and an OpenAI-compatible LLM.
+
+    Args:
+        retriever: LangChain retriever (anything with invoke) or a callable query -> documents
+        model: Chat model name
+        base_url: API base URL (e.g. a local stub server); default from config
+        api_key: API key; default from config
+        max_concurrency: LLM calls in flight at once; further requests wait
+        max_connections: HTTP connection pool size to the LLM endpoint
+        timeout: Seconds allowed for a whole request (retrieval + full answer)
+        prompt_max_tokens: Token budget for the prompt (None = no budget)
+        query_cache: Optional QueryCache used instead of the retriever; prompts
+            are still built with this service's token budget and chart tables
+        chart_table: Optional ChartDataTable; its matching charts are added to the prompt as compact tables
+
+    Example:
+        >>> service = QueryService(load_vectorstore(k=3))
+        >>> async for token in service.stream_answer("What was Q3 2021 EBITDA?"):
+        ...     print(token, end="")
+    """
+
+    def __init__(
+        self,
+        retriever,
+        model: str = LLM_MODEL,
+        base_url: Optional[str] = LLM_BASE_URL,
+        api_key: Optional[str] = OPENAI_API_KEY,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        prompt_max_tokens: Optional[int] = PROMPT_MAX_TOKENS,
+        query_cache=None,
+        chart_table=None,
+    ):
+        self.retrieve_fn = retriever.invoke if hasattr(retriever, "invoke") else retriever
+        self.model = model
+        self.timeout = timeout
+        self.prompt_max_tokens = prompt_max_tokens
+        self.query_cache = query_cache
+        self.chart_table = chart_table
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Plain httpx against the chat completions API: the openai SDK alone
+        # costs ~0.7s to import, which dominated query-process startup
+        self.client = httpx.AsyncClient(
+            base_url=(base_url or DEFAULT_LLM_BASE_URL).rstrip("/") + "/",
+            headers={"Authorization": f"Bearer {api_key or ''}"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+        )
+
+    def _build_prompt(self, documents: List[Any], query: str) -> str:
+        chart_tables = self.chart_table.as_evidence(query) if self.chart_table is not None else None
+        return format_for_llm(documents, query, max_tokens=self.prompt_max_tokens, chart_tables=chart_tables)
+
+    def _retrieve_sync(self, query: str) -> Tuple[List[Any], str]:
+        with telemetry.span("retrieve"):
+            if self.query_cache is not None:
+                return self.query_cache.query(query, prompt_builder=self._build_prompt)
+            documents = self.retrieve_fn(query)
+            return documents, self._build_prompt(documents, query)
+
+    async def retrieve(self, query: str) -> Tuple[List[Any], str]:
+        """Embed, search and fuse in a worker thread; returns (documents, prompt)."""
+        return await asyncio.to_thread(self._retrieve_sync, query)
+
+    async def _stream_tokens(self, prompt: str) -> AsyncIterator[str]:
+        payload = {"model": self.model, "messages": [{"role": "user", "content": prompt}], "stream": True}
+        async with self._semaphore:
+            # Leaving the block closes the response, releasing the connection
+            # when the caller stops early or is cancelled
+            async with self.client.stream("POST", "chat/completions", json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or []
+                    content = choices[0].get("delta", {}).get("content") if choices else None
+                    if content:
+                        yield content
+
+    async def stream_answer(
+        self,
+        query: str,
+        timings: Optional[Dict[str, float]] = None,
+        sources: Optional[List[Dict[str, Any]]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream answer tokens for a query.
+
+        Args:
+            query: User question
+            timings: Optional dict filled with retrieve_ms, first_token_ms and total_ms
+            sources: Optional list filled with the metadata of the retrieved documents
+
+        Raises:
+            asyncio.TimeoutError: If the request exceeds the service timeout
+        """
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        timings = timings if timings is not None else {}
+
+        documents, prompt = await asyncio.wait_for(self.retrieve(query), timeout=self.timeout)
+        if sources is not None:
+            sources.extend(getattr(doc, "metadata", {}) for doc in documents)
+        timings["retrieve_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+        tokens = self._stream_tokens(prompt)
+        try:
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    token = await asyncio.wait_for(tokens.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+                if "first_token_ms" not in timings:
+                    timings["first_token_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                    telemetry.observe("query_first_token_seconds", timings["first_token_ms"] / 1000)
+                yield token
+        finally:
+            await tokens.aclose()
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            telemetry.count("queries")
+            telemetry.observe("query_seconds", timings["total_ms"] / 1000)
+
+    async def answer(self, query: str) -> Dict[str, Any]:
+        """
+        Answer a query in full.
+
+        Returns:
+            Dictionary with answer, sources (metadata of retrieved documents) and timings
+        """
+        timings: Dict[str, float] = {}
+        sources: List[Dict[str, Any]] = []
+        parts = [token async for token in self.stream_answer(query, timings=timings, sources=sources)]
+        return {
+            "answer": "".join(parts),
+            "sources": sources,
+            "timings": timings,
+        }
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+def main() -> None:
+    from retrieval.retrieval import load_vectorstore
+
+    parser = argparse.ArgumentParser(description="Ask a question against a saved FAISS index.")
+    parser.add_argument("question")
+    parser.add_argument("--index-path", default=FAISS_INDEX_PATH)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--base-url", default=LLM_BASE_URL, help="OpenAI-compatible endpoint (e.g. a stub server)")
+    parser.add_argument("--metrics", default=None, help="Write Prometheus metrics to this file")
+    parser.add_argument("--trace", default=None, help="Write a Chrome trace-event JSON file")
+    args = parser.parse_args()
+    configure_logging()
+    if args.metrics or args.trace:
+        telemetry.enable()
+
+    retriever = load_vectorstore(args.index_path, k=args.k)
+    if retriever is None:
+        return
+
+    async def run() -> None:
+        service = QueryService(retriever, base_url=args.base_url)
+        try:
+            async for token in service.stream_answer(args.question):
+                print(token, end="", flush=True)
+            print()
+        finally:
+            await service.aclose()
+
+    asyncio.run(run())
+    if args.metrics:
+        telemetry.write_metrics(args.metrics)
+    if args.trace:
+        telemetry.write_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+stub_llm_server.py
+Local stand-in for an OpenAI-compatible chat completions endpoint.
+
+Answers every request by echoing a fixed reply word by word, streamed as
+server-sent events when stream=true, with a configurable per-token delay.
+Used to exercise QueryService offline (concurrency, streaming, timeouts,
+cancellation) without a real LLM.
+
+Usage:
+    python -m service.stub_llm_server --port 8001 --token-delay 0.01
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+
+STUB_REPLY = "Based on the retrieved evidence, the answer is shown on the cited page."
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    token_delay = 0.0
+    reply = STUB_REPLY
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = body.get("model", "stub")
+        words = self.reply.split(" ")
+
+        if not body.get("stream"):
+            time.sleep(self.token_delay * len(words))
+            payload = json.dumps({
+                "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": self.reply}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            for i, word in enumerate(words):
+                time.sleep(self.token_delay)
+                chunk = {
+                    "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": None,
+                                 "delta": {"content": word if i == 0 else " " + word}}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled the stream
+            pass
+        self.close_connection = True
+
+
+class _StubServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under concurrent load tests
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, token_delay: float = 0.0,
+                      reply: str = STUB_REPLY) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Start the stub server on a background thread.
+
+    Args:
+        host: Bind address
+        port: Port (0 = any free port)
+        token_delay: Seconds between streamed tokens
+        reply: Text returned for every request
+
+    Returns:
+        Tuple of (server, base_url); call server.shutdown() when done
+
+    Example:
+        >>> server, base_url = start_stub_server(token_delay=0.01)
+        >>> service = QueryService(retriever, base_url=base_url, api_key="stub")
+    """
+    handler = type("StubHandler", (_StubHandler,), {"token_delay": token_delay, "reply": reply})
+    server = _StubServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a stub OpenAI-compatible chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed tokens")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.host, args.port, args.token_delay)
+    print(f"Stub LLM server listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
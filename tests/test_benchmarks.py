@@ -0,0 +1,66 @@
+"""Baseline comparison and output silencing in benchmarks.run_benchmarks."""
+
+import logging
+
+from benchmarks.run_benchmarks import _quiet, compare_results
+
+
+def _results(**stages):
+    return {"config": {"pages": 20}, "stages": stages, "memory_mb": {"peak": {"self": 100.0}}}
+
+
+def test_throughput_regresses_when_it_drops():
+    comparison = compare_results(
+        _results(render={"pages_per_sec": 80.0}), _results(render={"pages_per_sec": 100.0}), tolerance=0.10
+    )
+    assert comparison["regressions"] == ["stages.render.pages_per_sec"]
+    assert comparison["changes"]["stages.render.pages_per_sec"]["change"] == -0.2
+
+    faster = compare_results(_results(render={"pages_per_sec": 150.0}), _results(render={"pages_per_sec": 100.0}))
+    assert faster["regressions"] == []
+
+
+def test_latency_and_memory_regress_when_they_grow():
+    current = _results(query={"p95_ms": 30.0, "index_bytes": 900})
+    current["memory_mb"]["peak"]["self"] = 130.0
+    comparison = compare_results(current, _results(query={"p95_ms": 20.0, "index_bytes": 1000}), tolerance=0.10)
+
+    assert comparison["regressions"] == ["memory_mb.peak.self", "stages.query.p95_ms"]
+    assert not comparison["changes"]["stages.query.index_bytes"]["regressed"]
+
+
+def test_sub_noise_latency_changes_never_regress():
+    comparison = compare_results(
+        _results(query={"p50_ms": 0.04}), _results(query={"p50_ms": 0.01}), tolerance=0.10, min_delta_ms=0.05
+    )
+    assert comparison["changes"]["stages.query.p50_ms"]["change"] == 3.0
+    assert comparison["regressions"] == []
+
+    over_floor = compare_results(_results(query={"p50_ms": 0.2}), _results(query={"p50_ms": 0.1}), min_delta_ms=0.05)
+    assert over_floor["regressions"] == ["stages.query.p50_ms"]
+
+
+def test_zero_baseline_and_unrelated_metrics_are_skipped():
+    comparison = compare_results(
+        _results(index={"seconds": 9.0, "records_per_sec": 10.0, "p50_ms": 5.0}),
+        _results(index={"seconds": 1.0, "records_per_sec": 0, "p50_ms": 5.0}),
+    )
+    assert set(comparison["changes"]) == {"memory_mb.peak.self", "stages.index.p50_ms"}
+    assert comparison["regressions"] == []
+
+
+def test_config_mismatch_is_flagged():
+    current = _results()
+    current["config"] = {"pages": 50}
+    assert compare_results(current, _results())["config_match"] is False
+
+
+def test_quiet_silences_pipeline_info_logs(caplog):
+    logger = logging.getLogger("Extraction.data_extraction")
+    with caplog.at_level(logging.INFO):
+        with _quiet(True):
+            logger.info("page 1 done")
+            logger.warning("page 2 failed")
+        logger.info("after")
+
+    assert [record.getMessage() for record in caplog.records] == ["page 2 failed", "after"]
@@ -0,0 +1,46 @@
+"""Value parsing and unit normalization in retrieval.chart_data."""
+
+import pytest
+
+from retrieval.chart_data import ChartDataTable, parse_number
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("1,200", (1200.0, "")),
+    ("$1.2M", (1.2e6, "$")),
+    ("1.5 million", (1.5e6, "")),
+    ("€3bn", (3e9, "€")),
+    ("USD 2.5 billion", (2.5e9, "")),
+    ("(3.5)", (-3.5, "")),
+    ("45%", (45.0, "%")),
+    (7, (7.0, "")),
+])
+def test_parse_number(raw, expected):
+    assert parse_number(raw) == expected
+
+
+@pytest.mark.parametrize("raw", ["Q3 2021", "FY2022 target", "Segment 4", "n/a", None, True, float("nan")])
+def test_numbers_inside_labels_are_not_values(raw):
+    assert parse_number(raw) == (None, "")
+
+
+def test_values_are_normalized_to_the_title_unit():
+    table = ChartDataTable.from_records([{
+        "title": "Revenue ($M)", "labels": ["2019", "2020", "2021"], "values": ["1,200", "$1.5M", "900"],
+    }])
+    assert table.points["value"].tolist() == [1200.0, 1.5, 900.0]
+    assert table.max()["label"] == "2019"
+    assert table.charts["unit"].tolist() == ["$M"]
+
+
+def test_without_a_title_unit_the_common_scale_is_used():
+    table = ChartDataTable.from_records([{"title": "Sales", "labels": ["a", "b", "c"], "values": ["1.2M", "900K", "2 million"]}])
+    assert table.points["value"].tolist() == pytest.approx([1.2, 0.9, 2.0])
+    assert table.charts["unit"].tolist() == ["M"]
+
+
+def test_trend_returns_plain_floats():
+    table = ChartDataTable.from_records([{"title": "EBITDA", "labels": ["2022", "2020", "2021"], "values": [30, 10, 20]}])
+    trend = table.trend(chart_id=0)
+    assert trend["direction"] == "increasing"
+    assert type(trend["pct_change"]) is float and trend["pct_change"] == 200.0
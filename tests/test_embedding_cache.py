@@ -0,0 +1,125 @@
+"""Concurrency tests for retrieval.embedding_cache."""
+
+import multiprocessing
+import os
+import threading
+import time
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from retrieval.embedding_cache import CachedEmbeddings
+
+
+class SlowEmbeddings(Embeddings):
+    """Vector is a pure function of the text; the delay widens race windows."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(0.005)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    @staticmethod
+    def _vector(text: str) -> List[float]:
+        return [float(len(text)), float(sum(map(ord, text)) % 9973), float(ord(text[0]))]
+
+
+def test_concurrent_misses_keep_vectors_consistent(tmp_path):
+    cache = CachedEmbeddings(SlowEmbeddings(), "slow", cache_dir=str(tmp_path), max_entries=64, batch_size=4)
+    texts = ["shared"] + [f"text number {i}" for i in range(40)]
+    errors = []
+
+    def worker(offset: int) -> None:
+        try:
+            for round_ in range(5):
+                batch = ["shared"] + texts[1 + (offset + round_) % 20:][:8]
+                for text, vector in zip(batch, cache.embed_documents(batch)):
+                    assert vector == SlowEmbeddings._vector(text), text
+        except AssertionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    # Every stored key points to its own row
+    rows = cache._conn.execute("SELECT slot FROM keys").fetchall()
+    assert len(rows) == len({slot for (slot,) in rows})
+    for text in texts:
+        assert cache.embed_query(text) == SlowEmbeddings._vector(text)
+
+
+def test_eviction_under_concurrency(tmp_path):
+    cache = CachedEmbeddings(SlowEmbeddings(), "slow", cache_dir=str(tmp_path), max_entries=8, batch_size=2)
+    errors = []
+
+    def worker(offset: int) -> None:
+        for i in range(10):
+            text = f"item {(offset + i) % 13}"
+            if cache.embed_query(text) != SlowEmbeddings._vector(text):
+                errors.append(text)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    rows = cache._conn.execute("SELECT slot FROM keys").fetchall()
+    assert len(rows) <= 8
+    assert len(rows) == len({slot for (slot,) in rows})
+    assert all(0 <= slot < 8 for (slot,) in rows)
+
+
+def _process_worker(cache_dir: str, worker: int, results) -> None:
+    cache = CachedEmbeddings(SlowEmbeddings(), "slow", cache_dir=cache_dir, max_entries=5000, batch_size=16)
+    wrong = 0
+    for round_ in range(6):
+        # Each round adds new rows (growing the shared file) and re-reads rows other processes wrote
+        texts = [f"worker {worker} round {round_} text {i}" for i in range(150)]
+        texts += [f"worker {(worker + 1) % 4} round {max(0, round_ - 1)} text {i}" for i in range(0, 150, 7)]
+        for text, vector in zip(texts, cache.embed_documents(texts)):
+            wrong += vector != SlowEmbeddings._vector(text)
+    results.put(wrong)
+
+
+def test_processes_sharing_a_cache_directory(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=_process_worker, args=(str(tmp_path), i, results)) for i in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=120)
+        assert process.exitcode == 0
+
+    assert sum(results.get(timeout=5) for _ in processes) == 0
+    cache = CachedEmbeddings(SlowEmbeddings(), "slow", cache_dir=str(tmp_path), max_entries=5000)
+    rows = cache._conn.execute("SELECT slot FROM keys").fetchall()
+    assert len(rows) == 4 * 6 * 150
+    assert len(rows) == len({slot for (slot,) in rows})
+    # The file was only ever grown, and covers every slot in use
+    assert os.path.getsize(cache._vectors_path) >= (max(slot for (slot,) in rows) + 1) * cache.dim * 4
+    for worker in range(4):
+        text = f"worker {worker} round 5 text 3"
+        assert cache.embed_query(text) == SlowEmbeddings._vector(text)
+
+
+def test_read_only_cache_does_not_store(tmp_path):
+    cache = CachedEmbeddings(SlowEmbeddings(), "slow", cache_dir=str(tmp_path), read_only=True)
+    assert cache.embed_query("new text") == SlowEmbeddings._vector("new text")
+    assert cache.stats()["entries"] == 0
+
+
+def test_size_bound_in_megabytes(tmp_path):
+    cache = CachedEmbeddings(SlowEmbeddings(), "slow", cache_dir=str(tmp_path), max_mb=64 * 3 * 4 / 2**20)
+    cache.embed_documents([f"text {i}" for i in range(100)])
+    assert cache.max_entries == 64
+    assert cache.stats()["entries"] == 64
+    assert os.path.getsize(cache._vectors_path) <= 64 * 3 * 4
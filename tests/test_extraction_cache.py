@@ -0,0 +1,66 @@
+"""Keys, eviction and multi-process writes of Extraction.extraction_cache."""
+
+import multiprocessing
+
+from PIL import Image
+
+from Extraction.extraction_cache import ExtractionCache
+
+
+def _page(color: int) -> Image.Image:
+    return Image.new("RGB", (32, 32), (color, color, color))
+
+
+def test_key_depends_on_content_models_and_render_params(tmp_path):
+    cache = ExtractionCache(str(tmp_path), model_ids={"ocr": "a"})
+    other_models = ExtractionCache(str(tmp_path), model_ids={"ocr": "b"})
+    page = _page(10)
+
+    assert cache.key_for(page) == cache.key_for(_page(10))
+    assert cache.key_for(page) != cache.key_for(_page(11))
+    assert cache.key_for(page) != other_models.key_for(page)
+    assert cache.key_for(page, {"mode": "page", "zoom": 2}) != cache.key_for(page, {"mode": "page", "zoom": "policy"})
+    assert cache.key_for(page, {"mode": "page", "zoom": 2}) != cache.key_for(page, {"mode": "region", "zoom": 2})
+
+
+def test_get_put_and_stats(tmp_path):
+    cache = ExtractionCache(str(tmp_path))
+    key = cache.key_for(_page(1))
+    assert cache.get(key) is None
+    cache.put(key, {"type": "bar_chart", "data": {"2021": 1.5}})
+    assert cache.get(key) == {"type": "bar_chart", "data": {"2021": 1.5}}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_least_recently_used_entries_are_evicted_past_max_bytes(tmp_path):
+    cache = ExtractionCache(str(tmp_path), max_bytes=300)
+    keys = [cache.key_for(_page(i)) for i in range(3)]
+    cache.put(keys[0], {"text": "a" * 100})
+    cache.put(keys[1], {"text": "b" * 100})
+    cache.get(keys[0])  # keys[1] is now the least recently used
+    cache.put(keys[2], {"text": "c" * 100})
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    assert cache.stats()["bytes"] <= 300
+
+
+def _writer(cache_dir: str, worker: int) -> None:
+    cache = ExtractionCache(cache_dir)
+    for i in range(200):
+        key = cache.key_for(_page(i % 256), {"worker": worker})
+        cache.put(key, {"worker": worker, "page": i})
+        cache.get(key)
+    cache.close()
+
+
+def test_worker_processes_share_one_database(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_writer, args=(str(tmp_path), i)) for i in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=120)
+        assert process.exitcode == 0
+    assert ExtractionCache(str(tmp_path)).stats()["entries"] == 4 * 200
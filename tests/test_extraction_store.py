@@ -0,0 +1,55 @@
+"""Round trips, replacement and crash recovery of Extraction.extraction_store."""
+
+import os
+
+from Extraction.extraction_store import ExtractionStore
+
+
+def _record(page, **extra):
+    return dict({"page": page, "type": "bar_chart", "title": f"Chart {page}", "data": {"2021": page * 1.5}}, **extra)
+
+
+def test_round_trip_with_projection_and_sparse_fields(tmp_path):
+    with ExtractionStore(str(tmp_path), chunk_rows=4) as store:
+        for page in range(1, 11):
+            extra = {"region_id": f"fig-{page}"} if page % 3 == 0 else {}
+            store.append(_record(page, **extra), doc_id="report")
+        assert store.get("report", 3, "fig-3")["data"] == {"2021": 4.5}
+
+    store = ExtractionStore(str(tmp_path))
+    assert len(store) == 10
+    assert store.get("report", 2) == dict(_record(2), doc_id="report")
+    assert store.get("report", 3) is None
+    assert store.get("report", 6, "fig-6", fields=["title", "region_id"]) == {"title": "Chart 6", "region_id": "fig-6"}
+    assert [r["page"] for r in store.iter_records(fields=["page"])] == list(range(1, 11))
+    assert store.stats()["chunks"] == 3
+    store.close()
+
+
+def test_later_record_replaces_earlier_one(tmp_path):
+    with ExtractionStore(str(tmp_path), chunk_rows=2) as store:
+        store.append(_record(1), doc_id="a")
+        store.append(_record(2), doc_id="a")
+        store.append(_record(1, title="Revised"), doc_id="a")
+        store.append(_record(1), doc_id="b")
+
+        assert store.get("a", 1, fields=["title"]) == {"title": "Revised"}
+        assert [r["title"] for r in store.iter_records(fields=["title"], doc_id="a")] == ["Chart 2", "Revised"]
+        assert store.keys() == [("a", 1, ""), ("a", 2, ""), ("b", 1, "")]
+        assert store.stats()["superseded"] == 1
+
+
+def test_partial_trailing_chunk_is_dropped_on_open(tmp_path):
+    with ExtractionStore(str(tmp_path), chunk_rows=2) as store:
+        for page in range(1, 5):
+            store.append(_record(page))
+    data_path = os.path.join(str(tmp_path), "records.bin")
+    size = os.path.getsize(data_path)
+    with open(data_path, "ab") as f:
+        f.write(b"\x00" * 37)  # An append interrupted before its chunk was indexed
+
+    with ExtractionStore(str(tmp_path), chunk_rows=2) as store:
+        assert os.path.getsize(data_path) == size
+        store.append(_record(5))
+        store.flush()
+        assert [r["page"] for r in store.iter_records(fields=["page"])] == [1, 2, 3, 4, 5]
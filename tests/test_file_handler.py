@@ -0,0 +1,67 @@
+"""Round-trip tests for the JSONL helpers in utils.file_handler."""
+
+import json
+import math
+
+import pytest
+
+from utils import file_handler
+from utils.file_handler import iter_jsonl, load_jsonl, save_jsonl, write_jsonl
+
+
+RECORDS = [
+    {"page": 1, "data": {2021: 4.5, 2022: 5.1}, "labels": ["2021", "2022"]},
+    {"page": 2, "data": {"Q3": float("nan")}, "values": [float("inf"), None]},
+    {"page": 3, "text": "null and NaN as plain text", "context": None},
+]
+
+
+def _same(left, right):
+    return json.dumps(left, sort_keys=True) == json.dumps(right, sort_keys=True)
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+@pytest.mark.parametrize("suffix", [".jsonl", ".jsonl.gz"])
+def test_jsonl_round_trip_matches_json(tmp_path, monkeypatch, use_orjson, suffix):
+    if use_orjson and file_handler.orjson is None:
+        pytest.skip("orjson not installed")
+    if not use_orjson:
+        monkeypatch.setattr(file_handler, "orjson", None)
+    path = str(tmp_path / f"records{suffix}")
+
+    save_jsonl(RECORDS, path)
+    loaded = load_jsonl(path)
+
+    # Same semantics as json.dumps / json.loads: int keys become strings, NaN survives
+    expected = [json.loads(json.dumps(record)) for record in RECORDS]
+    assert _same(loaded, expected)
+    assert math.isnan(loaded[1]["data"]["Q3"])
+    assert loaded[0]["data"] == {"2021": 4.5, "2022": 5.1}
+
+
+def test_both_encoders_write_the_same_bytes(monkeypatch):
+    if file_handler.orjson is None:
+        pytest.skip("orjson not installed")
+    records = RECORDS + [{"a": 1, "s": "\u00e9", "nested": {"k": [1.5, True, None]}}]
+    with_orjson = [file_handler._dumps(record) for record in records]
+    monkeypatch.setattr(file_handler, "orjson", None)
+    assert [file_handler._dumps(record) for record in records] == with_orjson
+    assert with_orjson[-1] == '{"a":1,"s":"\u00e9","nested":{"k":[1.5,true,null]}}'.encode()
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_both_encoders_reject_the_same_inputs(monkeypatch, use_orjson):
+    np = pytest.importorskip("numpy")
+    if use_orjson and file_handler.orjson is None:
+        pytest.skip("orjson not installed")
+    if not use_orjson:
+        monkeypatch.setattr(file_handler, "orjson", None)
+    with pytest.raises(TypeError):
+        file_handler._dumps({"values": np.arange(3)})
+
+
+def test_streaming_writer_and_reader(tmp_path):
+    path = str(tmp_path / "stream.jsonl")
+    records = [{"id": i, "values": {i: i * 0.5}} for i in range(2500)]
+    write_jsonl(iter(records), path, buffer_records=100)
+    assert [record["id"] for record in iter_jsonl(path)] == list(range(2500))
@@ -0,0 +1,68 @@
+"""Token-budgeted evidence packing in fusion.fusion."""
+
+import pytest
+from langchain_core.documents import Document
+
+from fusion.fusion import count_tokens, format_for_llm, pack_evidence
+
+REVENUE = Document(
+    page_content="Revenue grew 12% in 2021. The office moved to a new building. Revenue in 2020 was 4.1bn.",
+    metadata={"page": 3, "type": "bar_chart"},
+)
+TABLE = Document(
+    page_content="Year | Revenue | Margin\n2019 | 3.8 | 10%\n2020 | 4.1 | 11%\n2021 | 4.6 | 13%",
+    metadata={"page": 7, "type": "table"},
+)
+FILLER = Document(
+    page_content=" ".join(f"Unrelated sentence number {i} about staffing." for i in range(40)),
+    metadata={"page": 9, "type": "text"},
+)
+
+
+@pytest.mark.parametrize("max_tokens", [220, 260, 320, 2000])
+def test_prompt_never_exceeds_the_budget(max_tokens):
+    prompt, _ = pack_evidence([REVENUE, TABLE, FILLER], "revenue in 2021", max_tokens)
+    assert count_tokens(prompt) <= max_tokens
+
+
+def test_table_rows_match_through_their_header():
+    prompt, report = pack_evidence([REVENUE, TABLE], "revenue", 10_000)
+
+    assert TABLE.page_content in prompt
+    assert report[1]["units_kept"] == report[1]["units_total"] == 4
+    # Prose that shares nothing with the query is left out even with room to spare
+    assert "office" not in prompt
+
+
+def test_near_duplicates_are_dropped():
+    copy = Document(page_content=REVENUE.page_content + " ", metadata={"page": 4, "type": "bar_chart"})
+    prompt, report = pack_evidence([REVENUE, copy, TABLE], "revenue", 2000)
+
+    assert [entry.get("dropped") for entry in report] == [None, "duplicate", None]
+    assert "Page: 4" not in prompt
+    assert "[Evidence 2]\nType: table" in prompt
+
+
+def test_tight_budget_keeps_query_relevant_units_in_order():
+    baseline = count_tokens(format_for_llm([], "revenue 2021"))
+    prompt, report = pack_evidence([REVENUE], "revenue 2021", baseline + 35)
+
+    assert "Revenue grew 12% in 2021.\nRevenue in 2020 was 4.1bn." in prompt
+    assert "office" not in prompt
+    assert report[0]["units_kept"] == 2 and report[0]["units_total"] == 3
+
+
+def test_kept_table_rows_bring_their_header():
+    baseline = count_tokens(format_for_llm([], "margin 2021"))
+    prompt, _ = pack_evidence([TABLE], "margin 2021", baseline + 30)
+
+    assert "Year | Revenue | Margin\n2021 | 4.6 | 13%" in prompt
+    assert "2019" not in prompt
+
+
+def test_evidence_over_budget_is_reported():
+    baseline = count_tokens(format_for_llm([], "revenue"))
+    _, report = pack_evidence([REVENUE, FILLER], "revenue", baseline + 40)
+
+    assert report[0].get("dropped") is None
+    assert report[1]["dropped"] == "budget"
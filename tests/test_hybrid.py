@@ -0,0 +1,82 @@
+"""BM25, rank fusion and per-query timings of retrieval.hybrid."""
+
+import threading
+import time
+import zlib
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from retrieval.hybrid import BM25Index, build_hybrid_retriever, reciprocal_rank_fusion
+
+TEXTS = [
+    "bar chart Q3 2021 EBITDA by region",
+    "pie chart market share 2020",
+    "line chart revenue growth 2019 2021",
+    "table drug trial outcomes placebo",
+]
+
+
+class _HashEmbeddings(Embeddings):
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def embed_documents(self, texts):
+        return [np.random.default_rng(zlib.crc32(t.encode())).standard_normal(16).tolist() for t in texts]
+
+    def embed_query(self, text):
+        time.sleep(self.delay)
+        return self.embed_documents([text])[0]
+
+
+def _retriever(delay: float = 0.0, **kwargs):
+    embeddings = _HashEmbeddings()
+    vectorstore = FAISS.from_embeddings(list(zip(TEXTS, embeddings.embed_documents(TEXTS))), embeddings)
+    embeddings.delay = delay
+    return build_hybrid_retriever(vectorstore, k=2, **kwargs)
+
+
+def test_bm25_keeps_numbers_as_terms():
+    bm25 = BM25Index(TEXTS)
+    assert bm25.search("2021 ebitda", k=1)[0][0] == 0
+    assert bm25.search("placebo", k=4) == bm25.search("placebo", k=1)
+    assert bm25.search("nothing matches", k=3) == []
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [2, 3, 4]], rrf_k=60)
+    assert fused[0][0] == 2
+    assert {position for position, _ in fused} == {1, 2, 3, 4}
+
+
+def test_dense_search_over_budget_falls_back_to_lexical():
+    retriever = _retriever(delay=0.5, latency_budget_ms=20)
+    start = time.perf_counter()
+    documents, timings = retriever.invoke_with_timings("Q3 2021 EBITDA")
+
+    assert time.perf_counter() - start < 0.4
+    assert timings["dense_timed_out"] is True
+    assert documents[0].page_content == TEXTS[0]
+
+
+def test_timings_are_per_thread():
+    retriever = _retriever(latency_budget_ms=None)
+    results = {}
+    barrier = threading.Barrier(8)
+
+    def query(n):
+        barrier.wait()
+        _, timings = retriever.invoke_with_timings(f"chart {n}")
+        results[n] = (timings, retriever.last_timings)
+
+    threads = [threading.Thread(target=query, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(returned is not None and returned == seen for returned, seen in results.values())
+    assert len({id(timings) for timings, _ in results.values()}) == 8
+    # Nothing leaks into a thread that ran no query
+    assert retriever.last_timings == {}
@@ -0,0 +1,101 @@
+"""Document-level add, delete, compaction and persistence of retrieval.index_manager."""
+
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from retrieval.index_manager import IndexManager
+from retrieval.retrieval import record_to_document
+
+
+class _HashEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [np.random.default_rng(zlib.crc32(t.encode())).standard_normal(16).tolist() for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _records(doc_id, pages=3, chart_type="bar_chart"):
+    return [{"page": page, "type": chart_type, "title": f"{doc_id} chart {page}"} for page in range(1, pages + 1)]
+
+
+def _query(doc_id, page, chart_type="bar_chart"):
+    record = {"page": page, "type": chart_type, "title": f"{doc_id} chart {page}", "doc_id": doc_id}
+    return record_to_document(record).page_content
+
+
+def _manager(tmp_path, **kwargs):
+    return IndexManager(str(tmp_path / "index"), embedding_model=_HashEmbeddings(), **kwargs)
+
+
+def test_re_adding_a_document_replaces_its_vectors(tmp_path):
+    manager = _manager(tmp_path)
+    manager.add_document("a", _records("a"))
+    manager.add_document("b", _records("b"))
+    manager.add_document("a", _records("a", pages=2))
+
+    assert manager.vector_count == 5
+    assert manager.documents["a"] == ["a:p1:0", "a:p2:1"]
+    assert manager.search(_query("b", 2), k=1)[0].metadata == {
+        "page": 2, "type": "bar_chart", "chart_title": "b chart 2", "doc_id": "b",
+    }
+
+
+def test_tombstoned_documents_are_hidden_until_compaction(tmp_path):
+    manager = _manager(tmp_path, compact_threshold=0.5)
+    for doc_id in ("a", "b", "c"):
+        manager.add_document(doc_id, _records(doc_id))
+
+    assert manager.delete_document("a") == 3
+    assert manager.vector_count == 9
+    assert manager.tombstoned_count == 3
+    results = manager.search(_query("a", 1), k=9)
+    assert len(results) == 6
+    assert {doc.metadata["doc_id"] for doc in results} == {"b", "c"}
+
+    # The second delete crosses the 50% threshold and compacts both documents away
+    manager.delete_document("b")
+    assert manager.vector_count == 3
+    assert manager.tombstones == {}
+    assert manager.delete_document("missing") == 0
+
+
+def test_immediate_delete_and_explicit_compact(tmp_path):
+    # A threshold above 1 never compacts on its own
+    manager = _manager(tmp_path, compact_threshold=2.0)
+    manager.add_document("a", _records("a"))
+    manager.add_document("b", _records("b"))
+
+    manager.delete_document("a", tombstone=False)
+    assert manager.vector_count == 3
+
+    manager.delete_document("b")
+    assert manager.compact() == 3
+    assert manager.vector_count == 0
+
+
+def test_filtered_search_excludes_tombstones(tmp_path):
+    manager = _manager(tmp_path)
+    manager.add_document("a", _records("a", pages=4, chart_type="table"))
+    manager.add_document("b", _records("b", pages=4))
+    manager.add_document("c", _records("c", pages=4, chart_type="table"))
+    manager.delete_document("c")
+
+    results = manager.filtered_search(_query("c", 2, "table"), k=10, types=["table"], page_range=(2, 3))
+    assert sorted((doc.metadata["doc_id"], doc.metadata["page"]) for doc in results) == [("a", 2), ("a", 3)]
+
+
+def test_save_and_reopen_keeps_id_map_and_tombstones(tmp_path):
+    manager = _manager(tmp_path, compact_threshold=2.0)
+    manager.add_document("a", _records("a"))
+    manager.add_document("b", _records("b"))
+    manager.delete_document("a")
+    manager.save()
+
+    reopened = _manager(tmp_path, compact_threshold=2.0)
+    assert reopened.documents == {"b": manager.documents["b"]}
+    assert reopened.tombstones == {"a": ["a:p1:0", "a:p2:1", "a:p3:2"]}
+    assert reopened.version == manager.version
+    assert {doc.metadata["doc_id"] for doc in reopened.search(_query("a", 1), k=6)} == {"b"}
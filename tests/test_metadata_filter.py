@@ -0,0 +1,88 @@
+"""Metadata selection and ID-selector search in retrieval.metadata_filter."""
+
+import faiss
+import numpy as np
+import pytest
+
+from retrieval.metadata_filter import MetadataIndex, filtered_search_by_vector, make_id_selector
+
+TYPES = ("bar_chart", "line_chart", "table")
+
+
+def _metadatas(count=400, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {"doc_id": f"doc-{rng.integers(5)}", "type": TYPES[rng.integers(3)], "page": int(rng.integers(1, 60))}
+        for _ in range(count)
+    ] + [{"doc_id": "doc-0", "type": "table"}]  # No page: never inside a page range
+
+
+def _expected(metadatas, doc_ids=None, types=None, page_range=None, exclude_doc_ids=None):
+    keep = []
+    for position, md in enumerate(metadatas):
+        if doc_ids is not None and md["doc_id"] not in doc_ids:
+            continue
+        if types is not None and md["type"] not in types:
+            continue
+        if page_range is not None and not (md.get("page") is not None and page_range[0] <= md["page"] <= page_range[1]):
+            continue
+        if exclude_doc_ids and md["doc_id"] in exclude_doc_ids:
+            continue
+        keep.append(position)
+    return keep
+
+
+@pytest.mark.parametrize("filters", [
+    {"doc_ids": ["doc-1", "doc-3"]},
+    {"types": ["table"]},
+    {"page_range": (10, 20)},
+    {"doc_ids": ["doc-2"], "types": ["bar_chart", "table"], "page_range": (5, 50)},
+    {"exclude_doc_ids": ["doc-0"]},
+    {"types": ["line_chart"], "exclude_doc_ids": ["doc-4", "missing"]},
+    {"doc_ids": ["missing"]},
+])
+def test_select_matches_a_brute_force_filter(filters):
+    metadatas = _metadatas()
+    selected = MetadataIndex(metadatas).select(**filters)
+    assert selected.tolist() == _expected(metadatas, **filters)
+
+
+def test_no_filters_returns_none():
+    assert MetadataIndex(_metadatas()).select() is None
+
+
+@pytest.mark.parametrize("fraction", [0.5, 0.01])
+def test_bitmap_and_batch_selectors_agree_with_exact_search(fraction):
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((2000, 16)).astype(np.float32)
+    index = faiss.IndexFlatL2(16)
+    index.add(vectors)
+    ids = np.sort(rng.choice(2000, size=int(2000 * fraction), replace=False))
+    selector, _ = make_id_selector(ids, index.ntotal)
+    assert isinstance(selector, faiss.IDSelectorBitmap if fraction > 0.1 else faiss.IDSelectorBatch)
+
+    query = rng.standard_normal(16).astype(np.float32)
+    hits = filtered_search_by_vector(index, query.tolist(), ids, k=5)
+
+    distances = ((vectors[ids] - query) ** 2).sum(axis=1)
+    assert [position for position, _ in hits] == ids[np.argsort(distances)[:5]].tolist()
+
+
+def test_ivf_search_respects_the_selection():
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((3000, 8)).astype(np.float32)
+    index = faiss.index_factory(8, "IVF16,Flat")
+    index.train(vectors)
+    index.add(vectors)
+    ids = np.arange(0, 3000, 7)
+
+    hits = filtered_search_by_vector(index, vectors[10].tolist(), ids, k=10, nprobe=16)
+    assert len(hits) == 10
+    assert all(position % 7 == 0 for position, _ in hits)
+
+
+def test_empty_selection_returns_nothing():
+    index = faiss.IndexFlatL2(4)
+    index.add(np.eye(4, dtype=np.float32))
+    assert filtered_search_by_vector(index, [1, 0, 0, 0], np.empty(0, dtype=np.int64), k=3) == []
+    assert [p for p, _ in filtered_search_by_vector(index, [1, 0, 0, 0], None, k=1)] == [0]
@@ -0,0 +1,64 @@
+"""Streaming build, sampled training and search of retrieval.mmap_index."""
+
+import os
+import zlib
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from retrieval.mmap_index import MmapIndex, _training_sample, build_mmap_index
+
+
+class _HashEmbeddings(Embeddings):
+    """Deterministic random vector per text."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [np.random.default_rng(zlib.crc32(t.encode())).standard_normal(32).tolist() for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _documents(count):
+    for i in range(count):
+        yield Document(page_content=f"chart {i}", metadata={"page": i % 40, "type": ["bar_chart", "table"][i % 2]})
+
+
+@pytest.mark.parametrize("index_type", ["IVF-Flat", "IVF-PQ"])
+def test_build_from_a_generator_and_search(tmp_path, index_type):
+    embeddings = _HashEmbeddings()
+    meta = build_mmap_index(
+        _documents(1200), str(tmp_path), embedding_model=embeddings, index_type=index_type, pq_m=8, batch_size=100
+    )
+
+    assert meta["count"] == 1200
+    assert embeddings.calls == 12
+    assert sorted(os.listdir(tmp_path)) == ["docs.sqlite", "index.faiss", "meta.json", "vectors.npy"]
+
+    index = MmapIndex(str(tmp_path), embedding_model=embeddings, nprobe=64)
+    doc, _ = index.search("chart 17", k=1)[0]
+    assert doc.page_content == "chart 17"
+    assert all(d.metadata["type"] == "table" for d, _ in index.filtered_search("chart 17", k=5, types=["table"]))
+
+
+def test_empty_stream_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        build_mmap_index(iter(()), str(tmp_path), embedding_model=_HashEmbeddings())
+    assert not os.path.exists(tmp_path / "vectors.f32.tmp")
+
+
+def test_training_uses_a_bounded_sample():
+    vectors = np.random.default_rng(0).standard_normal((100_000, 8)).astype(np.float32)
+
+    flat = _training_sample(vectors, "IVF-Flat", nlist=16, train_per_list=256)
+    assert flat.shape == (16 * 256, 8)
+    # PQ codebooks need a floor of training points regardless of nlist
+    assert len(_training_sample(vectors, "IVF-PQ", nlist=16, train_per_list=256)) == 256 * 39
+    # Small corpora train on everything
+    assert len(_training_sample(vectors[:500], "IVF-Flat", nlist=16, train_per_list=256)) == 500
@@ -0,0 +1,76 @@
+"""Ordering-independent behaviour of pipeline.pipeline.Pipeline."""
+
+import pytest
+
+from pipeline.pipeline import Pipeline, Stage
+
+
+def _double_all(batch):
+    return [2 * x for x in batch]
+
+
+def test_items_flow_through_threaded_and_batched_stages():
+    pipeline = Pipeline(
+        [
+            Stage("inc", lambda x: x + 1, workers=3),
+            Stage("double", _double_all, workers=2, batch_size=4),
+            Stage("drop_multiples_of_three", lambda x: None if x % 3 == 0 else x, workers=2),
+        ],
+        queue_size=2,
+    )
+    outputs = pipeline.run(range(100))
+
+    assert sorted(outputs) == sorted(2 * (x + 1) for x in range(100) if (2 * (x + 1)) % 3)
+    stages = pipeline.metrics()["stages"]
+    assert stages["inc"]["items_in"] == 100
+    assert stages["drop_multiples_of_three"]["items_out"] == len(outputs)
+
+
+def test_failed_and_dropped_items_reach_on_drop():
+    dropped = []
+
+    def fail_on_five(x):
+        if x == 5:
+            raise ValueError("boom")
+        return None if x == 7 else x
+
+    pipeline = Pipeline([Stage("a", fail_on_five, workers=2)], on_drop=dropped.append)
+    outputs = pipeline.run(range(10))
+
+    assert sorted(outputs) == [0, 1, 2, 3, 4, 6, 8, 9]
+    assert sorted(dropped) == [5, 7]
+    assert pipeline.metrics()["stages"]["a"]["errors"] == 1
+
+
+def test_source_error_is_raised_after_stages_drain():
+    seen = []
+
+    def source():
+        yield from range(3)
+        raise OSError("unreadable PDF")
+
+    pipeline = Pipeline([Stage("record", lambda x: seen.append(x) or x)])
+    with pytest.raises(OSError, match="unreadable PDF"):
+        pipeline.run(source())
+
+    assert sorted(seen) == [0, 1, 2]
+    assert pipeline.metrics()["stages"]["source"]["errors"] == 1
+
+
+def test_skipped_items_bypass_the_stage_function():
+    calls = []
+
+    def expensive(item):
+        calls.append(item["n"])
+        return dict(item, done=True)
+
+    pipeline = Pipeline([
+        Stage("ocr", expensive, workers=2, batch_size=1, skip=lambda item: item["cached"]),
+        Stage("sink", lambda item: item, batch_size=1),
+    ])
+    outputs = pipeline.run({"n": n, "cached": n % 2 == 0} for n in range(10))
+
+    assert sorted(calls) == [1, 3, 5, 7, 9]
+    assert sorted(item["n"] for item in outputs) == list(range(10))
+    assert all(item.get("done") for item in outputs if not item["cached"])
+    assert pipeline.metrics()["stages"]["ocr"]["items_in"] == 10
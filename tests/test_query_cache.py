@@ -0,0 +1,105 @@
+"""Exact and semantic hits, expiry and invalidation of retrieval.query_cache."""
+
+from langchain_core.documents import Document
+
+import retrieval.query_cache as query_cache
+from retrieval.query_cache import QueryCache, normalize_query
+
+
+class _Retriever:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, query):
+        self.calls.append(query)
+        return [Document(page_content=f"answer to {query}", metadata={"doc_id": "d", "page": len(self.calls)})]
+
+
+def _prompt(documents, query):
+    return f"{query} | {documents[0].page_content}"
+
+
+class _TopicEmbeddings:
+    """Queries mentioning the same topic word embed to the same direction."""
+
+    topics = ("revenue", "margin", "headcount")
+
+    def embed_query(self, text):
+        return [float(topic in text) for topic in self.topics] + [0.1]
+
+
+def test_normalized_repeats_are_exact_hits():
+    retriever = _Retriever()
+    cache = QueryCache(retriever, prompt_builder=_prompt)
+
+    first = cache.query("What was Q3 revenue?")
+    second = cache.query("  what was   Q3 REVENUE ")
+
+    assert normalize_query("  what was   Q3 REVENUE ") == normalize_query("What was Q3 revenue?")
+    assert second == first
+    assert len(retriever.calls) == 1
+    assert cache.stats()["exact_hits"] == 1
+    assert cache.cached_doc_ids("what was q3 revenue") == ["d:p1:"]
+
+
+def test_lru_bound_and_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "time", lambda: now[0])
+    retriever = _Retriever()
+    cache = QueryCache(retriever, max_entries=2, ttl_seconds=60, prompt_builder=_prompt)
+
+    cache.query("a")
+    cache.query("b")
+    cache.query("a")  # a is now the most recently used
+    cache.query("c")  # evicts b
+    assert cache.cached_doc_ids("b") is None
+    assert cache.cached_doc_ids("a") is not None
+
+    now[0] += 61
+    cache.query("c")
+    assert retriever.calls == ["a", "b", "c", "c"]
+    assert cache.stats()["entries"] == 1
+
+
+def test_index_version_change_drops_everything():
+    version = [1]
+    retriever = _Retriever()
+    cache = QueryCache(retriever, index_version=lambda: version[0], prompt_builder=_prompt)
+
+    cache.query("revenue")
+    version[0] = 2
+    cache.query("revenue")
+
+    assert len(retriever.calls) == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_semantic_hit_reuses_documents_with_a_new_prompt():
+    retriever = _Retriever()
+    cache = QueryCache(
+        retriever, embedding_model=_TopicEmbeddings(), semantic_threshold=0.95, prompt_builder=_prompt
+    )
+
+    documents, _ = cache.query("revenue in 2021")
+    reused, prompt = cache.query("show revenue for 2021")
+    cache.query("headcount in 2021")
+
+    assert reused is documents
+    assert prompt == "show revenue for 2021 | answer to revenue in 2021"
+    assert cache.stats()["semantic_hits"] == 1
+    assert retriever.calls == ["revenue in 2021", "headcount in 2021"]
+
+
+def test_per_call_prompt_builder_does_not_leak_into_the_default():
+    cache = QueryCache(_Retriever(), prompt_builder=_prompt)
+
+    _, custom = cache.query("margin", prompt_builder=lambda docs, query: "short")
+    _, default = cache.query("margin")
+
+    assert custom == "short"
+    assert default == "margin | answer to margin"
+
+
+def test_semantic_tier_needs_an_embedding_model():
+    cache = QueryCache(_Retriever(), semantic_threshold=0.9)
+    assert cache.semantic_threshold is None
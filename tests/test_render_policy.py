@@ -0,0 +1,73 @@
+"""Render zoom policy, model views and the MemoryBudget in utils.render_policy."""
+
+import threading
+import time
+
+from PIL import Image
+
+from utils.config import LAYOUTLM_INPUT_SIZE, OCR_RENDER_MAX_PIXELS, OCR_RENDER_MAX_SIDE, OCR_RENDER_MAX_ZOOM
+from utils.render_policy import MemoryBudget, model_view, render_zoom, rendered_nbytes
+
+
+def test_ocr_zoom_is_capped_by_zoom_side_and_pixels():
+    letter = render_zoom(612, 792)
+    poster = render_zoom(612 * 6, 792 * 6)
+
+    assert letter <= OCR_RENDER_MAX_ZOOM
+    assert max(612, 792) * letter <= OCR_RENDER_MAX_SIDE + 1
+    assert 612 * 792 * letter ** 2 <= OCR_RENDER_MAX_PIXELS * 1.001
+    # A poster-sized page costs no more than the pixel cap (plus rounding up to whole pixels)
+    assert poster < letter
+    assert rendered_nbytes(612 * 6, 792 * 6, poster) <= (OCR_RENDER_MAX_PIXELS * 1.001 + 10_000) * 3
+
+
+def test_layoutlm_view_is_resized_and_paths_are_decoded(tmp_path):
+    page = Image.new("RGB", (1200, 1600), (255, 255, 255))
+    path = str(tmp_path / "page.png")
+    page.save(path)
+
+    assert model_view(page, "layoutlm").size == (LAYOUTLM_INPUT_SIZE, LAYOUTLM_INPUT_SIZE)
+    assert model_view(path, "layoutlm").size == (LAYOUTLM_INPUT_SIZE, LAYOUTLM_INPUT_SIZE)
+    assert model_view(path, "ocr") == path
+
+
+def test_budget_blocks_until_release():
+    budget = MemoryBudget(100)
+    assert budget.acquire("a", 60)
+    assert not budget.acquire("b", 60, timeout=0)
+
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(budget.acquire("b", 60, timeout=5)))
+    waiter.start()
+    time.sleep(0.05)
+    assert acquired == []
+    budget.release("a")
+    waiter.join()
+
+    assert acquired == [True]
+    assert budget.in_use == 60
+    assert budget.stats()["waits"] == 2
+
+
+def test_oversized_page_is_admitted_alone_and_force_overrides():
+    budget = MemoryBudget(100)
+    assert budget.acquire("huge", 500, timeout=0)
+    assert not budget.acquire("small", 1, timeout=0)
+    assert budget.acquire("forced", 1, force=True)
+    assert budget.peak_bytes == 501
+
+
+def test_release_is_idempotent_and_reservations_accumulate_per_key():
+    budget = MemoryBudget(100)
+    budget.acquire("page", 30)
+    budget.acquire("page", 20)
+    assert budget.stats()["pages_held"] == 1
+
+    budget.release("page")
+    budget.release("page")
+    budget.release("unknown")
+    assert budget.in_use == 0
+
+    budget.acquire("x", 10)
+    budget.release_all()
+    assert budget.in_use == 0 and budget.stats()["pages_held"] == 0
@@ -0,0 +1,61 @@
+"""Candidate bounding and per-query timings of retrieval.rerank.RerankRetriever."""
+
+import threading
+from typing import List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from retrieval.rerank import RerankRetriever
+
+
+class _ListRetriever(BaseRetriever):
+    texts: List[str]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [Document(page_content=text, metadata={"query": query}) for text in self.texts]
+
+
+class _OverlapReranker:
+    def __init__(self):
+        self.scored = []
+
+    def score(self, query, passages):
+        self.scored.append(len(passages))
+        terms = set(query.split())
+        return [float(len(terms & set(passage.split()))) for passage in passages]
+
+
+def _retriever(**kwargs):
+    texts = ["alpha", "alpha beta", "alpha beta gamma", "delta", "beta gamma"]
+    return RerankRetriever(base_retriever=_ListRetriever(texts=texts), reranker=_OverlapReranker(), **kwargs)
+
+
+def test_reranks_a_bounded_candidate_set():
+    retriever = _retriever(candidate_k=4, top_n=2)
+    documents, timings = retriever.invoke_with_timings("alpha beta gamma")
+
+    assert [doc.page_content for doc in documents] == ["alpha beta gamma", "alpha beta"]
+    assert documents[0].metadata["rerank_score"] == 3.0
+    assert retriever.reranker.scored == [4]
+    assert timings["candidates"] == 4
+
+
+def test_timings_are_per_thread():
+    retriever = _retriever(top_n=1)
+    results = {}
+    barrier = threading.Barrier(8)
+
+    def query(n):
+        barrier.wait()
+        results[n] = retriever.invoke_with_timings("beta")[1]
+
+    threads = [threading.Thread(target=query, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(timings) for timings in results.values()}) == 8
+    assert retriever.last_timings == {}
@@ -0,0 +1,76 @@
+"""Character chunking and sharded partitioning in utils.text_processor."""
+
+from types import SimpleNamespace
+
+import fitz
+import pytest
+import unstructured.partition.auto
+
+from utils.text_processor import _partition_shard, _split_text
+
+TEXT = " ".join(f"word{i}" for i in range(200))
+
+
+def test_chunks_are_bounded_and_keep_words_whole():
+    pieces = _split_text(TEXT, chunk_size=50, overlap=0)
+    words = set(TEXT.split())
+
+    assert all(len(piece) <= 50 for piece in pieces)
+    assert all(word in words for piece in pieces for word in piece.split())
+    assert " ".join(pieces).split() == TEXT.split()
+
+
+def test_consecutive_chunks_overlap_on_word_boundaries():
+    pieces = _split_text(TEXT, chunk_size=60, overlap=20)
+    words = set(TEXT.split())
+
+    assert all(word in words for piece in pieces for word in piece.split())
+    for previous, current in zip(pieces, pieces[1:]):
+        assert current.split()[0] in previous.split()
+    assert pieces[-1].split()[-1] == "word199"
+
+
+@pytest.mark.parametrize("overlap", [0, 10, 100])
+def test_unbreakable_text_still_makes_progress(overlap):
+    # No spaces to cut at, and an overlap as long as a chunk: each chunk must still advance
+    pieces = _split_text("x" * 95, chunk_size=10, overlap=overlap)
+
+    assert [len(piece) for piece in pieces] == [10] * 9 + [5]
+
+
+def test_empty_and_blank_text():
+    assert _split_text("", 50, 10) == []
+    assert _split_text("   ", 50, 10) == []
+
+
+def test_partition_shard_maps_page_numbers_back(tmp_path, monkeypatch):
+    pdf_path = tmp_path / "report.pdf"
+    document = fitz.open()
+    for number in range(1, 9):
+        document.new_page().insert_text((72, 72), f"page {number}")
+    document.save(pdf_path)
+    document.close()
+
+    def fake_partition(filename, strategy):
+        # Like unstructured: page numbers are relative to the file it was given
+        shard = fitz.open(filename)
+        elements = [
+            SimpleNamespace(text=page.get_text().strip(), metadata=SimpleNamespace(
+                page_number=index + 1, filename="shard.pdf", file_directory="/tmp"
+            ))
+            for index, page in enumerate(shard)
+        ]
+        elements.append(SimpleNamespace(text="no page", metadata=SimpleNamespace(
+            page_number=None, filename="shard.pdf", file_directory="/tmp"
+        )))
+        shard.close()
+        return elements
+
+    monkeypatch.setattr(unstructured.partition.auto, "partition", fake_partition)
+    elements = _partition_shard((str(pdf_path), 4, 6, "fast"))
+
+    assert [(e.text, e.metadata.page_number) for e in elements] == [
+        ("page 4", 4), ("page 5", 5), ("page 6", 6), ("no page", None),
+    ]
+    assert all(e.metadata.filename == "report.pdf" for e in elements)
+    assert all(e.metadata.file_directory == str(tmp_path) for e in elements)
@@ -1,25 +1,50 @@
-from .pdf_processor import pdf_to_images, extract_pdf_metadata, get_pdf_page_count, extract_text_from_pdf
-from .text_processor import partition_pdf_document, create_chunks_by_title, chunks_to_dict, filter_by_type, clean_all_chunks
-from .file_handler import save_json, load_json, save_jsonl, load_jsonl
-from .config import OPENAI_API_KEY, HUGGINGFACE_API_KEY, EMBEDDING_MODEL, CHUNK_SIZE, FAISS_INDEX_PATH
+# Submodules are imported on first attribute access (PEP 562) so that
+# "from utils.config import ..." does not pull in PyMuPDF or unstructured.
+import importlib
 
-__all__ = [
-    "pdf_to_images",
-    "extract_pdf_metadata",
-    "get_pdf_page_count",
-    "extract_text_from_pdf",
-    "partition_pdf_document",
-    "create_chunks_by_title",
-    "chunks_to_dict",
-    "filter_by_type",
-    "clean_all_chunks",
-    "save_json",
-    "load_json",
-    "save_jsonl",
-    "load_jsonl",
-    "OPENAI_API_KEY",
-    "HUGGINGFACE_API_KEY",
-    "EMBEDDING_MODEL",
-    "CHUNK_SIZE",
-    "FAISS_INDEX_PATH",
-]
\ No newline at end of file
+_EXPORTS = {
+    "pdf_to_images": "pdf_processor",
+    "iter_pdf_images": "pdf_processor",
+    "extract_pdf_metadata": "pdf_processor",
+    "get_pdf_page_count": "pdf_processor",
+    "extract_text_from_pdf": "pdf_processor",
+    "classify_pages": "pdf_processor",
+    "find_figure_regions": "pdf_processor",
+    "iter_region_images": "pdf_processor",
+    "partition_pdf_document": "text_processor",
+    "create_chunks_by_title": "text_processor",
+    "chunks_to_dict": "text_processor",
+    "filter_by_type": "text_processor",
+    "clean_all_chunks": "text_processor",
+    "chunk_pdf_text": "text_processor",
+    "partition_and_chunk": "text_processor",
+    "chunks_to_records": "text_processor",
+    "save_json": "file_handler",
+    "load_json": "file_handler",
+    "save_jsonl": "file_handler",
+    "load_jsonl": "file_handler",
+    "iter_jsonl": "file_handler",
+    "write_jsonl": "file_handler",
+    "JsonlWriter": "file_handler",
+    "telemetry": "telemetry",
+    "configure_logging": "telemetry",
+    "OPENAI_API_KEY": "config",
+    "HUGGINGFACE_API_KEY": "config",
+    "EMBEDDING_MODEL": "config",
+    "CHUNK_SIZE": "config",
+    "FAISS_INDEX_PATH": "config",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module 'utils' has no attribute '{name}'")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
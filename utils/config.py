@@ -13,7 +13,63 @@ PDF_OUTPUT_DIR = "temp_images"
 CHART_DATA_DIR = "chart_data"
 CHUNK_SIZE = 3000
 CHUNK_OVERLAP = 0
+TEXT_SHARD_PAGES = 20
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_CACHE_DIR = ".embedding_cache"
+EMBEDDING_CACHE_MAX_MB = 1536  # vector file bound; ~1M rows of 384-d float32
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch, onnx or onnx-int8
+EMBEDDING_NUM_THREADS = None
+EMBEDDING_MAX_LENGTH = 256
 FAISS_INDEX_PATH = "faiss_index.bin"
-
-print("Configuration loaded from .env")
\ No newline at end of file
+LAYOUTLM_MODEL = "microsoft/layoutlmv3-base"
+LAYOUTLM_BATCH_SIZE = 8
+LAYOUTLM_INPUT_SIZE = 224  # LayoutLMv3 processors resize pages to 224x224
+EXTRACTION_CACHE_DIR = ".extraction_cache"
+EXTRACTION_CACHE_MAX_BYTES = 512 * 1024 * 1024
+EXTRACTION_OUTPUT_FORMAT = "store"  # store (compressed ExtractionStore) or json (one file per page)
+EXTRACTION_STORE_CHUNK_ROWS = 256
+PREFILTER_MIN_DRAWINGS = 10
+PREFILTER_MIN_IMAGE_FRACTION = 0.05
+REGION_ZOOM = 4
+REGION_PADDING = 24
+REGION_MIN_AREA_FRACTION = 0.02
+PIPELINE_QUEUE_SIZE = 8
+EMBED_BATCH_SIZE = 32
+JOB_STATE_PATH = "ingest_state.sqlite"
+INGEST_SAVE_EVERY = 20
+INDEX_COMPACT_THRESHOLD = 0.2
+MMAP_INDEX_PATH = "mmap_index"
+MMAP_INDEX_TYPE = "IVF-Flat"  # IVF-Flat, IVF-PQ or HNSW
+MMAP_INDEX_NLIST = 1024
+MMAP_INDEX_NPROBE = 16
+MMAP_INDEX_PQ_M = 16
+MMAP_INDEX_HNSW_M = 32
+MMAP_INDEX_TRAIN_PER_LIST = 256  # IVF training sample size per list
+HYBRID_CANDIDATE_K = 20
+HYBRID_LATENCY_BUDGET_MS = 200
+HYBRID_DENSE_WORKERS = min(32, (os.cpu_count() or 1) + 4)  # concurrent dense searches across all queries
+RRF_K = 60
+QUERY_CACHE_MAX_ENTRIES = 1024
+QUERY_CACHE_TTL_SECONDS = 3600
+FUSION_DEDUP_THRESHOLD = 0.8
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_BASE_URL = os.getenv("OPENAI_BASE_URL")  # e.g. a local stub server
+LLM_MAX_CONCURRENCY = 32
+LLM_MAX_CONNECTIONS = 64
+LLM_TIMEOUT_SECONDS = 60
+PROMPT_MAX_TOKENS = 3000
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_BACKEND = "torch"  # torch, onnx or onnx-int8
+RERANK_CANDIDATE_K = 20
+RERANK_TOP_N = 3
+RERANK_BATCH_SIZE = 16
+RERANK_MAX_LENGTH = 512
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "0") == "1"
+TELEMETRY_MAX_EVENTS = 100000
+PROFILE_FUNCTIONS = [name for name in os.getenv("PROFILE_FUNCTIONS", "").split(",") if name]  # e.g. "extract_chart_data,build_vectorstore"
+PROFILE_DIR = "profiles"
+OCR_RENDER_MAX_ZOOM = 2
+OCR_RENDER_MAX_SIDE = 3000
+OCR_RENDER_MAX_PIXELS = 6_000_000
+RENDER_MEMORY_CAP_MB = 512
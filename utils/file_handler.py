@@ -1,11 +1,84 @@
 """
 utils/file_handler.py
-Simple file I/O utilities - JSON save/load only.
+Simple file I/O utilities - JSON save/load and streaming JSONL.
+
+JSONL is read and written as a stream: records are encoded in buffered
+batches (with orjson when installed), optionally gzip/zstd compressed by
+file extension, and written to a temporary file that is renamed into place
+on close, so a crash never leaves a truncated file behind.
 """
 
+import gzip
+import io
 import json
+import logging
+import os
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def _json_dumps(record: Any) -> bytes:
+    # Same layout as orjson: compact separators, raw UTF-8
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _dumps(record: Any) -> bytes:
+    # Both encoders accept the same inputs and write the same JSON values in the
+    # same compact layout; only float exponents may be spelled differently
+    # (orjson "1e-7", json "1e-07")
+    if orjson is not None:
+        try:
+            encoded = orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return _json_dumps(record)
+        # orjson writes NaN and Infinity as null, so only records containing a null can differ
+        if b"null" not in encoded:
+            return encoded
+        return _json_dumps(record)
+    return _json_dumps(record)
+
+
+def _loads(line: bytes) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            # NaN / Infinity, which json accepts and orjson does not
+            return json.loads(line)
+    return json.loads(line)
+
+
+def _compression_for(filepath: str, compression: Optional[str]) -> Optional[str]:
+    if compression != "auto":
+        return compression
+    if filepath.endswith(".gz"):
+        return "gzip"
+    if filepath.endswith((".zst", ".zstd")):
+        return "zstd"
+    return None
+
+
+def _open_binary(filepath: str, mode: str, compression: Optional[str]):
+    if compression == "gzip":
+        return gzip.open(filepath, mode, compresslevel=6)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression requires the 'zstandard' package")
+        handle = zstandard.open(filepath, mode)
+        # The zstd reader has no line iteration of its own
+        return io.BufferedReader(handle) if "r" in mode else handle
+    if compression is None:
+        return open(filepath, mode)
+    raise ValueError(f"Unknown compression: {compression}")
 
 
 def save_json(data: Dict[str, Any], filepath: str) -> None:
@@ -22,7 +95,7 @@ def save_json(data: Dict[str, Any], filepath: str) -> None:
     Path(filepath).parent.mkdir(parents=True, exist_ok=True)
     with open(filepath, 'w') as f:
         json.dump(data, f, indent=2)
-    print(f"✓ Saved to {filepath}")
+    logger.debug("Saved to %s", filepath)
 
 
 def load_json(filepath: str) -> Dict[str, Any]:
@@ -40,31 +113,146 @@ def load_json(filepath: str) -> Dict[str, Any]:
     """
     with open(filepath, 'r') as f:
         data = json.load(f)
-    print(f"✓ Loaded from {filepath}")
+    logger.debug("Loaded from %s", filepath)
     return data
 
 
-def save_jsonl(records: List[Dict], filepath: str) -> None:
+class JsonlWriter:
     """
-    Save list of dictionaries as JSONL (one per line).
+    Buffered, atomically committed JSONL writer.
+
+    Records go to "<filepath>.tmp" and the file is renamed to filepath on
+    close(); abort() (or an exception inside a with block) discards it.
+
+    Args:
+        filepath: Destination path (".gz" / ".zst" select compression when compression="auto")
+        compression: "auto", "gzip", "zstd" or None
+        buffer_records: Records encoded per write call
+
+    Example:
+        >>> with JsonlWriter("extractions.jsonl.gz") as writer:
+        ...     for record in records:
+        ...         writer.write(record)
+        >>> print(writer.records, writer.bytes)
+    """
+
+    def __init__(self, filepath: str, compression: Optional[str] = "auto", buffer_records: int = 1000):
+        self.filepath = str(filepath)
+        self.buffer_records = buffer_records
+        self.records = 0
+        self.bytes = 0
+        Path(self.filepath).parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.filepath + ".tmp"
+        self._file = _open_binary(self._tmp_path, "wb", _compression_for(self.filepath, compression))
+        self._buffer: List[bytes] = []
+
+    def write(self, record: Any) -> None:
+        self._buffer.append(_dumps(record))
+        if len(self._buffer) >= self.buffer_records:
+            self.flush()
+
+    def write_many(self, records: Iterable[Any]) -> None:
+        for record in records:
+            self.write(record)
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        data = b"\n".join(self._buffer) + b"\n"
+        self._file.write(data)
+        self.records += len(self._buffer)
+        self.bytes += len(data)
+        self._buffer = []
+
+    def close(self) -> None:
+        """Flush, fsync and rename the file into place."""
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        with open(self._tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(self._tmp_path, self.filepath)
+        self._file = None
+
+    def abort(self) -> None:
+        """Discard everything written so far; any existing file at filepath is left untouched."""
+        if self._file is None:
+            return
+        self._file.close()
+        os.remove(self._tmp_path)
+        self._file = None
+        self._buffer = []
+
+    def __enter__(self) -> "JsonlWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_jsonl(records: Iterable[Any], filepath: str, compression: Optional[str] = "auto", buffer_records: int = 1000) -> Dict[str, int]:
+    """
+    Stream records (any iterable, e.g. a generator) to a JSONL file.
+
+    Returns:
+        Dictionary with records written and uncompressed bytes
+    """
+    with JsonlWriter(filepath, compression=compression, buffer_records=buffer_records) as writer:
+        writer.write_many(records)
+    return {"records": writer.records, "bytes": writer.bytes}
+
+
+def iter_jsonl(filepath: str, compression: Optional[str] = "auto", counters: Optional[Dict[str, int]] = None) -> Iterator[Any]:
+    """
+    Yield records from a JSONL file one at a time, skipping blank lines.
+
+    Args:
+        filepath: JSONL file (".gz" / ".zst" are decompressed when compression="auto")
+        compression: "auto", "gzip", "zstd" or None
+        counters: Optional dict whose "records" and "bytes" are incremented while reading
+
+    Example:
+        >>> for record in iter_jsonl("extractions.jsonl.gz"):
+        ...     print(record["page"])
+    """
+    if counters is not None:
+        counters.setdefault("records", 0)
+        counters.setdefault("bytes", 0)
+    with _open_binary(str(filepath), "rb", _compression_for(str(filepath), compression)) as f:
+        for line in f:
+            if counters is not None:
+                counters["bytes"] += len(line)
+            if not line.strip():
+                continue
+            if counters is not None:
+                counters["records"] += 1
+            yield _loads(line)
+
+
+def save_jsonl(records: Iterable[Dict], filepath: str) -> Dict[str, int]:
+    """
+    Save dictionaries as JSONL (one per line); thin wrapper over write_jsonl().
     
     Args:
-        records: List of dictionaries
+        records: List (or any iterable) of dictionaries
         filepath: Path to save JSONL file
         
+    Returns:
+        Dictionary with records written and uncompressed bytes
+        
     Example:
         >>> save_jsonl([{"id": 1}, {"id": 2}], "data.jsonl")
     """
-    Path(filepath).parent.mkdir(parents=True, exist_ok=True)
-    with open(filepath, 'w') as f:
-        for record in records:
-            f.write(json.dumps(record) + '\n')
-    print(f"✓ Saved {len(records)} records to {filepath}")
+    return write_jsonl(records, filepath)
 
 
 def load_jsonl(filepath: str) -> List[Dict]:
     """
-    Load JSONL file (one JSON per line).
+    Load JSONL file (one JSON per line); thin wrapper over iter_jsonl().
     
     Args:
         filepath: Path to JSONL file
@@ -75,10 +263,4 @@ def load_jsonl(filepath: str) -> List[Dict]:
     Example:
         >>> records = load_jsonl("data.jsonl")
     """
-    records = []
-    with open(filepath, 'r') as f:
-        for line in f:
-            if line.strip():
-                records.append(json.loads(line))
-    print(f"✓ Loaded {len(records)} records from {filepath}")
-    return records
\ No newline at end of file
+    return list(iter_jsonl(filepath))
@@ -0,0 +1,78 @@
+"""
+model_registry.py
+Process-wide registry of lazily loaded models.
+
+Modules register a loader under a name at import time (cheap); the model is
+only built on the first get() and then stays warm for every later call in
+the same process, so repeated extract_from_document / build_vectorstore
+calls do not reload OCR, LayoutLMv3 or embedding weights.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Name -> loader mapping with load-once, thread-safe access.
+
+    Example:
+        >>> models.register("layoutlm", initialize_layoutlm)
+        >>> processor, model = models.get("layoutlm")  # loaded here, reused afterwards
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        """Register (or replace) the loader for a model; any loaded instance is dropped."""
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+            self._models.pop(name, None)
+
+    def get(self, name: str) -> Any:
+        """Return the model, loading it on first use."""
+        if name in self._models:
+            return self._models[name]
+        if name not in self._loaders:
+            raise KeyError(f"No model registered as '{name}'")
+
+        with self._locks[name]:
+            # Another thread may have finished loading while we waited
+            if name not in self._models:
+                start = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                self._load_seconds[name] = time.perf_counter() - start
+                logger.info("Loaded model '%s' in %.2fs", name, self._load_seconds[name])
+        return self._models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def unload(self, name: Optional[str] = None) -> None:
+        """Drop one loaded model (or all of them) so the next get() reloads it."""
+        with self._lock:
+            if name is None:
+                self._models.clear()
+            else:
+                self._models.pop(name, None)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-model loaded flag and load time."""
+        return {
+            name: {"loaded": name in self._models, "load_seconds": round(self._load_seconds.get(name, 0.0), 3)}
+            for name in self._loaders
+        }
+
+
+# Shared registry for the current process
+models = ModelRegistry()
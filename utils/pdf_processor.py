@@ -1,44 +1,240 @@
 
+import logging
 import os
 import fitz  # PyMuPDF
-from typing import List, Tuple, Dict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, List, Tuple, Dict, Iterator, Optional, Union
+from PIL import Image
 
+from utils.config import (
+    PREFILTER_MIN_DRAWINGS,
+    PREFILTER_MIN_IMAGE_FRACTION,
+    REGION_ZOOM,
+    REGION_PADDING,
+    REGION_MIN_AREA_FRACTION,
+)
+from utils.render_policy import MemoryBudget, render_zoom, rendered_nbytes
+from utils.telemetry import profiled, telemetry
 
-def pdf_to_images(pdf_path: str, output_dir: str = "temp_images", dpi_multiplier: int = 2) -> List[Tuple[str, int]]:
-  
-  
-    try:
-        # Create output directory
+logger = logging.getLogger(__name__)
+
+
+# Document handle opened once per rasterization worker process
+_worker_document = None
+
+
+def _init_render_worker(pdf_path: str) -> None:
+    global _worker_document
+    _worker_document = fitz.open(pdf_path)
+
+
+def _page_zoom(page, dpi_multiplier: Optional[float]) -> float:
+    # None = the OCR render policy: 2x for ordinary pages, less for large-format ones
+    if dpi_multiplier is not None:
+        return dpi_multiplier
+    return render_zoom(page.rect.width, page.rect.height, "ocr")
+
+
+@profiled
+def _render_page(pdf_document, page_index: int, dpi_multiplier: Optional[float], output_dir: str, in_memory: bool):
+    with telemetry.span("render_page", page=page_index + 1):
+        page = pdf_document[page_index]
+
+        # Render page to image with zoom for better OCR
+        zoom = _page_zoom(page, dpi_multiplier)
+        matrix = fitz.Matrix(zoom, zoom)
+        pix = page.get_pixmap(matrix=matrix, alpha=False)
+        telemetry.count("pages_rendered")
+
+        if in_memory:
+            # Raw RGB samples are picklable, unlike the Pixmap itself
+            return page_index + 1, (pix.width, pix.height, pix.samples)
+
+        image_path = os.path.join(output_dir, f"page_{page_index + 1}.png")
+        pix.save(image_path)
+        return page_index + 1, image_path
+
+
+def _render_page_in_worker(page_index: int, dpi_multiplier: Optional[float], output_dir: str, in_memory: bool):
+    return _render_page(_worker_document, page_index, dpi_multiplier, output_dir, in_memory)
+
+
+def _to_image(rendered):
+    if isinstance(rendered, tuple):
+        width, height, samples = rendered
+        return Image.frombytes("RGB", (width, height), samples)
+    return rendered
+
+
+def iter_pdf_images(
+    pdf_path: str,
+    output_dir: str = "temp_images",
+    dpi_multiplier: Optional[float] = None,
+    num_workers: Optional[int] = None,
+    in_memory: bool = False,
+    ordered: bool = False,
+    pages: Optional[List[int]] = None,
+    memory_budget: Optional[MemoryBudget] = None,
+) -> Iterator[Tuple[int, Union[str, Image.Image]]]:
+    """
+    Render PDF pages and yield each one as soon as it is ready.
+
+    Pages are spread across a process pool where every worker holds its own
+    fitz document handle. At most ``2 * num_workers`` pages are in flight, so
+    a slow consumer does not let rendered pages pile up in memory.
+
+    With a memory_budget, each page reserves its buffer size under the key
+    (pdf_path, page_number) before it is rendered; the consumer releases it
+    once it has finished with the image, and rendering waits while the
+    budget is full.
+
+    Args:
+        pdf_path: Path to the PDF file
+        output_dir: Directory for PNG files (unused when in_memory=True)
+        dpi_multiplier: Zoom factor applied when rendering (None = OCR render
+            policy, see utils.render_policy)
+        num_workers: Worker processes (None = CPU count, 1 = render in-process)
+        in_memory: Yield PIL images instead of writing PNG files
+        ordered: Yield pages in page order instead of completion order
+        pages: 1-based page numbers to render (default: all pages)
+        memory_budget: Budget that in-flight page buffers are reserved against
+
+    Yields:
+        Tuples of (page_number, image_path or PIL image)
+
+    Example:
+        >>> for page_num, image in iter_pdf_images("sample.pdf", in_memory=True):
+        ...     print(page_num, image.size)
+    """
+    if not in_memory:
         os.makedirs(output_dir, exist_ok=True)
-        
-        # Open PDF
-        pdf_document = fitz.open(pdf_path)
-        print(f"Opened PDF: {pdf_path} ({pdf_document.page_count} pages)")
-        
-        image_paths = []
-        
-        # Extract each page as image
-        for page_num in range(pdf_document.page_count):
-            page = pdf_document[page_num]
-            
-            # Render page to image with zoom for better OCR
-            matrix = fitz.Matrix(dpi_multiplier, dpi_multiplier)
-            pix = page.get_pixmap(matrix=matrix)
-            
-            # Save image
-            image_path = os.path.join(output_dir, f"page_{page_num + 1}.png")
-            pix.save(image_path)
-            
-            image_paths.append((image_path, page_num + 1))
-            print(f"Extracted page {page_num + 1}")
-        
-        pdf_document.close()
-        print(f"Extracted {len(image_paths)} images from PDF\n")
-        
-        return image_paths
-    
+
+    pdf_document = fitz.open(pdf_path)
+    if pages is None:
+        page_indices = list(range(pdf_document.page_count))
+    else:
+        page_indices = [page_num - 1 for page_num in pages]
+
+    def reserve(page_index: int, block: bool = True, force: bool = False) -> bool:
+        if memory_budget is None:
+            return True
+        page = pdf_document[page_index]
+        nbytes = rendered_nbytes(page.rect.width, page.rect.height, _page_zoom(page, dpi_multiplier))
+        if not memory_budget.acquire((pdf_path, page_index + 1), nbytes, timeout=None if block else 0, force=force):
+            return False
+        unyielded.add(page_index + 1)
+        return True
+
+    def handed_over(page_num: int) -> int:
+        unyielded.discard(page_num)
+        return page_num
+
+    # Reserved pages the consumer never received are released here if iteration stops early
+    unyielded = set()
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    num_workers = max(1, min(num_workers, len(page_indices) or 1))
+
+    if num_workers == 1:
+        try:
+            for page_index in page_indices:
+                reserve(page_index)
+                page_num, rendered = _render_page(pdf_document, page_index, dpi_multiplier, output_dir, in_memory)
+                yield handed_over(page_num), _to_image(rendered)
+        finally:
+            pdf_document.close()
+            for page_num in unyielded:
+                memory_budget.release((pdf_path, page_num))
+        return
+
+    max_in_flight = 2 * num_workers
+    remaining = iter(page_indices)
+    deferred: List[int] = []
+    pending = set()
+    buffered: Dict[int, Union[str, Image.Image]] = {}
+    expected = iter(page_num + 1 for page_num in page_indices)
+    next_page = next(expected, None)
+
+    try:
+        with pdf_document, ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_render_worker,
+            initargs=(pdf_path,),
+        ) as executor:
+            def submit_more():
+                while len(pending) + len(buffered) < max_in_flight:
+                    page_index = deferred.pop() if deferred else next(remaining, None)
+                    if page_index is None:
+                        return
+                    # Only wait for budget when this generator holds no pages itself; otherwise
+                    # collect finished pages first. A page that ordered output is stuck behind
+                    # is admitted over the cap rather than deadlocking.
+                    if not reserve(page_index, block=not pending and not buffered, force=not pending and bool(buffered)):
+                        deferred.append(page_index)
+                        return
+                    pending.add(executor.submit(_render_page_in_worker, page_index, dpi_multiplier, output_dir, in_memory))
+
+            submit_more()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    page_num, rendered = future.result()
+                    if not ordered:
+                        yield handed_over(page_num), _to_image(rendered)
+                    else:
+                        buffered[page_num] = rendered
+                while ordered and next_page in buffered:
+                    yield handed_over(next_page), _to_image(buffered.pop(next_page))
+                    next_page = next(expected, None)
+                submit_more()
+    finally:
+        for page_num in unyielded:
+            memory_budget.release((pdf_path, page_num))
+
+
+def pdf_to_images(
+    pdf_path: str,
+    output_dir: str = "temp_images",
+    dpi_multiplier: Optional[float] = None,
+    num_workers: int = 1,
+    in_memory: bool = False,
+) -> List[Tuple[Union[str, Image.Image], int]]:
+    """
+    Render every PDF page to an image.
+
+    Args:
+        pdf_path: Path to the PDF file
+        output_dir: Directory for PNG files (unused when in_memory=True)
+        dpi_multiplier: Zoom factor applied when rendering (None = OCR render policy)
+        num_workers: Worker processes for parallel rendering (None = CPU count)
+        in_memory: Return PIL images instead of writing PNG files
+
+    Returns:
+        List of (image_path or PIL image, page_number) tuples in page order
+
+    Example:
+        >>> images = pdf_to_images("sample.pdf", num_workers=4)
+    """
+    try:
+        images = []
+        for page_num, image in iter_pdf_images(
+            pdf_path,
+            output_dir=output_dir,
+            dpi_multiplier=dpi_multiplier,
+            num_workers=num_workers,
+            in_memory=in_memory,
+            ordered=True,
+        ):
+            images.append((image, page_num))
+            logger.debug("Extracted page %d", page_num)
+
+        logger.info("Extracted %d images from PDF", len(images))
+        return images
+
     except Exception as e:
-        print(f"Error converting PDF to images: {str(e)}")
+        logger.error("Error converting PDF to images: %s", e)
         raise
 
 
@@ -61,11 +257,11 @@ def extract_pdf_metadata(pdf_path: str) -> Dict:
         metadata = pdf_document.metadata
         pdf_document.close()
         
-        print(f"Extracted metadata from {pdf_path}")
+        logger.debug("Extracted metadata from %s", pdf_path)
         return metadata or {}
     
     except Exception as e:
-        print(f"Error extracting PDF metadata: {str(e)}")
+        logger.error("Error extracting PDF metadata: %s", e)
         return {}
 
 
@@ -85,7 +281,7 @@ def get_pdf_page_count(pdf_path: str) -> int:
         pdf_document.close()
         return page_count
     except Exception as e:
-        print(f"Error getting page count: {str(e)}")
+        logger.error("Error getting page count: %s", e)
         return 0
 
 
@@ -110,9 +306,235 @@ def extract_text_from_pdf(pdf_path: str) -> Dict[int, str]:
             text_content[page_num + 1] = text
         
         pdf_document.close()
-        print(f"Extracted text from {len(text_content)} pages\n")
+        logger.info("Extracted text from %d pages", len(text_content))
         return text_content
     
     except Exception as e:
-        print(f"Error extracting text from PDF: {str(e)}")
-        return {}
\ No newline at end of file
+        logger.error("Error extracting text from PDF: %s", e)
+        return {}
+
+
+def classify_page(page, min_drawings: int = PREFILTER_MIN_DRAWINGS, min_image_fraction: float = PREFILTER_MIN_IMAGE_FRACTION) -> Dict:
+    """
+    Cheaply decide whether a page is likely to hold a chart or table.
+
+    Vector charts and ruled tables show up as drawing paths, raster figures as
+    embedded images. Small images (logos, icons) are ignored.
+
+    Args:
+        page: fitz page
+        min_drawings: Drawing paths needed to treat the page as a chart/table page
+        min_image_fraction: Fraction of the page area an image must cover to count
+
+    Returns:
+        Dictionary with object counts, text length and a likely_chart flag
+    """
+    page_area = abs(page.rect) or 1.0
+    drawings = len(page.get_drawings())
+    large_images = sum(
+        1 for info in page.get_image_info()
+        if abs(fitz.Rect(info["bbox"])) / page_area >= min_image_fraction
+    )
+    text_chars = len(page.get_text().strip())
+
+    return {
+        "drawings": drawings,
+        "large_images": large_images,
+        "text_chars": text_chars,
+        "likely_chart": drawings >= min_drawings or large_images > 0,
+    }
+
+
+def classify_pages(pdf_path: str, **thresholds) -> Dict[int, Dict]:
+    """
+    Classify every page of a PDF with classify_page().
+
+    Args:
+        pdf_path: Path to the PDF file
+        **thresholds: Overrides for classify_page() thresholds
+
+    Returns:
+        Dictionary mapping page_number to its classification
+
+    Example:
+        >>> pages = classify_pages("sample.pdf")
+        >>> chart_pages = [n for n, c in pages.items() if c["likely_chart"]]
+    """
+    try:
+        pdf_document = fitz.open(pdf_path)
+        classification = {
+            page_num + 1: classify_page(pdf_document[page_num], **thresholds)
+            for page_num in range(pdf_document.page_count)
+        }
+        pdf_document.close()
+
+        likely = sum(1 for c in classification.values() if c["likely_chart"])
+        logger.info("Classified %d pages: %d likely chart/table pages", len(classification), likely)
+        return classification
+
+    except Exception as e:
+        logger.error("Error classifying PDF pages: %s", e)
+        return {}
+
+
+# Element types from unstructured that mark figure/table regions
+REGION_ELEMENT_TYPES = {"Table", "TableChunk", "Image", "Figure"}
+
+
+def _merge_rects(rects: List["fitz.Rect"]) -> List["fitz.Rect"]:
+    # A grown box can reach boxes it missed earlier, so repeat until nothing merges
+    merged = [fitz.Rect(rect) for rect in sorted(rects, key=lambda r: (r.y0, r.x0))]
+    changed = True
+    while changed:
+        changed = False
+        result: List[fitz.Rect] = []
+        for rect in merged:
+            for existing in result:
+                if existing.intersects(rect):
+                    existing.include_rect(rect)
+                    changed = True
+                    break
+            else:
+                result.append(rect)
+        merged = result
+    return merged
+
+
+def _chunk_rects(chunk_dicts: List[Dict], get_page) -> Dict[int, List["fitz.Rect"]]:
+    # unstructured coordinates live in their own pixel space; scale to PDF points
+    rects: Dict[int, List[fitz.Rect]] = {}
+    for chunk in chunk_dicts:
+        metadata = chunk.get("metadata") or {}
+        coordinates = metadata.get("coordinates")
+        page_number = metadata.get("page_number")
+        if chunk.get("type") not in REGION_ELEMENT_TYPES or coordinates is None or page_number is None:
+            continue
+
+        if isinstance(coordinates, dict):
+            points = coordinates.get("points")
+            width, height = coordinates.get("layout_width"), coordinates.get("layout_height")
+        else:
+            points = getattr(coordinates, "points", None)
+            system = getattr(coordinates, "system", None)
+            width, height = getattr(system, "width", None), getattr(system, "height", None)
+        if not points:
+            continue
+
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        rect = fitz.Rect(min(xs), min(ys), max(xs), max(ys))
+        if width and height:
+            page_rect = get_page(page_number).rect
+            rect = rect * fitz.Matrix(page_rect.width / width, page_rect.height / height)
+        rects.setdefault(page_number, []).append(rect)
+    return rects
+
+
+def find_figure_regions(
+    pdf_path: str,
+    chunk_dicts: Optional[List[Dict]] = None,
+    padding: float = REGION_PADDING,
+    min_area_fraction: float = REGION_MIN_AREA_FRACTION,
+) -> List[Dict[str, Any]]:
+    """
+    Locate chart/table regions on each page.
+
+    Regions come from embedded images, clustered vector drawings and detected
+    tables, plus Table/Image element coordinates from chunks_to_dict() when
+    given. Overlapping boxes are merged and padded so titles and axis labels
+    stay inside the crop.
+
+    Args:
+        pdf_path: Path to the PDF file
+        chunk_dicts: Optional output of chunks_to_dict() for the same PDF
+        padding: Margin in PDF points added around each region
+        min_area_fraction: Regions smaller than this fraction of the page are dropped
+
+    Returns:
+        List of region dictionaries with page, region_id and bbox (PDF points)
+
+    Example:
+        >>> regions = find_figure_regions("sample.pdf")
+        >>> print(regions[0]["region_id"], regions[0]["bbox"])
+    """
+    try:
+        pdf_document = fitz.open(pdf_path)
+        chunk_rects = _chunk_rects(chunk_dicts or [], lambda n: pdf_document[n - 1])
+        if pdf_document.page_count and not hasattr(pdf_document[0], "cluster_drawings"):
+            logger.warning("PyMuPDF %s has no Page.cluster_drawings (needs >= 1.24.2); vector charts will not be found",
+                           fitz.VersionBind)
+
+        regions = []
+        for page_index in range(pdf_document.page_count):
+            page = pdf_document[page_index]
+            page_num = page_index + 1
+            page_area = abs(page.rect) or 1.0
+
+            rects = [fitz.Rect(info["bbox"]) for info in page.get_image_info()]
+            if hasattr(page, "cluster_drawings"):
+                rects.extend(page.cluster_drawings(x_tolerance=padding, y_tolerance=padding))
+            if hasattr(page, "find_tables"):
+                rects.extend(fitz.Rect(table.bbox) for table in page.find_tables().tables)
+            rects.extend(chunk_rects.get(page_num, []))
+
+            rects = [r for r in rects if abs(r) / page_area >= min_area_fraction]
+            for idx, rect in enumerate(_merge_rects(rects), 1):
+                rect = (rect + (-padding, -padding, padding, padding)) & page.rect
+                regions.append({
+                    "page": page_num,
+                    "region_id": f"p{page_num}_r{idx}",
+                    "bbox": [round(v, 2) for v in rect],
+                })
+
+        pdf_document.close()
+        logger.info("Found %d figure/table regions", len(regions))
+        return regions
+
+    except Exception as e:
+        logger.error("Error finding figure regions: %s", e)
+        return []
+
+
+def iter_region_images(
+    pdf_path: str,
+    regions: List[Dict[str, Any]],
+    zoom: float = REGION_ZOOM,
+    output_dir: str = "temp_images",
+    in_memory: bool = False,
+) -> Iterator[Tuple[Union[str, Image.Image], int, str]]:
+    """
+    Render only the given regions, at a higher zoom than full pages.
+
+    Args:
+        pdf_path: Path to the PDF file
+        regions: Regions from find_figure_regions()
+        zoom: Zoom factor for the crops
+        output_dir: Directory for PNG crops (unused when in_memory=True)
+        in_memory: Yield PIL images instead of writing PNG files
+
+    Yields:
+        Tuples of (image_path or PIL image, page_number, region_id)
+
+    Example:
+        >>> regions = find_figure_regions("sample.pdf")
+        >>> crops = list(iter_region_images("sample.pdf", regions, in_memory=True))
+    """
+    if not in_memory:
+        os.makedirs(output_dir, exist_ok=True)
+
+    pdf_document = fitz.open(pdf_path)
+    try:
+        matrix = fitz.Matrix(zoom, zoom)
+        for region in regions:
+            page = pdf_document[region["page"] - 1]
+            pix = page.get_pixmap(matrix=matrix, clip=fitz.Rect(region["bbox"]), alpha=False)
+
+            if in_memory:
+                image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            else:
+                image = os.path.join(output_dir, f"page_{region['page']}_{region['region_id']}.png")
+                pix.save(image)
+
+            yield image, region["page"], region["region_id"]
+    finally:
+        pdf_document.close()
@@ -0,0 +1,165 @@
+"""
+render_policy.py
+Per-model render resolution and a byte budget for pages in flight.
+
+Pages are rasterized once, at the resolution the OCR stage needs, capped by
+OCR_RENDER_MAX_SIDE / OCR_RENDER_MAX_PIXELS so a poster-sized page costs the
+same as a letter page. Other models get a downscaled view of that same
+buffer (model_view) instead of a second render or a PNG decode.
+MemoryBudget bounds the bytes of rendered pages alive at once; the renderer
+waits for room before producing the next page.
+"""
+
+import math
+import os
+import threading
+from typing import Any, Dict, Hashable, Optional, Union
+
+from PIL import Image
+
+from utils.config import (
+    LAYOUTLM_INPUT_SIZE,
+    OCR_RENDER_MAX_PIXELS,
+    OCR_RENDER_MAX_SIDE,
+    OCR_RENDER_MAX_ZOOM,
+    RENDER_MEMORY_CAP_MB,
+)
+
+
+# Input resolution each model needs; "size" means the model resizes to exactly that
+RENDER_TARGETS: Dict[str, Dict[str, Any]] = {
+    "ocr": {"max_zoom": OCR_RENDER_MAX_ZOOM, "max_side": OCR_RENDER_MAX_SIDE, "max_pixels": OCR_RENDER_MAX_PIXELS},
+    "layoutlm": {"size": (LAYOUTLM_INPUT_SIZE, LAYOUTLM_INPUT_SIZE)},
+}
+
+# RGB, one byte per channel
+BYTES_PER_PIXEL = 3
+
+
+def render_zoom(width: float, height: float, target: str = "ocr") -> float:
+    """
+    Zoom factor for rendering a page of width x height points for a model.
+
+    Args:
+        width: Page width in points
+        height: Page height in points
+        target: Key of RENDER_TARGETS
+
+    Returns:
+        Largest zoom within the target's max_zoom, max_side and max_pixels
+    """
+    spec = RENDER_TARGETS[target]
+    if "size" in spec:
+        return max(spec["size"][0] / width, spec["size"][1] / height)
+    return min(
+        spec["max_zoom"],
+        spec["max_side"] / max(width, height),
+        math.sqrt(spec["max_pixels"] / (width * height)),
+    )
+
+
+def rendered_nbytes(width: float, height: float, zoom: float) -> int:
+    """Bytes of an RGB render of a width x height point page at zoom."""
+    return math.ceil(width * zoom) * math.ceil(height * zoom) * BYTES_PER_PIXEL
+
+
+def model_view(image: Union[str, Image.Image], target: str) -> Union[str, Image.Image]:
+    """
+    Downscale a rendered page for a model from the shared buffer.
+
+    Targets with a fixed "size" are resized exactly as their processor would
+    (bilinear), so feeding the view gives the model the same pixels as the
+    full page; an image path is decoded for this. Other targets get the
+    input back unchanged.
+    """
+    spec = RENDER_TARGETS[target]
+    if "size" not in spec:
+        return image
+    if isinstance(image, (str, os.PathLike)):
+        image = Image.open(image)
+    image = image if image.mode == "RGB" else image.convert("RGB")
+    if image.size == tuple(spec["size"]):
+        return image
+    return image.resize(spec["size"], resample=Image.BILINEAR)
+
+
+class MemoryBudget:
+    """
+    Blocking byte budget for rendered pages, keyed by page.
+
+    acquire() waits until the reservation fits under the cap; a single page
+    larger than the whole cap is still admitted once nothing else is held,
+    so oversized pages slow the pipeline down instead of deadlocking it.
+
+    Args:
+        cap_bytes: Bytes of page buffers allowed in flight
+
+    Example:
+        >>> budget = MemoryBudget(256 * 1024 * 1024)
+        >>> budget.acquire(("report.pdf", 3), 6_000_000)
+        >>> ...  # OCR and LayoutLM on page 3
+        >>> budget.release(("report.pdf", 3))
+    """
+
+    def __init__(self, cap_bytes: int):
+        self.cap_bytes = cap_bytes
+        self._held: Dict[Hashable, int] = {}
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self.peak_bytes = 0
+        self.waits = 0
+
+    def acquire(self, key: Hashable, nbytes: int, timeout: Optional[float] = None, force: bool = False) -> bool:
+        """
+        Reserve nbytes for key, waiting for room.
+
+        Args:
+            key: Page identifier passed to release()
+            nbytes: Bytes to reserve
+            timeout: Seconds to wait (None = forever, 0 = do not wait)
+            force: Reserve immediately even over the cap
+
+        Returns:
+            False if the reservation timed out
+        """
+        with self._condition:
+            fits = lambda: force or self._in_use + nbytes <= self.cap_bytes or not self._held
+            if not fits():
+                self.waits += 1
+                if not self._condition.wait_for(fits, timeout=timeout):
+                    return False
+            self._held[key] = self._held.get(key, 0) + nbytes
+            self._in_use += nbytes
+            self.peak_bytes = max(self.peak_bytes, self._in_use)
+            return True
+
+    def release(self, key: Hashable) -> None:
+        """Return key's reservation; releasing an unknown key is a no-op."""
+        with self._condition:
+            nbytes = self._held.pop(key, 0)
+            if nbytes:
+                self._in_use -= nbytes
+                self._condition.notify_all()
+
+    def release_all(self) -> None:
+        with self._condition:
+            self._held.clear()
+            self._in_use = 0
+            self._condition.notify_all()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cap_mb": round(self.cap_bytes / 2**20, 1),
+            "in_use_mb": round(self._in_use / 2**20, 1),
+            "peak_mb": round(self.peak_bytes / 2**20, 1),
+            "pages_held": len(self._held),
+            "waits": self.waits,
+        }
+
+
+# Shared by every pipeline in the process, so concurrent documents share one cap
+render_budget = MemoryBudget(RENDER_MEMORY_CAP_MB * 2**20)
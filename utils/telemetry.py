@@ -0,0 +1,330 @@
+"""
+telemetry.py
+Lightweight spans, counters and histograms for the ingestion and query paths.
+
+Stages are wrapped in spans (``with telemetry.span("render_page"):`` or the
+``@traced("ocr")`` decorator). Each finished span feeds a duration histogram
+and, optionally, a bounded list of trace events. Metrics export as
+Prometheus text; traces export as Chrome trace-event JSON, which Perfetto
+and chrome://tracing open directly.
+
+Telemetry is off unless TELEMETRY_ENABLED=1 (or telemetry.enable()); a
+disabled span is a shared no-op object, so instrumented hot loops pay one
+attribute check per call.
+
+profiled() is the hook for hot functions: functions named in PROFILE_FUNCTIONS
+run under cProfile and their stats are written to PROFILE_DIR at exit. All
+other functions are returned unwrapped, so py-spy stacks stay unchanged.
+"""
+
+import atexit
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from utils.config import LOG_LEVEL, PROFILE_DIR, PROFILE_FUNCTIONS, TELEMETRY_ENABLED, TELEMETRY_MAX_EVENTS
+
+
+# Upper bounds in seconds; covers a sub-millisecond FAISS search up to a minute-long OCR batch
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_PREFIX = "chart_rag"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def configure_logging(level: str = LOG_LEVEL) -> None:
+    """
+    Send the package's log records to stderr at the given level.
+
+    Library modules only create loggers; command-line entry points call this once.
+    """
+    logging.basicConfig(level=level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def set(self, **attrs) -> None:
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed region; records its duration when it exits (see Telemetry.span)."""
+
+    __slots__ = ("telemetry", "name", "attrs", "start")
+
+    def __init__(self, telemetry: "Telemetry", name: str, attrs: Dict[str, Any]):
+        self.telemetry = telemetry
+        self.name = name
+        self.attrs = attrs
+        self.start = 0.0
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.telemetry._finish_span(self, end)
+
+    def set(self, **attrs) -> None:
+        """Attach attributes (e.g. batch size) to the trace event."""
+        self.attrs.update(attrs)
+
+
+class Telemetry:
+    """
+    In-process metrics and trace collector.
+
+    Args:
+        enabled: Record anything at all
+        max_events: Trace events kept (oldest dropped first); 0 disables tracing
+            while keeping metrics
+
+    Example:
+        >>> telemetry.enable()
+        >>> with telemetry.span("embed_batch", size=64):
+        ...     vectors = embeddings.embed_documents(texts)
+        >>> telemetry.count("pages_rendered")
+        >>> print(telemetry.prometheus_text())
+        >>> telemetry.write_trace("trace.json")
+    """
+
+    def __init__(self, enabled: bool = TELEMETRY_ENABLED, max_events: int = TELEMETRY_MAX_EVENTS):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._span_histograms: Dict[str, _Histogram] = {}
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=max_events or None)
+        self._trace = max_events > 0
+        self._origin = time.perf_counter()
+
+    def enable(self, trace: bool = True) -> None:
+        self.enabled = True
+        self._trace = trace
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        """Drop all recorded metrics and trace events."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._span_histograms.clear()
+            self._events.clear()
+            self._origin = time.perf_counter()
+
+    def span(self, name: str, **attrs) -> Any:
+        """Context manager timing a stage; a no-op when telemetry is disabled."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def traced(self, name: Optional[str] = None) -> Callable[[Callable], Callable]:
+        """Decorator form of span(); the span is named after the function unless given."""
+        def decorator(func: Callable) -> Callable:
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with Span(self, span_name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        """Increase a counter (exported as <prefix>_<name>_total)."""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **labels) -> None:
+        """Record one value in a histogram."""
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = _Histogram(buckets)
+            series[key].observe(value)
+
+    def _finish_span(self, span: Span, end: float) -> None:
+        duration = end - span.start
+        event = None
+        if self._trace:
+            event = {
+                "name": span.name,
+                "ph": "X",
+                "ts": round((span.start - self._origin) * 1e6, 1),
+                "dur": round(duration * 1e6, 1),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if span.attrs:
+                event["args"] = {key: value if isinstance(value, (int, float, bool)) else str(value)
+                                 for key, value in span.attrs.items()}
+
+        with self._lock:
+            # Span histograms are looked up by name directly; this runs once per span
+            histogram = self._span_histograms.get(span.name)
+            if histogram is None:
+                series = self._histograms.setdefault("span_duration_seconds", {})
+                histogram = series.setdefault(_label_key({"span": span.name}), _Histogram(DEFAULT_BUCKETS))
+                self._span_histograms[span.name] = histogram
+            histogram.observe(duration)
+            if event is not None:
+                self._events.append(event)
+        if "error" in span.attrs:
+            self.count("span_errors", span=span.name)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and histogram summaries as plain JSON-serializable data."""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [
+                    {"labels": dict(key), "count": h.count, "sum": round(h.total, 6),
+                     "buckets": dict(zip([*map(str, h.buckets), "+Inf"], h.counts))}
+                    for key, h in series.items()
+                ]
+                for name, series in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def prometheus_text(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric = f"{METRIC_PREFIX}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.extend(f"{metric}{_format_labels(key)} {value:g}" for key, value in sorted(series.items()))
+            for name, series in sorted(self._histograms.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for key, h in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip([*map(str, h.buckets), "+Inf"], h.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{metric}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {h.total:.6f}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def trace_events(self) -> Dict[str, Any]:
+        """Recorded spans as a Chrome trace-event document."""
+        with self._lock:
+            return {"traceEvents": list(self._events), "displayTimeUnit": "ms"}
+
+    def write_metrics(self, filepath: str) -> None:
+        with open(filepath, 'w') as f:
+            f.write(self.prometheus_text())
+
+    def write_trace(self, filepath: str) -> None:
+        with open(filepath, 'w') as f:
+            json.dump(self.trace_events(), f)
+
+
+# Shared collector for the current process
+telemetry = Telemetry()
+span = telemetry.span
+traced = telemetry.traced
+
+
+_profilers: Dict[str, cProfile.Profile] = {}
+
+
+def _dump_profiles() -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    for name, profiler in _profilers.items():
+        profiler.dump_stats(os.path.join(PROFILE_DIR, f"{name}.{os.getpid()}.prof"))
+
+
+def profiled(func: Callable) -> Callable:
+    """
+    Profile a hot function with cProfile when it is listed in PROFILE_FUNCTIONS.
+
+    Stats accumulate across calls and are written to
+    PROFILE_DIR/<name>.<pid>.prof at interpreter exit (open them with
+    ``python -m pstats`` or snakeviz). Unlisted functions are returned as-is.
+    """
+    name = func.__name__
+    if name not in PROFILE_FUNCTIONS:
+        return func
+
+    if not _profilers:
+        atexit.register(_dump_profiles)
+    profiler = _profilers.setdefault(name, cProfile.Profile())
+    depth = threading.local()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Recursive calls (e.g. per-page retries) run inside the outer profile
+        outermost = not getattr(depth, "value", 0)
+        depth.value = getattr(depth, "value", 0) + 1
+        if outermost:
+            profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            depth.value -= 1
+            if outermost:
+                profiler.disable()
+    return wrapper
@@ -7,31 +7,94 @@ References:
 - Unstructured Library: https://unstructured-io.github.io/unstructured/
 """
 
-from typing import List, Dict, Any
-from unstructured.chunking.title import chunk_by_title
-from unstructured.partition.auto import partition
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 
+from utils.config import CHUNK_OVERLAP, CHUNK_SIZE, TEXT_SHARD_PAGES
 
-def partition_pdf_document(pdf_path: str) -> List[Any]:
+logger = logging.getLogger(__name__)
+
+# unstructured and PyMuPDF are imported inside the functions that use them;
+# unstructured takes most of a second to import and query-only processes never need it.
+
+
+def _partition_shard(args: Tuple[str, int, int, str]) -> List[Any]:
+    # Runs in a pool worker: copy pages first..last into a temporary PDF and partition it
+    import fitz
+    from unstructured.partition.auto import partition
+
+    pdf_path, first_page, last_page, strategy = args
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shard_path = os.path.join(tmp_dir, f"pages_{first_page}_{last_page}.pdf")
+        source = fitz.open(pdf_path)
+        shard = fitz.open()
+        shard.insert_pdf(source, from_page=first_page - 1, to_page=last_page - 1)
+        shard.save(shard_path)
+        shard.close()
+        source.close()
+        elements = partition(filename=shard_path, strategy=strategy)
+
+    # Point page numbers and file metadata back at the original document
+    for element in elements:
+        metadata = element.metadata
+        if metadata.page_number is not None:
+            metadata.page_number += first_page - 1
+        metadata.filename = os.path.basename(pdf_path)
+        metadata.file_directory = os.path.dirname(os.path.abspath(pdf_path))
+    return elements
+
+
+def partition_pdf_document(
+    pdf_path: str,
+    num_workers: int = 1,
+    pages_per_shard: int = TEXT_SHARD_PAGES,
+    strategy: str = "auto",
+) -> List[Any]:
     """
     Parse PDF into structured elements (text, tables, images, etc.).
     
+    With num_workers > 1 the document is split into page-range shards that
+    are partitioned in a process pool; elements come back in page order with
+    their original page numbers.
+    
     Args:
         pdf_path: Path to PDF file
+        num_workers: Partitioning processes (1 = whole document in this process)
+        pages_per_shard: Pages per shard when running in parallel
+        strategy: unstructured partition strategy ("auto", "fast", "hi_res", ...)
         
     Returns:
         List of document elements with type and metadata
         
     Example:
-        >>> elements = partition_pdf_document("sample.pdf")
+        >>> elements = partition_pdf_document("sample.pdf", num_workers=8)
         >>> print(f"Found {len(elements)} elements")
     """
-    elements = partition(pdf_path)
-    print(f"Partitioned PDF: {len(elements)} elements")
+    from unstructured.partition.auto import partition
+    from utils.pdf_processor import get_pdf_page_count
+
+    page_count = get_pdf_page_count(pdf_path) if num_workers > 1 else 0
+    if page_count <= pages_per_shard:
+        elements = partition(filename=pdf_path, strategy=strategy)
+        logger.info("Partitioned PDF: %d elements", len(elements))
+        return elements
+
+    shards = [
+        (pdf_path, first, min(first + pages_per_shard - 1, page_count), strategy)
+        for first in range(1, page_count + 1, pages_per_shard)
+    ]
+    elements = []
+    with ProcessPoolExecutor(max_workers=min(num_workers, len(shards))) as executor:
+        for shard_elements in executor.map(_partition_shard, shards):
+            elements.extend(shard_elements)
+    logger.info("Partitioned PDF: %d elements from %d shards", len(elements), len(shards))
     return elements
 
 
-def create_chunks_by_title(elements):
+def create_chunks_by_title(elements, max_characters: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP):
     """
     Chunk elements by title/heading structure.
     Preserves document hierarchy and keeps related content together.
@@ -39,9 +102,9 @@ def create_chunks_by_title(elements):
     
     Args:
         elements: Document elements from partition_pdf_document()
-        max_characters: Absolute max characters per chunk
-        new_after_n_chars: Soft limit (algo aims for this)
-        combine_text_under_n_chars: Merge tiny chunks smaller than this
+        max_characters: Absolute max characters per chunk (soft limit is 80%
+            of it and chunks under a sixth of it are merged)
+        overlap: Characters repeated between consecutive chunks
         
     Returns:
         List of chunked elements preserving structure
@@ -51,14 +114,16 @@ def create_chunks_by_title(elements):
         >>> chunks = create_chunks_by_title(elements)
         >>> print(f"Created {len(chunks)} chunks")
     """
+    from unstructured.chunking.title import chunk_by_title
     chunks = chunk_by_title(
         elements,
-        max_characters=3000,
-        new_after_n_chars=2400,
-        combine_text_under_n_chars=500,
+        max_characters=max_characters,
+        new_after_n_chars=int(max_characters * 0.8),
+        combine_text_under_n_chars=max_characters // 6,
+        overlap=overlap,
     )
     
-    print(f"Created {len(chunks)} chunks by title")
+    logger.info("Created %d chunks by title", len(chunks))
     return chunks
 
 
@@ -85,7 +150,7 @@ def chunks_to_dict(chunks):
         chunk_dict = {
             "chunk_id": idx,
             "text": chunk.text if hasattr(chunk, 'text') else str(chunk),
-            "type": chunk.type if hasattr(chunk, 'type') else "unknown",
+            "type": chunk.type if hasattr(chunk, 'type') else getattr(chunk, 'category', "unknown"),
         }
         
         # Add metadata if available
@@ -97,7 +162,7 @@ def chunks_to_dict(chunks):
         
         chunk_dicts.append(chunk_dict)
     
-    print(f"Converted {len(chunk_dicts)} chunks to dictionary format")
+    logger.info("Converted %d chunks to dictionary format", len(chunk_dicts))
     return chunk_dicts
 
 
@@ -117,7 +182,7 @@ def filter_by_type(chunks: List[Dict], include_types: List[str]) -> List[Dict]:
         >>> filtered = filter_by_type(chunk_dicts, ["text", "table"])
     """
     filtered = [c for c in chunks if c.get("type") in include_types]
-    print(f"✓ Filtered to {len(filtered)} chunks (types: {include_types})")
+    logger.info("Filtered to %d chunks (types: %s)", len(filtered), include_types)
     return filtered
 
 
@@ -127,4 +192,129 @@ def clean_chunk_text(chunk: Dict) -> Dict:
 
 
 def clean_all_chunks(chunks: List[Dict]) -> List[Dict]:
-    return [clean_chunk_text(chunk) for chunk in chunks]
\ No newline at end of file
+    return [clean_chunk_text(chunk) for chunk in chunks]
+
+
+def _split_text(text: str, chunk_size: int, overlap: int) -> List[str]:
+    # Cut at the last whitespace before chunk_size so words are not split
+    pieces, start = [], 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            space = text.rfind(" ", start + 1, end)
+            if space > start:
+                end = space
+        pieces.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        next_start = end - overlap
+        if next_start > start and text[next_start - 1] != " ":
+            # Begin the overlap at a word boundary rather than mid-word
+            space = text.find(" ", next_start, end)
+            next_start = space + 1 if space != -1 else end
+        # An overlap reaching back to this chunk's start would not advance; drop it
+        start = next_start if next_start > start else end
+    return [piece for piece in pieces if piece]
+
+
+def chunk_pdf_text(pdf_path: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[Dict]:
+    """
+    Fast text chunks straight from the PDF text layer, without layout analysis.
+    
+    Uses extract_text_from_pdf (PyMuPDF) and splits each page into chunks of
+    at most chunk_size characters, so chunks never span pages. Output has the
+    same shape as chunks_to_dict().
+    
+    Args:
+        pdf_path: Path to PDF file
+        chunk_size: Max characters per chunk
+        overlap: Characters repeated between consecutive chunks of a page
+        
+    Returns:
+        List of dictionaries with chunk_id, text, type and metadata.page_number
+        
+    Example:
+        >>> chunk_dicts = chunk_pdf_text("annual_report.pdf")
+    """
+    from utils.pdf_processor import extract_text_from_pdf
+
+    chunk_dicts = []
+    for page_number, text in sorted(extract_text_from_pdf(pdf_path).items()):
+        for piece in _split_text(" ".join(text.split()), chunk_size, overlap):
+            chunk_dicts.append({
+                "chunk_id": len(chunk_dicts),
+                "text": piece,
+                "type": "CompositeElement",
+                "metadata": {"page_number": page_number, "coordinates": None},
+            })
+    logger.info("Created %d text chunks (fast)", len(chunk_dicts))
+    return chunk_dicts
+
+
+def partition_and_chunk(
+    pdf_path: str,
+    layout: bool = True,
+    num_workers: int = 1,
+    chunk_size: int = CHUNK_SIZE,
+    overlap: int = CHUNK_OVERLAP,
+) -> List[Dict]:
+    """
+    Full text path: partition, chunk by title, convert and clean.
+    
+    With layout=False (or when unstructured's PDF support is not installed)
+    the fast chunk_pdf_text path is used instead.
+    
+    Args:
+        pdf_path: Path to PDF file
+        layout: Use unstructured layout analysis and title-aware chunking
+        num_workers: Partitioning processes for the layout path
+        chunk_size: Max characters per chunk
+        overlap: Characters repeated between consecutive chunks
+        
+    Returns:
+        Cleaned chunk dictionaries (see chunks_to_dict)
+        
+    Example:
+        >>> chunk_dicts = partition_and_chunk("annual_report.pdf", num_workers=8)
+        >>> records = chunks_to_records(chunk_dicts, doc_id="annual_report")
+    """
+    if not layout:
+        return chunk_pdf_text(pdf_path, chunk_size, overlap)
+
+    try:
+        elements = partition_pdf_document(pdf_path, num_workers=num_workers)
+    except ImportError as e:
+        logger.warning("Layout partitioning unavailable, using fast text chunking: %s", e)
+        return chunk_pdf_text(pdf_path, chunk_size, overlap)
+    chunks = create_chunks_by_title(elements, max_characters=chunk_size, overlap=overlap)
+    return clean_all_chunks(chunks_to_dict(chunks))
+
+
+def chunks_to_records(chunk_dicts: List[Dict], doc_id: Optional[str] = None) -> List[Dict]:
+    """
+    Convert chunk dictionaries into extraction-style records.
+    
+    The records can be indexed alongside chart records with build_vectorstore
+    or appended to an ExtractionStore; region_id keeps each chunk distinct
+    from the page's chart records.
+    
+    Args:
+        chunk_dicts: Output of chunks_to_dict() or chunk_pdf_text()
+        doc_id: Document id stored on every record
+        
+    Returns:
+        List of records with page, type "text", title, context and region_id
+    """
+    records = []
+    for chunk in chunk_dicts:
+        record = {
+            "page": (chunk.get("metadata") or {}).get("page_number") or 0,
+            "type": "text",
+            "title": "",
+            "context": chunk["text"],
+            "region_id": f"text-{chunk['chunk_id']}",
+        }
+        if doc_id is not None:
+            record["doc_id"] = doc_id
+        records.append(record)
+    return records
\ No newline at end of file